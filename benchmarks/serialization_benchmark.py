@@ -0,0 +1,99 @@
+"""Benchmarks the JSON serializers (see opal_common.serialization) on large
+data documents.
+
+Usage:
+    python benchmarks/serialization_benchmark.py [--sizes 1 10 50] [--repeat 3]
+
+For documents of roughly each of --sizes (in MB), shaped like typical data
+source documents (a list of users, a map of resources with nested roles),
+reports the best of --repeat runs of:
+  - json.dumps: the previous serialization (stdlib, default separators)
+  - dumps / loads: each available serializer
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict
+
+root_dir = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), os.path.pardir, "packages", "opal-common")
+)
+sys.path.append(root_dir)
+
+from opal_common.logger import logger
+from opal_common.serialization import JsonSerializer, OrjsonSerializer, orjson
+
+
+def make_document(size_mb: float) -> Dict[str, Any]:
+    """Builds a document whose JSON is roughly size_mb megabytes."""
+    users, resources = [], {}
+    doc = {"users": users, "resources": resources}
+    i, size, target = 0, 0, size_mb * 1024 * 1024
+    while size < target:
+        user = {
+            "id": f"user-{i}",
+            "email": f"user{i}@example.com",
+            "active": i % 3 != 0,
+            "score": i * 0.25,
+            "tenants": [f"tenant-{i % 17}", f"tenant-{i % 31}"],
+        }
+        resource = {
+            "owner": f"user-{i}",
+            "roles": {"viewer": [f"user-{i + 1}"], "editor": []},
+            "attributes": {"region": "eu" if i % 2 else "us", "tier": i % 5},
+        }
+        users.append(user)
+        resources[f"resource-{i}"] = resource
+        size += len(json.dumps(user)) + len(json.dumps(resource)) + 20
+        i += 1
+    return doc
+
+
+def best_of(repeat: int, func: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes, repeat: int):
+    serializers = [JsonSerializer()]
+    if orjson is not None:
+        serializers.append(OrjsonSerializer())
+    else:
+        logger.info("orjson is not installed, benchmarking the stdlib serializer only")
+
+    for size_mb in sizes:
+        doc = make_document(size_mb)
+        raw = json.dumps(doc)
+        logger.info("document of {size:.1f}MB:", size=len(raw) / 1024 / 1024)
+        duration = best_of(repeat, lambda: json.dumps(doc))
+        logger.info("{name:>20}: {ms:8.1f}ms", name="json.dumps", ms=duration * 1000)
+        for serializer in serializers:
+            dumped = serializer.dumps_bytes(doc)
+            dumps = best_of(repeat, lambda: serializer.dumps_bytes(doc))
+            loads = best_of(repeat, lambda: serializer.loads(dumped))
+            for name, duration in (("dumps", dumps), ("loads", loads)):
+                logger.info(
+                    "{name:>20}: {ms:8.1f}ms  ({rate:,.0f}MB/s)",
+                    name=f"{serializer.name} {name}",
+                    ms=duration * 1000,
+                    rate=len(dumped) / duration / 1024 / 1024,
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # report the results alone, without log decorations
+    logger.remove()
+    logger.add(sys.stdout, format="{message}", filter="__main__")
+    main(args.sizes, args.repeat)
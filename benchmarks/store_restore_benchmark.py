@@ -0,0 +1,147 @@
+"""Benchmarks restoring the policy store from a backup file, and from its
+binary snapshot (see opal_client.policy_store.backup_snapshot).
+
+Usage:
+    python benchmarks/store_restore_benchmark.py [--sizes 1 10 50] [--repeat 3]
+        [--opa-url http://localhost:8181] [--concurrency 4]
+
+For data documents of roughly each of --sizes (in MB), shaped like
+serialization_benchmark's, reports the best of --repeat runs of:
+  - backup: OpaClient.full_import of the backup file
+  - snapshot: OpaClient.import_snapshot of the backup's snapshot
+and the time it takes to convert the backup to a snapshot.
+
+Data is restored to the OPA at --opa-url if given, otherwise to a local
+stub that only reads the requests - measuring the client's side alone.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable
+
+for package in ("opal-common", "opal-client"):
+    sys.path.append(
+        os.path.abspath(
+            os.path.join(os.path.dirname(__file__), os.path.pardir, "packages", package)
+        )
+    )
+
+import aiofiles
+from aiohttp import web
+from opal_client.config import opal_client_config
+from opal_client.policy_store.backup_snapshot import (
+    StoreSnapshot,
+    convert_backup_to_snapshot,
+)
+from opal_client.policy_store.opa_client import OpaClient
+from opal_common.logger import logger
+from serialization_benchmark import make_document
+
+
+async def start_opa_stub() -> web.AppRunner:
+    async def handle_data(request: web.Request) -> web.Response:
+        await request.read()
+        return web.Response(status=204)
+
+    async def handle_policies(request: web.Request) -> web.Response:
+        return web.json_response({"result": []})
+
+    app = web.Application(client_max_size=0)
+    app.router.add_route("*", "/v1/data", handle_data)
+    app.router.add_route("*", "/v1/data/{path:.*}", handle_data)
+    app.router.add_route("*", "/v1/policies{path:.*}", handle_policies)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    return runner
+
+
+async def best_of(repeat: int, func: Callable[[], Awaitable[Any]]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main(sizes, repeat: int, opa_url: str, concurrency: int):
+    runner = None
+    if not opa_url:
+        runner = await start_opa_stub()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        opa_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    opal_client_config.STORE_BACKUP_RESTORE_CONCURRENCY = concurrency
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            backup_path = os.path.join(tmp_dir, "opa.json")
+            snapshot_path = f"{backup_path}.snapshot"
+            for size_mb in sizes:
+                client = OpaClient(opa_url, cache_policy_data=True)
+                await client.set_policy_data(make_document(size_mb))
+                async with aiofiles.open(backup_path, "w") as f:
+                    await client.full_export(f)
+                await client.stop_liveness_probe()
+                start = time.perf_counter()
+                await convert_backup_to_snapshot(backup_path, snapshot_path)
+                convert = time.perf_counter() - start
+                backup_mb = os.path.getsize(backup_path) / 1024 / 1024
+                snapshot_mb = os.path.getsize(snapshot_path) / 1024 / 1024
+                logger.info(
+                    "backup of {backup:.1f}MB (snapshot of {snapshot:.1f}MB, "
+                    "converted in {ms:.1f}ms):",
+                    backup=backup_mb,
+                    snapshot=snapshot_mb,
+                    ms=convert * 1000,
+                )
+
+                async def restore_backup():
+                    restored = OpaClient(opa_url, cache_policy_data=True)
+                    try:
+                        async with aiofiles.open(backup_path, "r") as f:
+                            await restored.full_import(f)
+                    finally:
+                        await restored.stop_liveness_probe()
+
+                async def restore_snapshot():
+                    restored = OpaClient(opa_url, cache_policy_data=True)
+                    try:
+                        with StoreSnapshot(snapshot_path) as snapshot:
+                            await restored.import_snapshot(snapshot)
+                    finally:
+                        await restored.stop_liveness_probe()
+
+                for name, restore in (
+                    ("backup", restore_backup),
+                    ("snapshot", restore_snapshot),
+                ):
+                    duration = await best_of(repeat, restore)
+                    logger.info(
+                        "{name:>20}: {ms:8.1f}ms", name=name, ms=duration * 1000
+                    )
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--opa-url", default="")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=opal_client_config.STORE_BACKUP_RESTORE_CONCURRENCY,
+    )
+    args = parser.parse_args()
+
+    # the client's logs would interleave with the results, report them alone
+    logger.remove()
+    logger.add(sys.stdout, format="{message}", filter="__main__")
+    asyncio.run(main(args.sizes, args.repeat, args.opa_url, args.concurrency))
@@ -4,6 +4,7 @@ from typing import Any, Awaitable, Callable, Dict, List, Optional
 import aiohttp
 from opal_client.callbacks.register import CallbackConfig, CallbacksRegister
 from opal_client.data.fetcher import DataFetcher
+from opal_common.fetcher import FetchPriority
 from opal_common.fetcher.providers.http_fetch_provider import HttpFetcherConfig
 from opal_common.http_utils import is_http_error_response
 from opal_common.logger import logger
@@ -63,7 +64,10 @@ class CallbacksReporter:
             # log only the URLs — FetcherConfig may carry Authorization headers and the full report payload
             urls = [request[0] for request in callback_requests]
             logger.info("Reporting the update to requested callbacks", urls=urls)
-            report_results = await self._fetcher.handle_urls(callback_requests)
+            # reports shouldn't delay data fetches (if the fetcher is shared)
+            report_results = await self._fetcher.handle_urls(
+                callback_requests, priority=FetchPriority.low
+            )
             # log reports which we failed to send
             for url, config, result in report_results:
                 if isinstance(result, Exception):
@@ -10,7 +10,7 @@ import aiofiles
 import aiofiles.os
 import aiohttp
 from fastapi import FastAPI, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi_websocket_pubsub.pub_sub_client import PubSubOnConnectCallback
 from fastapi_websocket_rpc.rpc_channel import OnDisconnectCallback
 from opal_client.callbacks.api import init_callbacks_api
@@ -26,6 +26,12 @@ from opal_client.limiter import StartupLoadLimiter
 from opal_client.policy.api import init_policy_router
 from opal_client.policy.updater import PolicyUpdater
 from opal_client.policy_store.api import init_policy_store_router
+from opal_client.policy_store.backup_journal import StoreBackupJournal
+from opal_client.policy_store.backup_snapshot import (
+    StoreSnapshot,
+    convert_backup_to_snapshot,
+    is_snapshot_of,
+)
 from opal_client.policy_store.base_policy_store_client import BasePolicyStoreClient
 from opal_client.policy_store.policy_store_client_factory import (
     PolicyStoreClientFactory,
@@ -33,8 +39,10 @@ from opal_client.policy_store.policy_store_client_factory import (
 from opal_common.authentication.deps import JWTAuthenticator
 from opal_common.authentication.verifier import JWTVerifier
 from opal_common.config import opal_common_config
+from opal_common.fetcher.circuit_breaker import CircuitState
 from opal_common.logger import configure_logs, logger
 from opal_common.middleware import configure_middleware
+from opal_common.monitoring import metrics
 from opal_common.security.sslcontext import get_custom_ssl_context
 
 
@@ -85,6 +93,12 @@ class OpalClient:
         )
         # set logs
         configure_logs()
+        metrics.configure_metrics(
+            enable_metrics=opal_common_config.ENABLE_METRICS,
+            statsd_host=os.environ.get("DD_AGENT_HOST", "localhost"),
+            statsd_port=8125,
+            namespace="opal_client",
+        )
 
         self.offline_mode_enabled = (
             offline_mode_enabled or opal_client_config.OFFLINE_MODE_ENABLED
@@ -162,6 +176,12 @@ class OpalClient:
         else:
             self.data_updater = None
 
+        if self.policy_updater and self.data_updater:
+            # bundle data overwrites whatever the data updater wrote to the same paths
+            self.policy_updater.on_bundle_data_written(
+                self.data_updater.forget_written_data_of
+            )
+
         # Internal services
         # Policy store
         self.engine_runner = self._init_engine_runner(
@@ -200,6 +220,17 @@ class OpalClient:
             store_backup_interval or opal_client_config.STORE_BACKUP_INTERVAL
         )
         self._backup_loaded = False
+        self._backup_journal: Optional[StoreBackupJournal] = None
+        if (
+            self.offline_mode_enabled
+            and opal_client_config.STORE_BACKUP_JOURNAL_ENABLED
+        ):
+            journal = StoreBackupJournal(f"{self.store_backup_path}.journal")
+            if self.policy_store.set_backup_journal(journal):
+                self._backup_journal = journal
+        self.store_snapshot_path: Optional[str] = None
+        if opal_client_config.STORE_BACKUP_SNAPSHOT_ENABLED:
+            self.store_snapshot_path = f"{self.store_backup_path}.snapshot"
 
         # init fastapi app
         self.app: FastAPI = self._init_fast_api_app()
@@ -235,6 +266,8 @@ class OpalClient:
             if self.data_updater:
 
                 async def _rehydrate_data():
+                    # the policy store was restarted and lost all data
+                    self.data_updater.forget_written_data()
                     if not self.opal_server_connectivity_disabled:
                         await self.data_updater.get_base_policy_data(
                             data_fetch_reason="policy store rehydration",
@@ -308,18 +341,27 @@ class OpalClient:
             server and applied to the policy store, AND the policy store is
             reachable (when the background liveness probe is enabled)."""
             healthy = await self.policy_store.is_healthy()
+            # data sources currently failing fast (see FETCHING_CIRCUIT_BREAKER)
+            open_circuits = [
+                breaker.origin
+                for breaker in (
+                    self.data_updater.circuit_breakers if self.data_updater else []
+                )
+                if breaker.state != CircuitState.closed
+            ]
+            details = {"open_circuits": open_circuits} if open_circuits else {}
 
             if healthy:
                 return JSONResponse(
                     status_code=status.HTTP_200_OK,
-                    content={"status": "ok", "online": True},
+                    content={"status": "ok", "online": True, **details},
                 )
             elif self.offline_mode_enabled and await self._is_ready():
                 # Offline Mode is active. That is enabled, client is "ready" (data loaded) but not "healthy" (latest updates failed).
                 # TODO: Maybe if updates were fetched from server, but storing them to OPA wasn't successful, we should return 503 even with offline mode enabled
                 return JSONResponse(
                     status_code=status.HTTP_200_OK,
-                    content={"status": "ok", "online": False},
+                    content={"status": "ok", "online": False, **details},
                 )
             else:
                 return JSONResponse(
@@ -340,6 +382,17 @@ class OpalClient:
                     content={"status": "unavailable"},
                 )
 
+        if opal_common_config.ENABLE_METRICS:
+
+            @app.get("/metrics", include_in_schema=False)
+            async def prometheus_metrics():
+                """Returns the histograms of the stages of the data update
+                pipeline, in the Prometheus text format."""
+                return PlainTextResponse(
+                    metrics.render_prometheus(),
+                    media_type="text/plain; version=0.0.4",
+                )
+
         return app
 
     def _configure_lifecycle_callbacks(self, app: FastAPI):
@@ -424,24 +477,70 @@ class OpalClient:
         logger.info("trying to shutdown DataUpdater and PolicyUpdater gracefully...")
         await self._stop_updaters()
 
+        # nothing is journaled once the updaters are stopped
+        if self._backup_journal is not None:
+            try:
+                await self._backup_journal.close()
+            except Exception:
+                logger.exception("error while closing the policy store backup journal")
+
     async def load_store_from_backup(self):
-        """Imports the backup file, if exists, to the policy store."""
+        """Imports the backup file, if exists, to the policy store (and the
+        operations journaled after it, see StoreBackupJournal)."""
         try:
             if os.path.isfile(self.store_backup_path):
-                async with aiofiles.open(self.store_backup_path, "r") as backup_file:
-                    logger.info("importing policy store from backup file...")
-                    await self.policy_store.full_import(backup_file)
-                    logger.debug("import completed")
-                    self._backup_loaded = True
+                if not await self._load_store_from_snapshot():
+                    async with aiofiles.open(
+                        self.store_backup_path, "r"
+                    ) as backup_file:
+                        logger.info("importing policy store from backup file...")
+                        await self.policy_store.full_import(backup_file)
+                        logger.debug("import completed")
+                self._backup_loaded = True
+            elif self._backup_journal is not None and self._backup_journal.seq:
+                # crashed before the first backup file was written
+                logger.info("importing policy store from backup journal...")
+                await self.policy_store.replay_backup_journal()
+                self._backup_loaded = True
             else:
                 logger.warning("policy store backup file wasn't found")
         except Exception:
             logger.exception("failed to load backup data to policy store")
 
+    async def _load_store_from_snapshot(self) -> bool:
+        """Imports the snapshot of the backup file (see
+        STORE_BACKUP_SNAPSHOT_ENABLED), returns False if there's no (valid)
+        snapshot of the backup file as it is now."""
+        if self.store_snapshot_path is None or not await is_snapshot_of(
+            self.store_snapshot_path, self.store_backup_path
+        ):
+            return False
+        try:
+            with StoreSnapshot(self.store_snapshot_path) as snapshot:
+                logger.info("importing policy store from backup snapshot...")
+                await self.policy_store.import_snapshot(snapshot)
+                logger.debug("import completed")
+            return True
+        except ValueError as e:
+            logger.warning(
+                "failed to import backup snapshot, importing backup file instead: {err}",
+                err=repr(e),
+            )
+            return False
+
     async def backup_store(self):
-        """Exports the policy store's data to a backup file."""
+        """Exports the policy store's data to a backup file.
+
+        If the store's operations are journaled, the journal already backs
+        them up - and the backup file is only rewritten (compacting the
+        journal) once the journal grows larger than it.
+        """
         try:
             async with self._backup_lock:
+                if self._backup_journal is not None and not self._should_compact():
+                    await self._backup_journal.sync()
+                    await self._write_store_snapshot()
+                    return
                 await aiofiles.os.makedirs(
                     os.path.dirname(self.store_backup_path), exist_ok=True
                 )
@@ -459,9 +558,40 @@ class OpalClient:
 
                 # Atomically replace the previous backup (only after the new one is ready)
                 await aiofiles.os.replace(tmp_backup_path, self.store_backup_path)
+                if self._backup_journal is not None:
+                    await self._backup_journal.commit_snapshot()
+                await self._write_store_snapshot()
         except Exception:
             logger.exception("failed to backup policy store")
 
+    async def _write_store_snapshot(self):
+        """Converts the backup file to a snapshot (see
+        STORE_BACKUP_SNAPSHOT_ENABLED), unless it was already converted."""
+        if self.store_snapshot_path is None or not os.path.isfile(
+            self.store_backup_path
+        ):
+            return
+        if await is_snapshot_of(self.store_snapshot_path, self.store_backup_path):
+            return
+        logger.debug("converting backup file to snapshot...")
+        await convert_backup_to_snapshot(
+            self.store_backup_path, self.store_snapshot_path
+        )
+        logger.debug("conversion completed")
+
+    def _should_compact(self) -> bool:
+        """Whether the backup file should be rewritten from the journal (see
+        STORE_BACKUP_COMPACTION_RATIO)."""
+        if not self._backup_journal.changed:
+            return False
+        if not os.path.isfile(self.store_backup_path):
+            return True
+        backup_size = os.path.getsize(self.store_backup_path)
+        return (
+            self._backup_journal.size
+            >= backup_size * opal_client_config.STORE_BACKUP_COMPACTION_RATIO
+        )
+
     async def periodically_backup_store(self):
         # Backup store periodically
         while True:
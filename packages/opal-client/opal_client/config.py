@@ -88,6 +88,23 @@ class OpalClientConfig(Confi):
         2,
         description="Per-request HTTP timeout (seconds) for liveness probes against the policy store.",
     )
+    POLICY_STORE_CONN_POOL_LIMIT = confi.int(
+        "POLICY_STORE_CONN_POOL_LIMIT",
+        100,
+        description="Max number of simultaneous connections OPAL client keeps in its "
+        "connection pool to the policy store (0 for unlimited).",
+    )
+    POLICY_STORE_CONN_POOL_LIMIT_PER_HOST = confi.int(
+        "POLICY_STORE_CONN_POOL_LIMIT_PER_HOST",
+        0,
+        description="Max number of simultaneous pooled connections to a single policy store "
+        "host (0 for no per-host limit, i.e: only POLICY_STORE_CONN_POOL_LIMIT applies).",
+    )
+    POLICY_STORE_CONN_KEEPALIVE_TIMEOUT = confi.float(
+        "POLICY_STORE_CONN_KEEPALIVE_TIMEOUT",
+        15,
+        description="Time (seconds) an idle pooled connection to the policy store is kept open for reuse.",
+    )
     POLICY_UPDATER_CONN_RETRY: ConnRetryOptions = confi.model(
         "POLICY_UPDATER_CONN_RETRY",
         ConnRetryOptions,
@@ -334,6 +351,68 @@ class OpalClientConfig(Confi):
         description="Default URL to fetch data from",
     )
 
+    DATA_UPDATER_CONDITIONAL_FETCH = confi.bool(
+        "DATA_UPDATER_CONDITIONAL_FETCH",
+        False,
+        description="If set, OPAL client remembers the ETag / Last-Modified headers returned by "
+        "HTTP data sources, and sends them back (as If-None-Match / If-Modified-Since) when "
+        "fetching the same data source again. If the data source answers with 304 (Not Modified), "
+        "writing the data to the policy store is skipped.",
+    )
+    DATA_UPDATER_SKIP_UNCHANGED_WRITES = confi.bool(
+        "DATA_UPDATER_SKIP_UNCHANGED_WRITES",
+        False,
+        description="If set, OPAL client keeps the hash of the data it last wrote to each path of the "
+        "policy store (each root key, if SPLIT_ROOT_DATA is set), and skips writing (PUT) the same data "
+        "to the same path again (e.g. when all data sources are re-fetched on reconnect). "
+        "Writes of policy bundle data modules, and restarts of an inline OPA, are taken into account. "
+        "Other writers, and restarts of a policy store OPAL client doesn't run, are not: after them, "
+        "unchanged data is not rewritten until it changes. Only enable if no one but OPAL client "
+        "writes data to the policy store, and it keeps its data for as long as OPAL client runs.",
+    )
+    DATA_UPDATER_DELTA_WRITES = confi.bool(
+        "DATA_UPDATER_DELTA_WRITES",
+        False,
+        description="If set, OPAL client keeps the data it last wrote (PUT) to each path of the policy "
+        "store, and writes new data to the same path as a JSON patch (RFC 6902) of the changes - if the "
+        "patch is much smaller than the data (see DATA_UPDATER_DELTA_WRITES_MAX_RATIO), and as a full "
+        "PUT otherwise (or if the policy store rejects the patch, e.g. since it lost the data). Trades "
+        "memory (a copy of the written data) for cheaper writes of large, slowly changing data sources.",
+    )
+    DATA_UPDATER_DELTA_WRITES_MAX_RATIO = confi.float(
+        "DATA_UPDATER_DELTA_WRITES_MAX_RATIO",
+        0.5,
+        description="If DATA_UPDATER_DELTA_WRITES is set, data is written as a patch only if the "
+        "(serialized) patch is at most this fraction of the size of the (serialized) data",
+    )
+    DATA_UPDATER_COALESCE_UPDATES = confi.bool(
+        "DATA_UPDATER_COALESCE_UPDATES",
+        False,
+        description="If set, consecutive PATCHes (with inline data) waiting to be written to the same "
+        "destination path are merged into a single PATCH. Once it's written, the merged entries are "
+        "reported with the id of the update they were coalesced into (if it fails, each of them is "
+        "still applied on its own).",
+    )
+    DATA_UPDATER_MAX_CONCURRENT_UPDATES = confi.int(
+        "DATA_UPDATER_MAX_CONCURRENT_UPDATES",
+        0,
+        description="The maximum number of data updates OPAL client runs concurrently (0 means no limit). "
+        "Further updates are queued, and run by priority: real-time (incremental) updates first, "
+        "then (re)loads of all data sources, and then periodic polling of data sources.",
+    )
+    DATA_UPDATER_MAX_QUEUED_UPDATES = confi.int(
+        "DATA_UPDATER_MAX_QUEUED_UPDATES",
+        0,
+        description="The maximum number of data updates waiting to run (0 means no limit). Once reached, "
+        "receiving further updates (from the pub/sub channel, data source polling, etc.) waits for room in the queue.",
+    )
+    DATA_UPDATER_POLLING_JITTER = confi.float(
+        "DATA_UPDATER_POLLING_JITTER",
+        0.1,
+        description="The fraction of its periodic_update_interval each poll of a data source is randomly "
+        "moved by (e.g. 0.1 means +/- 10%), so data sources polled at the same interval don't fire in lockstep.",
+    )
+
     SHOULD_REPORT_ON_DATA_UPDATES = confi.bool(
         "SHOULD_REPORT_ON_DATA_UPDATES",
         False,
@@ -394,6 +473,40 @@ class OpalClientConfig(Confi):
         60,
         description="Interval in seconds to backup policy store's data",
     )
+    STORE_BACKUP_JOURNAL_ENABLED = confi.bool(
+        "STORE_BACKUP_JOURNAL_ENABLED",
+        True,
+        description="If set, the operations applied to the policy store are appended "
+        "to a journal next to the backup file (as they're applied), and the backup is "
+        "only rewritten once the journal grows larger than it (see "
+        "STORE_BACKUP_COMPACTION_RATIO) - backups are restored by replaying the "
+        "journal on top of the backup file",
+    )
+    STORE_BACKUP_COMPACTION_RATIO = confi.float(
+        "STORE_BACKUP_COMPACTION_RATIO",
+        1.0,
+        description="The backup file is rewritten (and the journal emptied) once the "
+        "journal is larger than this ratio of the backup file's size",
+    )
+    STORE_BACKUP_CHUNK_SIZE = confi.int(
+        "STORE_BACKUP_CHUNK_SIZE",
+        4 * 1024 * 1024,
+        description="Policy store data is backed up (and restored) in documents of up "
+        "to about this many bytes - larger objects are split by their keys",
+    )
+    STORE_BACKUP_SNAPSHOT_ENABLED = confi.bool(
+        "STORE_BACKUP_SNAPSHOT_ENABLED",
+        False,
+        description="If set, each backup file is also converted to a binary snapshot "
+        "next to it (memory-mapped on restore, and written to the policy store without "
+        "parsing it) - the policy store is restored from the snapshot on cold start",
+    )
+    STORE_BACKUP_RESTORE_CONCURRENCY = confi.int(
+        "STORE_BACKUP_RESTORE_CONCURRENCY",
+        4,
+        description="Max number of data documents written concurrently to the policy "
+        "store when restoring it from a backup snapshot",
+    )
     OFFLINE_MODE_ENABLED = confi.bool(
         "OFFLINE_MODE_ENABLED",
         False,
@@ -407,6 +520,12 @@ class OpalClientConfig(Confi):
     SPLIT_ROOT_DATA = confi.bool(
         "SPLIT_ROOT_DATA", False, description="Split writing data updates to root path"
     )
+    SPLIT_ROOT_DATA_MAX_CONCURRENT_WRITES = confi.int(
+        "SPLIT_ROOT_DATA_MAX_CONCURRENT_WRITES",
+        10,
+        description="When splitting data updates to root path (see SPLIT_ROOT_DATA), the max number of "
+        "root keys written to the policy store concurrently (1 writes the keys one after another)",
+    )
 
     def on_load(self):
         # LOGGER
@@ -1,7 +1,10 @@
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import APIRouter, HTTPException, status
+from opal_client.data.polling import PolledDataSource
 from opal_client.data.updater import DataUpdater
+from opal_common.fetcher.circuit_breaker import CircuitBreakerState
+from opal_common.fetcher.engine.fetching_engine import FetchingEngineStats
 from opal_common.logger import logger
 
 
@@ -22,4 +25,52 @@ def init_data_router(data_updater: Optional[DataUpdater]):
                 detail="Data Updater is currently disabled. Dynamic data updates are not available.",
             )
 
+    @router.get(
+        "/data-updater/polling",
+        status_code=status.HTTP_200_OK,
+        response_model=List[PolledDataSource],
+    )
+    async def get_polling_schedule():
+        """Returns the data sources polled periodically, and when each is next
+        polled."""
+        if data_updater:
+            return data_updater.polling_schedule
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Data Updater is currently disabled. Dynamic data updates are not available.",
+            )
+
+    @router.get(
+        "/data-updater/circuit-breakers",
+        status_code=status.HTTP_200_OK,
+        response_model=List[CircuitBreakerState],
+    )
+    async def get_circuit_breakers():
+        """Returns the state of the circuit breaker of each fetched data source
+        origin (see FETCHING_CIRCUIT_BREAKER)."""
+        if data_updater:
+            return data_updater.circuit_breakers
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Data Updater is currently disabled. Dynamic data updates are not available.",
+            )
+
+    @router.get(
+        "/data-updater/fetching",
+        status_code=status.HTTP_200_OK,
+        response_model=FetchingEngineStats,
+    )
+    async def get_fetching_stats():
+        """Returns the utilization of the workers fetching the data sources
+        (see FETCHING_MAX_WORKER_COUNT)."""
+        if data_updater:
+            return data_updater.fetching_stats
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Data Updater is currently disabled. Dynamic data updates are not available.",
+            )
+
     return router
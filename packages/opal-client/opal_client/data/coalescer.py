@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import itertools
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from opal_common.schemas.data import DataEntryReport, DataSourceEntry
+
+if TYPE_CHECKING:
+    from opal_client.data.write_sequencer import WriteTicket
+
+
+class PendingEntry:
+    """A data update entry waiting to be applied to the policy store."""
+
+    __slots__ = (
+        "seq",
+        "entry",
+        "update_id",
+        "path",
+        "started",
+        "coalesced_into",
+        "report",
+        "ticket",
+    )
+
+    def __init__(self, seq: int, entry: DataSourceEntry, update_id: str):
+        self.seq = seq
+        self.entry = entry
+        self.update_id = update_id
+        self.path = DataUpdateCoalescer.normalize_path(entry.dst_path)
+        # set once the entry is being applied, after which it can't be coalesced
+        self.started = False
+        # the id of the update that merged this entry into its own (once written)
+        self.coalesced_into: Optional[str] = None
+        # the report of the entry, set by the entry it was merged into
+        self.report: Optional[DataEntryReport] = None
+        # the place of the entry in the order of writes (see DataWriteSequencer)
+        self.ticket: Optional[WriteTicket] = None
+
+    @property
+    def is_inline_patch(self) -> bool:
+        return (
+            self.entry.save_method == "PATCH"
+            and isinstance(self.entry.data, list)
+            and not self.entry.url
+        )
+
+
+class DataUpdateCoalescer:
+    """Coalesces data update entries that are waiting (i.e: not yet started)
+    to be applied to the same destination path of the policy store:
+    consecutive PATCH entries (with inline JSON patches) to the same path are
+    merged into a single PATCH, applied by the first of them.
+
+    Entries are registered (in order of arrival) before waiting on the
+    destination path lock, and checked (see `start`) once the lock is held.
+    Whether an entry is skipped is decided by the DataWriteSequencer alone:
+    the merged entries (like the entries overwritten by a later PUT) become
+    stale once the merged PATCH was written - otherwise, each of them is
+    still applied on its own.
+    """
+
+    def __init__(self):
+        self._seq = itertools.count()
+        self._pending: Dict[int, PendingEntry] = {}
+
+    @staticmethod
+    def normalize_path(path: Optional[str]) -> str:
+        return "/".join(segment for segment in (path or "").split("/") if segment)
+
+    @staticmethod
+    def is_same_or_descendant(path: str, ancestor: str) -> bool:
+        return not ancestor or path == ancestor or path.startswith(f"{ancestor}/")
+
+    @classmethod
+    def is_conflicting(cls, p1: str, p2: str) -> bool:
+        return cls.is_same_or_descendant(p1, p2) or cls.is_same_or_descendant(p2, p1)
+
+    def register(self, entry: DataSourceEntry, update_id: str) -> PendingEntry:
+        """Registers an entry waiting to be applied."""
+        pending = PendingEntry(next(self._seq), entry, update_id)
+        self._pending[pending.seq] = pending
+        return pending
+
+    def start(self, pending: PendingEntry) -> List[PendingEntry]:
+        """Marks the entry as started, and returns the entries to merge into it
+        (i.e: the consecutive PATCH entries waiting after it for the same
+        path), in order.
+
+        Must not be called for entries that were already coalesced.
+        """
+        pending.started = True
+        merged: List[PendingEntry] = []
+        if not pending.is_inline_patch:
+            return merged
+
+        for other in self._pending.values():
+            if (
+                other.seq <= pending.seq
+                or other.started
+                or other.coalesced_into is not None
+                or not self.is_conflicting(other.path, pending.path)
+            ):
+                continue
+            if other.path != pending.path or not other.is_inline_patch:
+                # the patches that follow must be applied after this write
+                break
+            merged.append(other)
+        return merged
+
+    @staticmethod
+    def merged(
+        pending: PendingEntry, merged: List[PendingEntry], report: DataEntryReport
+    ):
+        """Records the entries were merged into the (written) entry, so they're
+        reported with the report of the merged write."""
+        for other in merged:
+            other.coalesced_into = pending.update_id
+            other.report = report.copy(
+                update={"entry": other.entry, "coalesced_into": pending.update_id}
+            )
+
+    def done(self, pending: PendingEntry):
+        """Stops tracking the entry (once applied, or coalesced)."""
+        self._pending.pop(pending.seq, None)
+
+    @staticmethod
+    def merge_patches(
+        pending: PendingEntry, merged: List[PendingEntry]
+    ) -> DataSourceEntry:
+        """Returns an entry applying the patches of all the given entries, in
+        order."""
+        patches = list(pending.entry.data)
+        for other in merged:
+            patches.extend(other.entry.data)
+        return pending.entry.copy(update={"data": patches})
+
+    @staticmethod
+    def coalesced_report(pending: PendingEntry) -> DataEntryReport:
+        """The report of an entry that was merged into another one."""
+        return pending.report
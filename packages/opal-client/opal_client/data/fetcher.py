@@ -4,7 +4,9 @@ from typing import Any, List, Optional, Tuple
 from opal_client.config import opal_client_config
 from opal_client.policy_store.base_policy_store_client import JsonableValue
 from opal_common.config import opal_common_config
-from opal_common.fetcher import FetchingEngine
+from opal_common.fetcher import FetchingEngine, FetchPriority
+from opal_common.fetcher.circuit_breaker import CircuitBreakers, CircuitBreakerState
+from opal_common.fetcher.engine.fetching_engine import FetchingEngineStats
 from opal_common.fetcher.events import FetcherConfig
 from opal_common.fetcher.providers.http_fetch_provider import HttpFetcherConfig
 from opal_common.logger import logger
@@ -31,9 +33,24 @@ class DataFetcher:
         # The underlying fetching engine
         self._engine = FetchingEngine(
             worker_count=opal_common_config.FETCHING_WORKER_COUNT,
+            max_worker_count=opal_common_config.FETCHING_MAX_WORKER_COUNT,
+            worker_idle_timeout=opal_common_config.FETCHING_WORKER_IDLE_TIMEOUT,
+            max_fetches_per_origin=opal_common_config.FETCHING_MAX_FETCHES_PER_ORIGIN,
             callback_timeout=opal_common_config.FETCHING_CALLBACK_TIMEOUT,
             enqueue_timeout=opal_common_config.FETCHING_ENQUEUE_TIMEOUT,
             retry_config=retry_config,
+            single_flight=opal_common_config.FETCHING_SINGLE_FLIGHT,
+            result_cache_ttl=opal_common_config.FETCHING_RESULT_CACHE_TTL,
+            circuit_breakers=(
+                CircuitBreakers(
+                    failure_threshold=opal_common_config.FETCHING_CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                    reset_timeout=opal_common_config.FETCHING_CIRCUIT_BREAKER_RESET_TIMEOUT,
+                    retry_budget_ratio=opal_common_config.FETCHING_RETRY_BUDGET_RATIO,
+                    retry_budget_min_per_second=opal_common_config.FETCHING_RETRY_BUDGET_MIN_PER_SECOND,
+                )
+                if opal_common_config.FETCHING_CIRCUIT_BREAKER
+                else None
+            ),
         )
         self._data_url = default_data_url
         self._token = token
@@ -53,12 +70,28 @@ class DataFetcher:
     async def start(self):
         self._engine.start_workers()
 
+    @property
+    def circuit_breakers(self) -> List[CircuitBreakerState]:
+        """The states of the circuits of the fetched origins (empty if circuit
+        breakers are disabled)."""
+        breakers = self._engine.circuit_breakers
+        return breakers.states if breakers is not None else []
+
+    @property
+    def engine_stats(self) -> FetchingEngineStats:
+        """Utilization of the workers of the fetching engine."""
+        return self._engine.stats
+
     async def stop(self):
         """Release internal tasks and resources."""
         await self._engine.terminate_workers()
 
     async def handle_url(
-        self, url: str, config: dict, data: Optional[JsonableValue]
+        self,
+        url: str,
+        config: dict,
+        data: Optional[JsonableValue],
+        priority: int = FetchPriority.normal,
     ) -> Optional[JsonableValue]:
         """Helper function wrapping self._engine.handle_url."""
         if data is not None:
@@ -72,14 +105,18 @@ class DataFetcher:
         logger.info("Fetching data from url: {url}", url=url)
         try:
             # ask the engine to get our data
-            response = await self._engine.handle_url(url, config=config)
+            response = await self._engine.handle_url(
+                url, config=config, priority=priority
+            )
             return response
         except asyncio.TimeoutError as e:
             logger.exception("Timeout while fetching url: {url}", url=url)
             raise
 
     async def handle_urls(
-        self, urls: List[Tuple[str, FetcherConfig, Optional[JsonableValue]]] = None
+        self,
+        urls: List[Tuple[str, FetcherConfig, Optional[JsonableValue]]] = None,
+        priority: int = FetchPriority.normal,
     ) -> List[Tuple[str, FetcherConfig, Any]]:
         """Fetch data for each given url with the (optional) fetching
         configuration; return the resulting data mapped to each URL.
@@ -87,6 +124,7 @@ class DataFetcher:
         Args:
             urls (List[Tuple[str, FetcherConfig]], optional): Urls (and fetching configuration) to fetch from.
             Defaults to None - init data_url with HttpFetcherConfig (loaded with the provided auth token).
+            priority (int, optional): Priority of the fetches (see FetchPriority). Defaults to normal.
 
         Returns:
             List[Tuple[str,FetcherConfig, Any]]: urls mapped to their resulting fetched data
@@ -99,7 +137,7 @@ class DataFetcher:
             urls = [(self._data_url, self._default_fetcher_config, None)]
         # create a task for each url
         for url, config, data in urls:
-            tasks.append(self.handle_url(url, config, data))
+            tasks.append(self.handle_url(url, config, data, priority=priority))
         # wait for all data fetches to complete
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
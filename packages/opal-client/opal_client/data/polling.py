@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from opal_client.logger import logger
+from opal_common.schemas.data import DataSourceEntryWithPollingInterval
+from pydantic import BaseModel, Field
+from pydantic.json import pydantic_encoder
+
+
+class PolledDataSource(BaseModel):
+    """The polling schedule of a data source (and the entries it's fetched
+    for)."""
+
+    url: str = Field(..., description="Url of the polled data source")
+    periodic_update_interval: float = Field(
+        ..., description="Polling interval of the data source (in seconds)"
+    )
+    dst_paths: List[str] = Field(
+        ..., description="Destination paths of the entries polling the data source"
+    )
+    next_due: float = Field(
+        ..., description="Time (as a unix timestamp) the data source is next polled at"
+    )
+    next_due_in: float = Field(
+        ..., description="Seconds until the data source is next polled"
+    )
+
+
+class _PollGroup:
+    __slots__ = ("entries", "interval", "due")
+
+    def __init__(self, interval: float, due: float):
+        self.entries: List[DataSourceEntryWithPollingInterval] = []
+        self.interval = interval
+        self.due = due
+
+
+class DataSourcePoller:
+    """Polls data sources with a periodic_update_interval, from a single task
+    (and a heap of due times) instead of a task per entry.
+
+    - Entries fetching the same data source (same url and config) with the
+      same interval are polled together, by a single update - so the data
+      source is fetched once per tick (see DataUpdater._fetch_data).
+    - The first poll of each data source is at a random offset within its
+      interval (the data was just loaded by the base data update), so the
+      sources don't all fire in lockstep after a (re)connect.
+    - Each following poll is due an interval later, +/- jitter (a fraction
+      of the interval), so they don't fall back into lockstep.
+    """
+
+    def __init__(
+        self,
+        poll: Callable[[List[DataSourceEntryWithPollingInterval]], Awaitable],
+        jitter: float = 0.0,
+    ):
+        """
+        Args:
+            poll: Called with the entries of a data source when it's due.
+            jitter (float, optional): Fraction of the interval each poll is randomly
+                moved by (e.g. 0.1 means +/- 10%).
+        """
+        self._poll = poll
+        self._jitter = max(0.0, min(jitter, 1.0))
+        self._seq = itertools.count()
+        # heap of (due, seq, group)
+        self._heap: List[Tuple[float, int, _PollGroup]] = []
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _group_key(entry: DataSourceEntryWithPollingInterval) -> str:
+        return json.dumps(
+            [entry.url, entry.config, entry.data, entry.periodic_update_interval],
+            sort_keys=True,
+            default=pydantic_encoder,
+        )
+
+    def set_entries(self, entries: List[DataSourceEntryWithPollingInterval]):
+        """Replaces the polled entries (and their schedule) with the given
+        ones, and starts polling them (if not already polling)."""
+        now = time.monotonic()
+        groups: Dict[str, _PollGroup] = {}
+        for entry in entries:
+            key = self._group_key(entry)
+            group = groups.get(key)
+            if group is None:
+                interval = entry.periodic_update_interval
+                group = groups[key] = _PollGroup(
+                    interval, now + random.uniform(0, interval)
+                )
+            group.entries.append(entry)
+
+        self._heap = [(g.due, next(self._seq), g) for g in groups.values()]
+        heapq.heapify(self._heap)
+        logger.info(
+            "Polling {n} data sources (for {m} entries)",
+            n=len(groups),
+            m=len(entries),
+        )
+        self._changed.set()
+        if self._task is None and self._heap:
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def schedule(self) -> List[PolledDataSource]:
+        """The polled data sources, in order of their next poll."""
+        now, wall_now = time.monotonic(), time.time()
+        return [
+            PolledDataSource(
+                url=group.entries[0].url,
+                periodic_update_interval=group.interval,
+                dst_paths=[entry.dst_path for entry in group.entries],
+                next_due=wall_now + max(0.0, due - now),
+                next_due_in=max(0.0, due - now),
+            )
+            for due, _, group in sorted(self._heap, key=lambda item: item[:2])
+        ]
+
+    def _next_due(self, group: _PollGroup, now: float) -> float:
+        jitter = random.uniform(-self._jitter, self._jitter) * group.interval
+        due = group.due + group.interval + jitter
+        # if polls were delayed (e.g. by backpressure) don't try to catch up
+        return due if due > now else now + group.interval + jitter
+
+    async def _run(self):
+        while self._heap:
+            self._changed.clear()
+            due, _, group = self._heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                if self._changed.is_set():
+                    # entries were replaced (even if just as the group was due),
+                    # recheck what's due next
+                    continue
+
+            heapq.heappop(self._heap)
+            try:
+                await self._poll(group.entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception(
+                    "Error polling data source '{url}': {exc}",
+                    url=group.entries[0].url,
+                    exc=exc,
+                )
+            if self._changed.is_set():
+                # entries were replaced while polling, the group is no longer scheduled
+                continue
+            group.due = self._next_due(group, time.monotonic())
+            heapq.heappush(self._heap, (group.due, next(self._seq), group))
+        self._task = None
+
+    async def stop(self):
+        """Stops polling (and forgets the polled entries)."""
+        self._heap = []
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,185 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from opal_common.async_utils import TasksPool
+from opal_common.monitoring import metrics
+
+
+class UpdatePriority(IntEnum):
+    """Priority classes of data updates (lower values are scheduled first)."""
+
+    # real-time updates published by the server
+    incremental = 0
+    # (re)loading all the data sources, e.g. on (re)connect
+    base = 1
+    # polling of the data sources with a periodic_update_interval
+    periodic = 2
+
+
+class DataUpdateScheduler:
+    """Runs data updates in the background, in order of priority (and of
+    arrival, within the same priority class).
+
+    - At most max_concurrency updates run concurrently, the rest are queued.
+    - Once max_queued updates are queued, `schedule` blocks until there's
+      room in the queue - applying backpressure to whoever triggered the
+      update (e.g. the pub/sub callback). Blocked callers are admitted in
+      order of priority as well.
+
+    Zero (the default) means no limit. Queue depth, running updates and the
+    time updates waited in the queue are reported as metrics.
+    """
+
+    def __init__(self, max_concurrency: int = 0, max_queued: int = 0):
+        self._max_concurrency = max_concurrency
+        self._max_queued = max_queued
+        self._tasks = TasksPool()
+        self._accepting = True
+        self._seq = itertools.count()
+        # heap of (priority, seq, queued at, update runner)
+        self._queue: List[
+            Tuple[UpdatePriority, int, float, Callable[[], Awaitable]]
+        ] = []
+        # heap of (priority, seq, future) of the callers waiting for room in the queue
+        self._blocked: List[Tuple[UpdatePriority, int, asyncio.Future]] = []
+        # number of admitted blocked callers, that are yet to queue their update
+        self._reserved = 0
+        self._running = 0
+        self._depths: Dict[UpdatePriority, int] = {p: 0 for p in UpdatePriority}
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def queue_depth(self) -> Dict[str, int]:
+        """Number of queued updates, by priority class."""
+        return {p.name: depth for p, depth in self._depths.items()}
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    async def schedule(
+        self,
+        run: Callable[[], Awaitable],
+        priority: UpdatePriority = UpdatePriority.incremental,
+    ):
+        """Queues an update to run in the background (`run` is called once it's
+        the update's turn). Blocks while the queue is full.
+
+        Raises:
+            RuntimeError: If the scheduler was shut down.
+        """
+        if not self._accepting:
+            raise RuntimeError("DataUpdateScheduler is already shutdown")
+
+        self._idle.clear()
+        if self._max_queued > 0 and (
+            self._blocked or len(self._queue) + self._reserved >= self._max_queued
+        ):
+            await self._wait_for_room(priority)
+            self._reserved -= 1
+
+        heapq.heappush(self._queue, (priority, next(self._seq), time.monotonic(), run))
+        self._set_depth(priority, self._depths[priority] + 1)
+        self._dispatch()
+
+    async def _wait_for_room(self, priority: UpdatePriority):
+        metrics.increment(
+            "data_updater.backpressure_waits", tags={"priority": priority.name}
+        )
+        blocked = (
+            priority,
+            next(self._seq),
+            asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._blocked, blocked)
+        try:
+            await blocked[2]
+        except asyncio.CancelledError:
+            if blocked[2].done() and not blocked[2].cancelled():
+                # we were admitted, pass the room on to the next caller
+                self._reserved -= 1
+            else:
+                self._blocked.remove(blocked)
+                heapq.heapify(self._blocked)
+            self._admit_blocked()
+            self._check_idle()
+            raise
+
+    def _admit_blocked(self):
+        while self._blocked and len(self._queue) + self._reserved < self._max_queued:
+            _, _, future = heapq.heappop(self._blocked)
+            if future.done():
+                continue
+            self._reserved += 1
+            future.set_result(None)
+
+    def _dispatch(self):
+        """Starts queued updates, as long as the concurrency limit allows."""
+        while self._queue and (
+            self._max_concurrency <= 0 or self._running < self._max_concurrency
+        ):
+            priority, _, queued_at, run = heapq.heappop(self._queue)
+            self._set_depth(priority, self._depths[priority] - 1)
+            metrics.gauge(
+                "data_updater.queue_wait_seconds",
+                time.monotonic() - queued_at,
+                tags={"priority": priority.name},
+            )
+            self._running += 1
+            metrics.gauge("data_updater.running_updates", self._running)
+            self._tasks.add_task(self._run(run))
+        if self._max_queued > 0:
+            self._admit_blocked()
+
+    async def _run(self, run: Callable[[], Awaitable]):
+        try:
+            await run()
+        finally:
+            self._running -= 1
+            metrics.gauge("data_updater.running_updates", self._running)
+            self._dispatch()
+            self._check_idle()
+
+    def _set_depth(self, priority: UpdatePriority, depth: int):
+        self._depths[priority] = depth
+        metrics.gauge(
+            "data_updater.queue_depth", depth, tags={"priority": priority.name}
+        )
+
+    def _check_idle(self):
+        if not (self._queue or self._blocked or self._reserved or self._running):
+            self._idle.set()
+
+    def restart(self):
+        """Re-arms the scheduler so updates can be scheduled after a
+        shutdown."""
+        self._accepting = True
+        self._tasks.restart()
+
+    async def shutdown(self, force: bool = False):
+        """Waits for all the scheduled updates (queued ones included) to
+        finish.
+
+        :param force: If True, drop the queued updates and cancel the
+            running ones.
+        """
+        self._accepting = False
+        if force:
+            for _, _, future in self._blocked:
+                if not future.done():
+                    future.set_exception(
+                        RuntimeError("DataUpdateScheduler is already shutdown")
+                    )
+            self._blocked = []
+            self._queue = []
+            for priority in UpdatePriority:
+                self._set_depth(priority, 0)
+            self._check_idle()
+        else:
+            await self._idle.wait()
+        await self._tasks.shutdown(force=force)
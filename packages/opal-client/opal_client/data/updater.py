@@ -1,11 +1,13 @@
 import asyncio
 import hashlib
 import json
+import time
 import uuid
 from functools import partial
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import aiohttp
+import jsonpatch
 from aiohttp.client import ClientError, ClientSession
 from fastapi_websocket_pubsub import PubSubClient
 from fastapi_websocket_pubsub.pub_sub_client import PubSubOnConnectCallback
@@ -13,8 +15,13 @@ from fastapi_websocket_rpc.rpc_channel import OnDisconnectCallback, RpcChannel
 from opal_client.callbacks.register import CallbacksRegister
 from opal_client.callbacks.reporter import CallbacksReporter
 from opal_client.config import opal_client_config
+from opal_client.data.coalescer import DataUpdateCoalescer, PendingEntry
 from opal_client.data.fetcher import DataFetcher
+from opal_client.data.polling import DataSourcePoller, PolledDataSource
 from opal_client.data.rpc import TenantAwareRpcEventClientMethods
+from opal_client.data.scheduler import DataUpdateScheduler, UpdatePriority
+from opal_client.data.write_sequencer import DataWriteSequencer
+from opal_client.data.written_hashes import WrittenDataHashes
 from opal_client.logger import logger
 from opal_client.policy_store.base_policy_store_client import (
     BasePolicyStoreClient,
@@ -24,9 +31,19 @@ from opal_client.policy_store.base_policy_store_client import (
 from opal_client.policy_store.policy_store_client_factory import (
     DEFAULT_POLICY_STORE_GETTER,
 )
-from opal_common.async_utils import TasksPool, repeated_call
+from opal_client.utils import exclude_none_fields
+from opal_common.async_utils import TasksPool
 from opal_common.config import opal_common_config
+from opal_common.fetcher.circuit_breaker import CircuitBreakerState
+from opal_common.fetcher.data_stream import SpooledDataStream
+from opal_common.fetcher.engine.fetching_engine import FetchingEngineStats
+from opal_common.fetcher.providers.http_fetch_provider import (
+    HttpCacheValidators,
+    HttpConditionalFetchResult,
+)
+from opal_common.fetcher.providers.paginated_fetch_provider import PaginatedFetchResult
 from opal_common.http_utils import is_http_error_response
+from opal_common.monitoring import metrics
 from opal_common.schemas.data import (
     DataEntryReport,
     DataSourceConfig,
@@ -34,13 +51,30 @@ from opal_common.schemas.data import (
     DataUpdate,
     DataUpdateReport,
 )
-from opal_common.schemas.store import TransactionType
+from opal_common.schemas.store import JSONPatchAction, TransactionType
 from opal_common.security.sslcontext import get_custom_ssl_context
+from opal_common.serialization import json_dumps_bytes
 from opal_common.synchronization.hierarchical_lock import HierarchicalLock
 from opal_common.utils import get_authorization_header
 from pydantic.json import pydantic_encoder
 
 
+class SplitRootDataWriteError(Exception):
+    """Raised when some of the root keys of data split by root keys (see
+    SPLIT_ROOT_DATA) failed to be written to the policy store."""
+
+    def __init__(self, errors: Dict[str, Exception]):
+        self.errors = errors
+        super().__init__(
+            "Failed to save root keys: "
+            + ", ".join(f"'{key}' ({exc})" for key, exc in errors.items())
+        )
+
+
+# the JSON patch operations the policy store applies (OPA's PATCH has no move or copy)
+_DELTA_PATCH_OPS = {"add", "remove", "replace"}
+
+
 class DataUpdater:
     """The DataUpdater is responsible for synchronizing data sources with the
     policy store (e.g. OPA). It listens to Pub/Sub topics for data updates,
@@ -153,14 +187,46 @@ class DataUpdater:
             {"ssl": self._custom_ssl_context} if self._custom_ssl_context else {}
         )
 
-        # TaskGroup to manage data updates and callbacks background tasks (with graceful shutdown)
+        # TaskGroup to manage callbacks background tasks (with graceful shutdown)
         self._tasks = TasksPool()
+        # Runs data updates in the background, by priority (with graceful shutdown)
+        self._scheduler = DataUpdateScheduler(
+            max_concurrency=opal_client_config.DATA_UPDATER_MAX_CONCURRENT_UPDATES,
+            max_queued=opal_client_config.DATA_UPDATER_MAX_QUEUED_UPDATES,
+        )
 
         # Lock to prevent multiple concurrent writes to the same path
         self._dst_lock = HierarchicalLock()
+        # Orders the writes of concurrently fetched entries (see _fetch_and_save_data)
+        self._write_sequencer = DataWriteSequencer(self._dst_lock)
+
+        # Polls the data sources of entries with a periodic_update_interval
+        self._poller = DataSourcePoller(
+            self._trigger_periodic_update,
+            jitter=opal_client_config.DATA_UPDATER_POLLING_JITTER,
+        )
 
-        # References to repeated polling tasks (periodic data fetch)
-        self._polling_update_tasks = []
+        # Cache validators (and data hash) of the last successfully saved fetch of each
+        # data source entry, used to fetch data sources conditionally (see _fetch_data)
+        self._conditional_fetch = opal_client_config.DATA_UPDATER_CONDITIONAL_FETCH
+        self._fetch_validators: Dict[str, Tuple[HttpCacheValidators, str]] = {}
+
+        # Hashes of the data last written to each policy store path, used to skip
+        # rewriting unchanged data (see _set_policy_data)
+        self._skip_unchanged_writes = (
+            opal_client_config.DATA_UPDATER_SKIP_UNCHANGED_WRITES
+        )
+        # Data last written to each policy store path (along with its hash, see above),
+        # used to write changed data as a patch (see _make_delta_patch)
+        self._delta_writes = opal_client_config.DATA_UPDATER_DELTA_WRITES
+        self._written_data_hashes = WrittenDataHashes()
+
+        # Coalesces entries waiting to be written to the same destination path
+        self._coalescer: Optional[DataUpdateCoalescer] = (
+            DataUpdateCoalescer()
+            if opal_client_config.DATA_UPDATER_COALESCE_UPDATES
+            else None
+        )
 
         # Optional user-defined hooks for connection lifecycle
         self._on_connect_callbacks = on_connect or []
@@ -190,7 +256,11 @@ class DataUpdater:
         update = DataUpdate.parse_obj(data)
         await self.trigger_data_update(update)
 
-    async def trigger_data_update(self, update: DataUpdate):
+    async def trigger_data_update(
+        self,
+        update: DataUpdate,
+        priority: UpdatePriority = UpdatePriority.incremental,
+    ):
         """Queues up a data update to run in the background. If no update ID is
         provided, generate one for tracking/logging.
 
@@ -199,6 +269,12 @@ class DataUpdater:
             can run concurrently. Internally, the `_update_policy_data` method uses
             a hierarchical lock to avoid race conditions when multiple updates try
             to write to the same destination path.
+
+        Args:
+            update (DataUpdate): The data update to run.
+            priority (UpdatePriority, optional): The priority class of the update
+                (see DataUpdateScheduler). Defaults to incremental (real-time) updates.
+                Blocks while the queue of updates is full (see DATA_UPDATER_MAX_QUEUED_UPDATES).
         """
         # Ensure we have a unique update ID
         if update.id is None:
@@ -207,9 +283,12 @@ class DataUpdater:
         logger.info("Triggering data update with id: {id}", id=update.id)
 
         # Run the update in the background concurrently with other updates
-        # The TaskGroup will manage the lifecycle of this task,
-        # managing graceful shutdown of the updater without losing running data updates
-        self._tasks.add_task(self._update_policy_data(update))
+        # The scheduler will manage the lifecycle of this task,
+        # managing graceful shutdown of the updater without losing queued or running data updates
+        await self._scheduler.schedule(
+            partial(self._update_policy_data, update, received_at=time.monotonic()),
+            priority,
+        )
 
     async def get_policy_data_config(self, url: str = None) -> DataSourceConfig:
         """Fetches the DataSourceConfig (list of DataSourceEntry) from the
@@ -251,8 +330,8 @@ class DataUpdater:
         """Fetches an initial (or base) set of data from the configuration URL
         and stores it in the policy store.
 
-        This method also sets up any periodic data polling tasks for entries
-        that specify a 'periodic_update_interval'.
+        This method also schedules the periodic polling of entries that
+        specify a 'periodic_update_interval' (see DataSourcePoller).
 
         Args:
             config_url (str, optional): A specific config URL to fetch from. If not given,
@@ -264,36 +343,70 @@ class DataUpdater:
             "Performing data configuration, reason: {reason}", reason=data_fetch_reason
         )
 
-        # If we're reconnecting, stop any old periodic tasks before fetching anew
-        await self._stop_polling_update_tasks()
+        # If we're reconnecting, stop polling the old entries before fetching anew
+        await self._poller.stop()
 
         # Fetch the base config with all data entries
         sources_config = await self.get_policy_data_config(url=config_url)
 
-        init_entries, periodic_entries = [], []
-        for entry in sources_config.entries:
-            if entry.periodic_update_interval is not None:
-                periodic_entries.append(entry)
-            else:
-                init_entries.append(entry)
-
-        # Process one-time entries now
-        update = DataUpdate(reason=data_fetch_reason, entries=init_entries)
-        await self.trigger_data_update(update)
+        # Process all entries now (periodic ones included)
+        update = DataUpdate(reason=data_fetch_reason, entries=sources_config.entries)
+        await self.trigger_data_update(update, UpdatePriority.base)
 
         # Schedule repeated processing (polling) of periodic entries
-        async def _trigger_update_with_entry(entry: DataSourceEntry):
-            await self.trigger_data_update(
-                DataUpdate(reason="Periodic Update", entries=[entry])
-            )
+        self._poller.set_entries(
+            [
+                entry
+                for entry in sources_config.entries
+                if entry.periodic_update_interval is not None
+            ]
+        )
 
-        for entry in periodic_entries:
-            repeat_process_entry = repeated_call(
-                partial(_trigger_update_with_entry, entry),
-                entry.periodic_update_interval,
-                logger=logger,
-            )
-            self._polling_update_tasks.append(asyncio.create_task(repeat_process_entry))
+    async def _trigger_periodic_update(self, entries: List[DataSourceEntry]):
+        """Triggers the update of polled entries (see DataSourcePoller), that
+        fetch the same data source."""
+        await self.trigger_data_update(
+            DataUpdate(reason="Periodic Update", entries=entries),
+            UpdatePriority.periodic,
+        )
+
+    @property
+    def polling_schedule(self) -> List[PolledDataSource]:
+        """The polled data sources, and when each is next polled."""
+        return self._poller.schedule
+
+    @property
+    def circuit_breakers(self) -> List[CircuitBreakerState]:
+        """The states of the circuits of the fetched data source origins."""
+        return self._data_fetcher.circuit_breakers
+
+    @property
+    def fetching_stats(self) -> FetchingEngineStats:
+        """Utilization of the workers fetching the data sources."""
+        return self._data_fetcher.engine_stats
+
+    def forget_written_data(self):
+        """Forgets what is known about data already written to the policy
+        store, so that the next fetch of each data source is unconditional and
+        its result is always written.
+
+        Should be called whenever the policy store lost its data (e.g.
+        it was restarted).
+        """
+        self._fetch_validators.clear()
+        self._written_data_hashes.clear()
+
+    def forget_written_data_of(self, paths: List[str]):
+        """Forgets what is known about data already written to the given paths
+        of the policy store (and to their ancestors and descendants), so that
+        the next write of data to them is neither skipped nor sent as a patch.
+
+        Should be called whenever data was written to the policy store
+        by someone else (e.g. the data modules of policy bundles).
+        """
+        for path in paths:
+            # data modules at the root of a bundle are written to the root document
+            self._written_data_hashes.forget("" if path == "." else path)
 
     async def on_connect(self, client: PubSubClient, channel: RpcChannel):
         """Invoked when the Pub/Sub client establishes a connection to the
@@ -325,6 +438,7 @@ class DataUpdater:
         """Resets internal state so the updater can be started again after
         being stopped."""
         self._stopping = False
+        self._scheduler.restart()
         self._tasks.restart()
 
     async def start(self):
@@ -363,23 +477,11 @@ class DataUpdater:
         async with self._client:
             await self._client.wait_until_done()
 
-    async def _stop_polling_update_tasks(self):
-        """Cancels all periodic polling tasks (if any).
-
-        Used on reconnection or shutdown to ensure we don't have stale
-        tasks still running.
-        """
-        if self._polling_update_tasks:
-            for task in self._polling_update_tasks:
-                task.cancel()
-            await asyncio.gather(*self._polling_update_tasks, return_exceptions=True)
-            self._polling_update_tasks = []
-
     async def stop(self):
         """
         Cleanly shuts down the DataUpdater:
           - Disconnects the Pub/Sub client.
-          - Stops polling tasks.
+          - Stops polling data sources.
           - Cancels the subscriber background task.
           - Stops the data fetcher and callback reporter.
         """
@@ -394,7 +496,7 @@ class DataUpdater:
                     "Timeout waiting for DataUpdater pubsub client to disconnect"
                 )
 
-        await self._stop_polling_update_tasks()
+        await self._poller.stop()
 
         # Cancel the subscriber task
         if self._subscriber_task is not None:
@@ -417,7 +519,8 @@ class DataUpdater:
         # Stop the callbacks reporter
         await self._callbacks_reporter.stop()
 
-        # Exit the TaskGroup context
+        # Wait for the scheduled data updates, and then for the callbacks they triggered
+        await self._scheduler.shutdown()
         await self._tasks.shutdown()
 
     async def wait_until_done(self):
@@ -442,31 +545,37 @@ class DataUpdater:
         Returns:
             str: The hexadecimal representation of the SHA-256 hash.
         """
+        if isinstance(data, (SpooledDataStream, PaginatedFetchResult)):
+            # streamed (and paginated) data is hashed while it is fetched
+            return data.hash
         try:
             if not isinstance(data, str):
+                # not opal_common.serialization - reported hashes must not change
                 data = json.dumps(data, default=pydantic_encoder)
             return hashlib.sha256(data.encode("utf-8")).hexdigest()
         except Exception as e:
             logger.exception(f"Failed to calculate hash for data {data}: {e}")
             return ""
 
-    async def _update_policy_data(self, update: DataUpdate) -> None:
+    async def _update_policy_data(
+        self, update: DataUpdate, received_at: Optional[float] = None
+    ) -> None:
         """Performs the core data update process for the given DataUpdate
         object.
 
         Steps:
           1. Iterate over the DataUpdate entries.
           2. For each entry, check if any of its topics match our client's topics.
-          3. Acquire a lock for the destination path, so we don't fetch and overwrite concurrently.
-             - Note: This means that fetches that can technically happen concurrently wait on one another.
-                          This can be improved with  a Fetcher-Writer Lock ( a la Reader-Writer Lock ) pattern
-          4. Fetch the data from the source (if applicable).
-          5. Write the data into the policy store.
-          6. Collect a report (success/failure, hash of the data, etc.).
-          7. Send a consolidated report after processing all entries.
+          3. Fetch the data from the source (if applicable), concurrently with other updates.
+          4. Write the data into the policy store, in order with the other updates to
+             conflicting paths, under a lock for the destination path (see _fetch_and_save_data).
+          5. Collect a report (success/failure, hash of the data, etc.).
+          6. Send a consolidated report after processing all entries.
 
         Args:
             update (DataUpdate): The data update instructions (entries, reason, etc.).
+            received_at (float, optional): When the update was received (time.monotonic()),
+                to report its end-to-end latency once applied.
 
         Returns:
             None
@@ -474,32 +583,99 @@ class DataUpdater:
         reports: list[DataEntryReport] = []
 
         for entry in update.entries:
-            if not entry.topics:
-                logger.debug("Data entry {entry} has no topics, skipping", entry=entry)
-                continue
+            self._resolve_data_blob(entry)
+
+        # Entries of the update fetching the same data source (e.g. polled together,
+        # see DataSourcePoller) share a single fetch of it (see _fetch_data)
+        sources = [
+            (
+                entry.url,
+                json.dumps(entry.config, sort_keys=True, default=pydantic_encoder),
+            )
+            for entry in update.entries
+            if entry.url and entry.data is None
+        ]
+        shared_fetches: Optional[Dict[str, Any]] = (
+            {} if len(set(sources)) < len(sources) else None
+        )
 
-            # Only process entries that match one of our subscribed data topics
-            if set(entry.topics).isdisjoint(set(self._data_topics)):
-                logger.debug(
-                    "Data entry {entry} has no topics matching the data topics, skipping",
-                    entry=entry,
-                )
-                continue
+        try:
+            for entry in update.entries:
+                if not entry.topics:
+                    logger.debug(
+                        "Data entry {entry} has no topics, skipping", entry=entry
+                    )
+                    continue
 
-            transaction_context = self._policy_store.transaction_context(
-                update.id, transaction_type=TransactionType.data
+                # Only process entries that match one of our subscribed data topics
+                if set(entry.topics).isdisjoint(set(self._data_topics)):
+                    logger.debug(
+                        "Data entry {entry} has no topics matching the data topics, skipping",
+                        entry=entry,
+                    )
+                    continue
+
+                if self._coalescer is not None:
+                    report = await self._coalesce_fetch_and_save_data(
+                        entry, update, shared_fetches
+                    )
+                else:
+                    async with self._policy_store.transaction_context(
+                        update.id, transaction_type=TransactionType.data
+                    ) as store_transaction:
+                        report = await self._fetch_and_save_data(
+                            entry, store_transaction, shared_fetches=shared_fetches
+                        )
+
+                reports.append(report)
+        finally:
+            for result, _ in (shared_fetches or {}).values():
+                if isinstance(result, HttpConditionalFetchResult):
+                    result = result.data
+                if isinstance(result, SpooledDataStream):
+                    result.close()
+
+        if received_at is not None and reports:
+            metrics.histogram(
+                "data_updater.update_latency",
+                time.monotonic() - received_at,
+                {"topic": self._topics_tag(update.entries)},
             )
+        await self._send_reports(reports, update)
 
-            # Acquire a per-destination lock to avoid overwriting the same path concurrently
-            async with (
-                transaction_context as store_transaction,
-                self._dst_lock.lock(entry.dst_path),
-            ):
-                report = await self._fetch_and_save_data(entry, store_transaction)
+    async def _coalesce_fetch_and_save_data(
+        self,
+        entry: DataSourceEntry,
+        update: DataUpdate,
+        shared_fetches: Optional[Dict[str, Any]] = None,
+    ) -> DataEntryReport:
+        """Like _fetch_and_save_data, but coalesces the entry with the other
+        entries waiting to be written to the same path.
 
-            reports.append(report)
+        If the entry is a PATCH, the PATCHes waiting right after it are
+        merged into it (and skipped once it's written).
 
-        await self._send_reports(reports, update)
+        Args:
+            entry (DataSourceEntry): The entry to fetch and save.
+            update (DataUpdate): The update the entry is part of.
+            shared_fetches (Dict[str, Any], optional): See _fetch_data.
+
+        Returns:
+            DataEntryReport: The report of the entry.
+        """
+        pending = self._coalescer.register(entry, update.id)
+        try:
+            async with self._policy_store.transaction_context(
+                update.id, transaction_type=TransactionType.data
+            ) as store_transaction:
+                return await self._fetch_and_save_data(
+                    entry,
+                    store_transaction,
+                    pending=pending,
+                    shared_fetches=shared_fetches,
+                )
+        finally:
+            self._coalescer.done(pending)
 
     async def _send_reports(self, reports: list[DataEntryReport], update: DataUpdate):
         """Handles the reporting of completed data updates back to callbacks.
@@ -525,35 +701,163 @@ class DataUpdater:
         self,
         entry: DataSourceEntry,
         store_transaction: PolicyStoreTransactionContextManager,
+        pending: Optional[PendingEntry] = None,
+        shared_fetches: Optional[Dict[str, Any]] = None,
     ) -> DataEntryReport:
         """Orchestrates fetching data from a source and saving it into the
         policy store.
 
         Flow:
           1. Attempt to fetch data via the data fetcher (e.g., HTTP).
-          2. If data is fetched successfully, store it in the policy store.
-          3. Return a DataEntryReport indicating success/failure of each step.
+          2. If data is fetched successfully, wait for the turn of the entry to write
+             (see DataWriteSequencer), so fetches run concurrently (even for the same path),
+             but writes to conflicting paths are applied in order of arrival.
+          3. Store the data in the policy store, unless a later PUT has already
+             overwritten it (i.e: the fetched data is stale).
+          4. Return a DataEntryReport indicating success/failure of each step.
 
         Args:
             entry (DataSourceEntry): The configuration details of the data source entry.
             store_transaction (PolicyStoreTransactionContextManager): An active
                 transaction to the policy store.
+            pending (PendingEntry, optional): The entry as registered in the coalescer
+                (see _coalesce_fetch_and_save_data), if coalescing updates.
+            shared_fetches (Dict[str, Any], optional): See _fetch_data.
 
         Returns:
             DataEntryReport: Includes information about whether data was fetched,
                 saved, and the computed hash for the data if successfully saved.
         """
+        ticket = self._write_sequencer.register(entry)
+        if pending is not None:
+            pending.ticket = ticket
         try:
-            result = await self._fetch_data(entry)
-        except Exception as e:
-            store_transaction._update_remote_status(
-                url=entry.url, status=False, error=str(e)
-            )
-            return DataEntryReport(entry=entry, fetched=False, saved=False)
+            conditional_key = self._get_conditional_fetch_key(entry)
+            try:
+                result = await self._fetch_data(entry, conditional_key, shared_fetches)
+            except Exception as e:
+                store_transaction._update_remote_status(
+                    url=entry.url, status=False, error=str(e)
+                )
+                return DataEntryReport(entry=entry, fetched=False, saved=False)
+
+            validators: Optional[HttpCacheValidators] = None
+            if isinstance(result, HttpConditionalFetchResult):
+                if result.not_modified:
+                    # the data source didn't change since we last wrote it to the policy store
+                    logger.info(
+                        "Data source '{url}' was not modified, skipping write to policy-store",
+                        url=entry.url,
+                    )
+                    store_transaction._update_remote_status(
+                        url=entry.url, status=True, error=""
+                    )
+                    _, data_hash = self._fetch_validators.get(
+                        conditional_key, (None, None)
+                    )
+                    return DataEntryReport(
+                        entry=entry, hash=data_hash, fetched=True, saved=True
+                    )
+                validators, result = result.validators, result.data
 
+            tags = self._entry_metric_tags(entry)
+            try:
+                wait_started = time.monotonic()
+                async with self._write_sequencer.write_turn(ticket) as up_to_date:
+                    metrics.histogram(
+                        "data_updater.lock_wait", time.monotonic() - wait_started, tags
+                    )
+                    if not up_to_date and pending is not None and pending.report:
+                        logger.info(
+                            "Data entry for path '{path}' was merged into update {id}, skipping",
+                            path=entry.dst_path,
+                            id=pending.coalesced_into,
+                        )
+                        return self._coalescer.coalesced_report(pending)
+                    if not up_to_date:
+                        logger.info(
+                            "Data fetched for path '{path}' was already overwritten by a later update, skipping",
+                            path=entry.dst_path,
+                        )
+                        metrics.increment("data_updater.stale_writes_dropped")
+                        return DataEntryReport(
+                            entry=entry,
+                            hash=self.calc_hash(result),
+                            fetched=True,
+                            saved=False,
+                        )
+
+                    merged: List[PendingEntry] = []
+                    if pending is None:
+                        report = await self._save_fetched_data(
+                            entry,
+                            result,
+                            store_transaction,
+                            validators,
+                            conditional_key,
+                        )
+                    else:
+                        report, merged = await self._save_coalesced_data(
+                            pending, result, store_transaction
+                        )
+                    if report.saved:
+                        self._write_sequencer.written(
+                            ticket, [other.ticket for other in merged]
+                        )
+                    return report
+            finally:
+                # shared fetches are closed once the whole update is done
+                if isinstance(result, SpooledDataStream) and shared_fetches is None:
+                    result.close()
+                elif isinstance(result, PaginatedFetchResult):
+                    await result.aclose()
+        finally:
+            self._write_sequencer.done(ticket)
+
+    async def _save_fetched_data(
+        self,
+        entry: DataSourceEntry,
+        result: JsonableValue,
+        store_transaction: PolicyStoreTransactionContextManager,
+        validators: Optional[HttpCacheValidators] = None,
+        conditional_key: Optional[str] = None,
+    ) -> DataEntryReport:
+        """Saves the fetched data of an entry into the policy store (in its
+        write turn), and reports the outcome.
+
+        Args:
+            entry (DataSourceEntry): The configuration details of the data source entry.
+            result (JsonableValue): The fetched data.
+            store_transaction (PolicyStoreTransactionContextManager): An active
+                transaction to the policy store.
+            validators (HttpCacheValidators, optional): The cache validators of the fetched data,
+                kept (under conditional_key) if the data is saved.
+            conditional_key (str, optional): See _get_conditional_fetch_key.
+
+        Returns:
+            DataEntryReport: The report of the entry.
+        """
+        paginated = isinstance(result, PaginatedFetchResult)
+        # the hash of paginated data is known once all of its pages were written
+        data_hash = None if paginated else self.calc_hash(result)
+        tags = self._entry_metric_tags(entry)
+        if isinstance(result, (dict, list)):
+            metrics.histogram(
+                "data_updater.items", len(result), tags, metrics.COUNT_BUCKETS
+            )
         try:
-            await self._store_fetched_data(entry, result, store_transaction)
+            with metrics.timer("data_updater.store_duration", tags):
+                await self._store_fetched_data(
+                    entry, result, store_transaction, data_hash=data_hash
+                )
+            if paginated:
+                data_hash = self.calc_hash(result)
+                metrics.histogram(
+                    "data_updater.items", result.items, tags, metrics.COUNT_BUCKETS
+                )
         except Exception as e:
+            if conditional_key is not None:
+                self._fetch_validators.pop(conditional_key, None)
             logger.exception("Failed to save data update to policy-store: {exc}", exc=e)
             store_transaction._update_remote_status(
                 url=entry.url,
@@ -561,30 +865,203 @@ class DataUpdater:
                 error=f"Failed to save data to policy store: {e}",
             )
             return DataEntryReport(
-                entry=entry, hash=self.calc_hash(result), fetched=True, saved=False
+                entry=entry,
+                hash=data_hash,
+                fetched=True,
+                saved=False,
+                failed_keys=(
+                    sorted(e.errors) if isinstance(e, SplitRootDataWriteError) else None
+                ),
             )
         else:
             store_transaction._update_remote_status(
                 url=entry.url, status=True, error=""
             )
+            if validators is not None and (
+                validators.etag is not None or validators.last_modified is not None
+            ):
+                self._fetch_validators[conditional_key] = (validators, data_hash)
             return DataEntryReport(
-                entry=entry, hash=self.calc_hash(result), fetched=True, saved=True
+                entry=entry, hash=data_hash, fetched=True, saved=True
+            )
+
+    async def _save_coalesced_data(
+        self,
+        pending: PendingEntry,
+        result: JsonableValue,
+        store_transaction: PolicyStoreTransactionContextManager,
+    ) -> Tuple[DataEntryReport, List[PendingEntry]]:
+        """Like _save_fetched_data, but if the entry is an inline PATCH - the
+        PATCHes waiting right after it are merged into it (and once written,
+        reported as coalesced into it).
+
+        Args:
+            pending (PendingEntry): The entry as registered in the coalescer.
+            result (JsonableValue): The fetched data of the entry.
+            store_transaction (PolicyStoreTransactionContextManager): An active
+                transaction to the policy store.
+
+        Returns:
+            Tuple[DataEntryReport, List[PendingEntry]]: The report of the entry,
+                and the entries merged into its write (if it was written).
+        """
+        merged = self._coalescer.start(pending)
+        if not merged:
+            report = await self._save_fetched_data(
+                pending.entry, result, store_transaction
             )
+            return report, []
 
-    async def _fetch_data(self, entry: DataSourceEntry) -> JsonableValue:
+        logger.info(
+            "Merging {n} waiting patches into data entry for path '{path}'",
+            n=len(merged),
+            path=pending.entry.dst_path,
+        )
+        hashes = {p.seq: self.calc_hash(p.entry.data) for p in [pending, *merged]}
+        entry = self._coalescer.merge_patches(pending, merged)
+        report = await self._save_fetched_data(entry, entry.data, store_transaction)
+        if report.saved:
+            self._coalescer.merged(pending, merged, report)
+            for other in merged:
+                other.report.hash = hashes[other.seq]
+        else:
+            # the merged entries are still applied on their own
+            merged = []
+        report = report.copy(
+            update={"entry": pending.entry, "hash": hashes[pending.seq]}
+        )
+        return report, merged
+
+    @staticmethod
+    def _topics_tag(entries: List[DataSourceEntry]) -> str:
+        return ",".join(sorted({topic for entry in entries for topic in entry.topics}))
+
+    @classmethod
+    def _entry_metric_tags(cls, entry: DataSourceEntry) -> Dict[str, str]:
+        """The tags of the metrics of an entry: its data source and topics."""
+        return {
+            "source": metrics.source_tag(entry.url),
+            "topic": cls._topics_tag([entry]),
+        }
+
+    def _get_conditional_fetch_key(self, entry: DataSourceEntry) -> Optional[str]:
+        """Returns the key under which the cache validators of the given entry
+        are kept, or None if the entry should not be fetched conditionally
+        (conditional fetching is disabled, the data is inline or not fetched
+        with an HTTP GET request)."""
+        if not self._conditional_fetch or entry.data is not None or not entry.url:
+            return None
+
+        config = entry.config or {}
+        if config.get("fetcher") not in (None, "HttpFetchProvider"):
+            return None
+        if str(config.get("method", "get")).lower() != "get":
+            return None
+
+        return json.dumps(
+            [entry.url, entry.config, entry.dst_path, entry.save_method],
+            sort_keys=True,
+            default=pydantic_encoder,
+        )
+
+    async def _fetch_data(
+        self,
+        entry: DataSourceEntry,
+        conditional_key: Optional[str] = None,
+        shared_fetches: Optional[Dict[str, Any]] = None,
+    ) -> JsonableValue:
         """Fetches data from a data source using the configured data fetcher.
         Handles fetch errors, HTTP errors, and empty responses.
 
         Args:
             entry (DataSourceEntry): The configuration specifying how and where to fetch data.
+            conditional_key (str, optional): If given, the data source is fetched conditionally,
+                using the cache validators kept under this key (see _get_conditional_fetch_key),
+                and the result is returned as a HttpConditionalFetchResult.
+            shared_fetches (Dict[str, Any], optional): If given, the outcomes (result, error)
+                of the fetches already done for the update, by fetch request - the data source
+                is fetched only if an identical request (same url, config and cache
+                validators) wasn't already made.
 
         Returns:
             JsonableValue: The fetched data, as a JSON-serializable object.
         """
+        config = entry.config
+        if entry.blob is not None and entry.data is None:
+            config = self._data_blob_config(config)
+        if conditional_key is not None:
+            config = {**(config or {}), "conditional": True}
+            known_validators, _ = self._fetch_validators.get(
+                conditional_key, (None, None)
+            )
+            if known_validators is not None:
+                config["validators"] = known_validators.dict()
+
+        if shared_fetches is None or entry.data is not None:
+            return await self._fetch_data_source(entry, config)
+
+        fetch_key = json.dumps(
+            [entry.url, config], sort_keys=True, default=pydantic_encoder
+        )
+        if fetch_key in shared_fetches:
+            metrics.increment("data_updater.shared_fetches")
+        else:
+            try:
+                result = await self._fetch_data_source(entry, config)
+            except Exception as e:
+                shared_fetches[fetch_key] = (None, e)
+            else:
+                if isinstance(result, PaginatedFetchResult):
+                    # pages are consumed by writing them, and can't be shared
+                    return result
+                shared_fetches[fetch_key] = (result, None)
+        result, error = shared_fetches[fetch_key]
+        if error is not None:
+            raise error
+        return result
+
+    def _resolve_data_blob(self, entry: DataSourceEntry):
+        """If the data of the entry is kept by the server as a data blob
+        (instead of being embedded within the update, see the server's
+        DATA_BLOB_THRESHOLD), makes the entry fetch it from the server
+        (streamed, and checked against the blob's hash, see _fetch_data and
+        _fetch_data_source).
+
+        Only the url of the entry is resolved (against the server's url)
+        - the headers authenticating to the server are added to the
+        config of the fetch itself (see _data_blob_config), as the entry
+        is reported (e.g. to callbacks) and logged.
+        """
+        if entry.blob is None or entry.data is not None:
+            return
+        if not entry.url.startswith(("http://", "https://")):
+            entry.url = f"{opal_client_config.SERVER_URL}{entry.url}"
+
+    def _data_blob_config(self, config: Optional[dict]) -> dict:
+        """The fetcher config of a data blob: the config of its entry, with
+        the client's headers (to authenticate to the server) added to its
+        headers. The blob is streamed to the policy store as is - the server
+        serializes it like inline data is written (without null fields), and
+        the store wraps a list written to the root document either way."""
+        config = config or {}
+        return {
+            **config,
+            "headers": {
+                **(config.get("headers") or {}),
+                **dict(self._extra_headers or []),
+            },
+            "streaming": True,
+        }
+
+    async def _fetch_data_source(
+        self, entry: DataSourceEntry, config: Optional[dict]
+    ) -> JsonableValue:
+        """Fetches the data of an entry with the given fetcher config (see
+        _fetch_data)."""
         try:
             result = await self._data_fetcher.handle_url(
                 url=entry.url,
-                config=entry.config,
+                config=config,
                 data=entry.data,
             )
         except Exception as e:
@@ -612,6 +1089,18 @@ class DataUpdater:
                 f"Failed to decode response from url: '{entry.url}', got response code {result.status} with response: {error_content}"
             )
 
+        if entry.blob is not None:
+            data = (
+                result.data
+                if isinstance(result, HttpConditionalFetchResult)
+                else result
+            )
+            if isinstance(data, SpooledDataStream) and data.hash != entry.blob:
+                data.close()
+                raise Exception(
+                    f"Data blob fetched from {entry.url} doesn't match its hash {entry.blob}"
+                )
+
         return result
 
     async def _store_fetched_data(
@@ -619,6 +1108,7 @@ class DataUpdater:
         entry: DataSourceEntry,
         result: JsonableValue,
         store_transaction: PolicyStoreTransactionContextManager,
+        data_hash: Optional[str] = None,
     ) -> None:
         """Decides how to store fetched data (entirely or split by root keys)
         in the policy store based on the configuration.
@@ -628,6 +1118,7 @@ class DataUpdater:
             result (JsonableValue): The fetched data to be stored.
             store_transaction (PolicyStoreTransactionContextManager): The policy store
                 transaction under which to perform the write operations.
+            data_hash (str, optional): The hash of the fetched data (see calc_hash), if already known.
 
         Raises:
             Exception: If storing data fails for any reason.
@@ -636,13 +1127,28 @@ class DataUpdater:
         if policy_store_path and not policy_store_path.startswith("/"):
             policy_store_path = f"/{policy_store_path}"
 
+        if isinstance(result, PaginatedFetchResult):
+            await self._set_paginated_policy_data(
+                store_transaction,
+                url=entry.url,
+                path=policy_store_path,
+                save_method=entry.save_method,
+                pages=result,
+            )
+            return
+
+        split_root_data = opal_client_config.SPLIT_ROOT_DATA and (
+            policy_store_path in ("/", "")
+        )
+        if isinstance(result, SpooledDataStream) and (
+            split_root_data or entry.save_method != "PUT"
+        ):
+            # streamed data can't be split (or applied as a patch) without parsing it
+            result = await result.read_json()
+
         # If splitting root-level data is enabled and the path is "/", each top-level key
         # is stored individually to avoid overwriting the entire data root.
-        if (
-            opal_client_config.SPLIT_ROOT_DATA
-            and policy_store_path in ("/", "")
-            and isinstance(result, dict)
-        ):
+        if split_root_data and isinstance(result, dict):
             await self._set_split_policy_data(
                 store_transaction,
                 url=entry.url,
@@ -656,6 +1162,144 @@ class DataUpdater:
                 path=policy_store_path,
                 save_method=entry.save_method,
                 data=result,
+                data_hash=data_hash,
+            )
+
+    async def _set_paginated_policy_data(
+        self,
+        tx: PolicyStoreTransactionContextManager,
+        url: str,
+        path: str,
+        save_method: str,
+        pages: PaginatedFetchResult,
+    ):
+        """Writes the pages of a paginated data source as they are fetched:
+        the first page is PUT, the items of each following page are then
+        added (PATCH) to it - appended to an array, or set as keys of an
+        object. So only a few pages are held in memory at once.
+
+        The pages are normalized like the data of a PUT (see exclude_none_fields:
+        null values of objects are left out), so the data is written the same
+        whichever page it's in.
+
+        The write isn't atomic: the policy store holds the pages written so far
+        until the last one is. If a page fails to be fetched or written, the
+        previous data of the path (read before the first page is written, and
+        spooled meanwhile - see SpooledDataStream) is written back - unless the
+        policy store can't read its data, in which case the written pages are
+        left in place until the next update of the path.
+
+        Args:
+            tx (PolicyStoreTransactionContextManager): The active store transaction.
+            url (str): The data source URL (used for logging/reporting).
+            path (str): The policy store path where data will be stored (e.g. "/users").
+            save_method (str): Must be "PUT", the data of the path is replaced.
+            pages (PaginatedFetchResult): The pages to write.
+
+        Raises:
+            ValueError: If the data can't be written page by page (to the root path,
+                not by PUT, or its pages aren't all arrays or all objects).
+        """
+        if save_method != "PUT":
+            raise ValueError("Paginated data sources must be saved with PUT")
+        if path in ("/", ""):
+            raise ValueError("Paginated data sources can't be saved to the root path")
+
+        logger.info(
+            "Saving paginated data to policy-store: source url='{url}', destination path='{path}'",
+            url=url,
+            path=path,
+        )
+        # whatever was known about the data under (and above) the path is now stale
+        self._written_data_hashes.forget(path)
+        page_type: Optional[type] = None
+        previous_read = False
+        previous: Optional[SpooledDataStream] = None
+        try:
+            async for items in pages:
+                items = exclude_none_fields(items)
+                if page_type is None:
+                    page_type = type(items)
+                    previous_read, previous = await self._read_previous_policy_data(
+                        tx, path
+                    )
+                    await tx.set_policy_data(items, path=path)
+                    continue
+                if isinstance(items, list) and page_type is list:
+                    patch = [
+                        JSONPatchAction(op="add", path="/-", value=item)
+                        for item in items
+                    ]
+                elif isinstance(items, dict) and page_type is dict:
+                    patch = [
+                        JSONPatchAction(
+                            op="add",
+                            path="/" + key.replace("~", "~0").replace("/", "~1"),
+                            value=value,
+                        )
+                        for key, value in items.items()
+                    ]
+                else:
+                    raise ValueError(
+                        f"Page {pages.pages} of '{url}' doesn't match the type of its first page"
+                    )
+                if patch:
+                    await tx.patch_policy_data(patch, path=path)
+        except Exception:
+            if previous_read:
+                await self._restore_previous_policy_data(tx, path, previous)
+            raise
+        finally:
+            if previous is not None:
+                previous.close()
+
+    @staticmethod
+    async def _read_previous_policy_data(
+        tx: PolicyStoreTransactionContextManager, path: str
+    ) -> Tuple[bool, Optional[SpooledDataStream]]:
+        """Reads the data of the path (to write it back if a paginated write
+        fails).
+
+        Returns whether the policy store could read it, and the data
+        (None if the path didn't exist, and should be deleted instead).
+        """
+        try:
+            exists, data = await tx.get_data_if_exists(path)
+        except Exception as e:
+            logger.warning(
+                "Can't read the data of '{path}' (it won't be restored if the paginated write fails): {err}",
+                path=path,
+                err=repr(e),
+            )
+            return False, None
+        if not exists:
+            return True, None
+        stream = SpooledDataStream()
+        try:
+            await stream.write(json_dumps_bytes(data))
+        except:
+            stream.close()
+            raise
+        return True, stream
+
+    @staticmethod
+    async def _restore_previous_policy_data(
+        tx: PolicyStoreTransactionContextManager,
+        path: str,
+        previous: Optional[SpooledDataStream],
+    ):
+        try:
+            if previous is None:
+                # the path didn't exist before the write
+                await tx.delete_policy_data(path=path)
+            else:
+                await tx.set_policy_data(previous, path=path)
+            logger.info("Restored the previous data of '{path}'", path=path)
+        except Exception as e:
+            logger.exception(
+                "Failed to restore the previous data of '{path}': {err}",
+                path=path,
+                err=repr(e),
             )
 
     async def _set_split_policy_data(
@@ -669,24 +1313,51 @@ class DataUpdater:
         existing keys.
 
         For each top-level key in the dictionary, we create a sub-path under "/<key>"
-        and save the corresponding value.
+        and save the corresponding value. The keys are written concurrently (up to
+        SPLIT_ROOT_DATA_MAX_CONCURRENT_WRITES at a time), and all of them are attempted
+        even if some fail.
 
         Args:
             tx (PolicyStoreTransactionContextManager): The active store transaction.
             url (str): The data source URL (used for logging/reporting).
             save_method (str): Either "PUT" (full overwrite) or "PATCH" (merge).
             data (Dict[str, Any]): The dictionary to be split and stored.
+
+        Raises:
+            SplitRootDataWriteError: If any of the keys failed to be written.
         """
         logger.info("Splitting root data to {n} keys", n=len(data))
+        semaphore = asyncio.Semaphore(
+            max(1, opal_client_config.SPLIT_ROOT_DATA_MAX_CONCURRENT_WRITES)
+        )
 
-        for prefix, obj in data.items():
-            await self._set_policy_data(
-                tx,
-                url=url,
-                path=f"/{prefix}",
-                save_method=save_method,
-                data=obj,
-            )
+        async def _set_key(prefix: str, obj: JsonableValue):
+            async with semaphore:
+                await self._set_policy_data(
+                    tx,
+                    url=url,
+                    path=f"/{prefix}",
+                    save_method=save_method,
+                    data=obj,
+                )
+
+        results = await asyncio.gather(
+            *(_set_key(prefix, obj) for prefix, obj in data.items()),
+            return_exceptions=True,
+        )
+        errors = {}
+        for prefix, result in zip(data, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                logger.error(
+                    "Failed to save root key '{key}' to policy-store: {exc}",
+                    key=prefix,
+                    exc=repr(result),
+                )
+                errors[prefix] = result
+        if errors:
+            raise SplitRootDataWriteError(errors)
 
     async def _set_policy_data(
         self,
@@ -695,26 +1366,124 @@ class DataUpdater:
         path: str,
         save_method: str,
         data: JsonableValue,
+        data_hash: Optional[str] = None,
     ):
         """Persists data to a specific path in the policy store.
 
+        If DATA_UPDATER_SKIP_UNCHANGED_WRITES is set, a PUT of data identical
+        (by hash) to the data last written to the same path is skipped.
+        If DATA_UPDATER_DELTA_WRITES is set, a PUT of data to a path whose
+        last written data is known is sent as a patch of the changes, if
+        that's much cheaper (see _make_delta_patch).
+
         Args:
             tx (PolicyStoreTransactionContextManager): The active store transaction.
             url (str): The URL of the source data (used for logging/reporting).
             path (str): The policy store path where data will be stored (e.g. "/roles").
             save_method (str): Either "PUT" (full overwrite) or "PATCH" (partial merge).
             data (JsonableValue): The data to be written.
+            data_hash (str, optional): The hash of the data (see calc_hash), if already known.
         """
+        track_writes = self._skip_unchanged_writes or self._delta_writes
+        if track_writes and save_method == "PUT":
+            data_hash = data_hash or self.calc_hash(data)
+        if self._skip_unchanged_writes and save_method == "PUT":
+            if data_hash and self._written_data_hashes.get(path) == data_hash:
+                logger.info(
+                    "Skipping write of unchanged data to policy-store: source url='{url}', destination path='{path}'",
+                    url=url,
+                    path=path or "/",
+                )
+                metrics.increment("data_updater.unchanged_writes_skipped")
+                return
+
+        delta_patch = document = None
+        if (
+            self._delta_writes
+            and save_method == "PUT"
+            and not isinstance(data, SpooledDataStream)
+        ):
+            # the data as the policy store gets it (without null values) - which
+            # is also a copy, so changes to the written data (e.g. by whoever
+            # fetched it) don't change the base of the next patch
+            document = exclude_none_fields(data)
+            delta_patch = self._make_delta_patch(path, document)
+            if delta_patch is not None and not delta_patch:
+                logger.info(
+                    "Skipping write of unchanged data to policy-store: source url='{url}', destination path='{path}'",
+                    url=url,
+                    path=path or "/",
+                )
+                metrics.increment("data_updater.unchanged_writes_skipped")
+                return
+
         logger.info(
-            "Saving fetched data to policy-store: source url='{url}', destination path='{path}'",
+            "Saving fetched data to policy-store: source url='{url}', destination path='{path}'{delta}",
             url=url,
             path=path or "/",
+            delta=f" (as a patch of {len(delta_patch)} changes)" if delta_patch else "",
         )
+        # whatever was known about the data under (and above) the path is now stale
+        self._written_data_hashes.forget(path)
         if save_method == "PUT":
-            await tx.set_policy_data(data, path=path)
+            if delta_patch:
+                try:
+                    await tx.patch_policy_data(delta_patch, path=path)
+                    metrics.increment("data_updater.delta_writes")
+                except Exception as e:
+                    # the policy store doesn't hold the data last written to the path
+                    # (e.g. it was restarted, or someone else wrote to the path)
+                    logger.warning(
+                        "Policy store rejected patch of data at path '{path}', writing it in full instead: {exc}",
+                        path=path or "/",
+                        exc=repr(e),
+                    )
+                    metrics.increment("data_updater.delta_writes_rejected")
+                    await tx.set_policy_data(data, path=path)
+            else:
+                await tx.set_policy_data(data, path=path)
+            if track_writes and data_hash:
+                self._written_data_hashes.set(path, data_hash, data=document)
         else:
             await tx.patch_policy_data(data, path=path)
 
+    def _make_delta_patch(
+        self, path: str, data: JsonableValue
+    ) -> Optional[List[JSONPatchAction]]:
+        """Diffs data about to be written to a path against the data last
+        written to it (both as the policy store got them, without null values -
+        see exclude_none_fields).
+
+        Returns:
+            The JSON patch (RFC 6902) turning the last written data into the given
+            data (empty if they're identical), or None if the data should be written
+            as is: the last written data is unknown, the patch can't be applied by
+            the policy store, or it isn't much smaller than the data (see
+            DATA_UPDATER_DELTA_WRITES_MAX_RATIO).
+        """
+        previous = self._written_data_hashes.get_data(path)
+        if previous is None or isinstance(data, SpooledDataStream):
+            return None
+        # patches are applied to documents (the root document must be an object)
+        containers = (dict,) if path in ("", "/") else (dict, list)
+        if not isinstance(previous, containers) or not isinstance(data, containers):
+            return None
+
+        operations = jsonpatch.make_patch(previous, data).patch
+        if not operations:
+            return []
+        if any(op["op"] not in _DELTA_PATCH_OPS for op in operations):
+            # e.g. a renamed key or a reordered list (diffed as a "move"), which
+            # the policy store can't apply
+            return None
+        max_size = len(json_dumps_bytes(data)) * (
+            opal_client_config.DATA_UPDATER_DELTA_WRITES_MAX_RATIO
+        )
+        if len(json_dumps_bytes(operations)) > max_size:
+            metrics.increment("data_updater.delta_writes_too_large")
+            return None
+        return [JSONPatchAction(**op) for op in operations]
+
     @property
     def callbacks_reporter(self) -> CallbacksReporter:
         """Provides external access to the CallbacksReporter instance, so that
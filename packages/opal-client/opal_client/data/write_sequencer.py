@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from opal_client.config import opal_client_config
+from opal_client.data.coalescer import DataUpdateCoalescer
+from opal_common.schemas.data import DataSourceEntry
+from opal_common.synchronization.hierarchical_lock import HierarchicalLock
+
+
+class WriteTicket:
+    """The place of a data update entry in the order of writes to the policy
+    store."""
+
+    __slots__ = ("seq", "path", "overwrites", "stale", "finished")
+
+    def __init__(self, seq: int, entry: DataSourceEntry):
+        self.seq = seq
+        self.path = DataUpdateCoalescer.normalize_path(entry.dst_path)
+        # a PUT overwrites all the data under its path (unless it's split root data)
+        self.overwrites = entry.save_method == "PUT" and not (
+            opal_client_config.SPLIT_ROOT_DATA and not self.path
+        )
+        # set once a later entry overwrote the data this entry was going to write
+        # (or merged it into its own write), so this entry must not be written
+        self.stale = False
+        # set once the entry was written (or dropped, or failed)
+        self.finished = asyncio.Event()
+
+
+class DataWriteSequencer:
+    """Orders the writes of data update entries to the policy store, while
+    their data is fetched concurrently (a fetcher-writer lock).
+
+    Entries are registered in order of arrival (before being fetched), and the
+    write of each entry waits (see `write_turn`) for the earlier entries to
+    conflicting paths (the same path, its ancestors or descendants) to be
+    written - except for entries it overwrites anyway: a PUT doesn't wait for
+    earlier entries to the same path or its descendants, which become stale
+    once it's written, and are then dropped instead of being written after it.
+
+    Conversely, an entry that a later (pending) PUT is going to overwrite
+    waits for that PUT first - even if the PUT was registered while the entry
+    waited for the lock - so a burst of PUTs to a path is written once.
+    Entries only become stale once the later write succeeded - if it failed,
+    they're written as usual.
+
+    The writes themselves are done under the destination path lock.
+    """
+
+    def __init__(self, lock: HierarchicalLock):
+        self._lock = lock
+        self._seq = itertools.count()
+        self._pending: Dict[int, WriteTicket] = {}
+
+    def register(self, entry: DataSourceEntry) -> WriteTicket:
+        """Registers an entry about to be fetched, and returns its ticket."""
+        ticket = WriteTicket(next(self._seq), entry)
+        self._pending[ticket.seq] = ticket
+        return ticket
+
+    def _must_wait_for(self, ticket: WriteTicket, other: WriteTicket) -> bool:
+        if other.seq >= ticket.seq or not DataUpdateCoalescer.is_conflicting(
+            other.path, ticket.path
+        ):
+            return False
+        return not (
+            ticket.overwrites
+            and DataUpdateCoalescer.is_same_or_descendant(other.path, ticket.path)
+        )
+
+    def _overwritten_by(self, ticket: WriteTicket) -> Optional[WriteTicket]:
+        """Returns the latest later entry that will overwrite the data of the
+        entry, if every later entry conflicting with the entry before it is
+        overwritten by it as well (so it doesn't have to wait for the
+        entry)."""
+        overwriting = None
+        # the common ancestor of the entry and the later entries conflicting with it
+        common = ticket.path.split("/")
+        for other in self._pending.values():
+            if other.seq <= ticket.seq or not DataUpdateCoalescer.is_conflicting(
+                other.path, ticket.path
+            ):
+                continue
+            if other.overwrites and DataUpdateCoalescer.is_same_or_descendant(
+                "/".join(common), other.path
+            ):
+                overwriting = other
+            segments = other.path.split("/")
+            common = [
+                segment
+                for segment, _ in itertools.takewhile(
+                    lambda pair: pair[0] == pair[1], zip(common, segments)
+                )
+            ]
+        return overwriting
+
+    @asynccontextmanager
+    async def write_turn(self, ticket: WriteTicket) -> AsyncIterator[bool]:
+        """Waits for the entry's turn to write, and holds the destination path
+        lock while in the context.
+
+        Yields:
+            bool: False if the entry is stale (and should not be written).
+        """
+        while not ticket.stale:
+            overwriting = self._overwritten_by(ticket)
+            if overwriting is not None:
+                await overwriting.finished.wait()
+                # unless it was written, the entry writes as usual
+                continue
+
+            earlier: List[WriteTicket] = [
+                other
+                for other in self._pending.values()
+                if self._must_wait_for(ticket, other)
+            ]
+            for other in earlier:
+                await other.finished.wait()
+
+            async with self._lock.lock(ticket.path):
+                # a later entry that will overwrite the entry might have been
+                # registered while it waited for the lock - if so, wait for it
+                if ticket.stale or self._overwritten_by(ticket) is None:
+                    yield not ticket.stale
+                    return
+        yield False
+
+    def written(self, ticket: WriteTicket, merged: Iterable[WriteTicket] = ()):
+        """Records that the entry's data was written to the policy store.
+
+        Must be called in the entry's write turn. The earlier entries it
+        overwrote, and the later entries merged into its write, become
+        stale.
+        """
+        for other in merged:
+            other.stale = True
+        if not ticket.overwrites:
+            return
+        for other in self._pending.values():
+            if other.seq < ticket.seq and DataUpdateCoalescer.is_same_or_descendant(
+                other.path, ticket.path
+            ):
+                other.stale = True
+
+    def done(self, ticket: WriteTicket):
+        """Stops tracking the entry (once written, dropped or failed), letting
+        the later entries waiting for it write."""
+        ticket.finished.set()
+        self._pending.pop(ticket.seq, None)
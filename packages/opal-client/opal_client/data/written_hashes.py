@@ -0,0 +1,80 @@
+from typing import Any, Dict, List, Optional
+
+
+class _PathNode:
+    __slots__ = ("hash", "data", "children")
+
+    def __init__(self):
+        self.hash: Optional[str] = None
+        self.data: Optional[Any] = None
+        self.children: Dict[str, "_PathNode"] = {}
+
+
+class WrittenDataHashes:
+    """Keeps the hash of the data last written (PUT) to each path of the policy
+    store, so writes of identical data can be skipped - and optionally the
+    data itself, so later writes to the same path can be sent as a patch
+    (see DATA_UPDATER_DELTA_WRITES).
+
+    Paths are kept in a tree (by path segments), since writing to a path
+    changes the data of all of its ancestors and descendants - which
+    makes their known hashes stale. All operations are O(depth of path).
+    """
+
+    def __init__(self):
+        self._root = _PathNode()
+
+    @staticmethod
+    def _split(path: str) -> List[str]:
+        return [segment for segment in path.split("/") if segment]
+
+    def _find(self, path: str) -> Optional[_PathNode]:
+        node = self._root
+        for segment in self._split(path):
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def get(self, path: str) -> Optional[str]:
+        """Returns the hash of the data last written to exactly this path, or
+        None if unknown."""
+        node = self._find(path)
+        return node.hash if node is not None else None
+
+    def get_data(self, path: str) -> Optional[Any]:
+        """Returns the data last written to exactly this path, or None if
+        unknown (or not kept)."""
+        node = self._find(path)
+        return node.data if node is not None else None
+
+    def set(self, path: str, data_hash: str, data: Optional[Any] = None):
+        """Records data with the given hash was written to the path (keeping
+        the data itself, if given)."""
+        self.forget(path)
+        node = self._root
+        for segment in self._split(path):
+            node = node.children.setdefault(segment, _PathNode())
+        node.hash = data_hash
+        node.data = data
+
+    def forget(self, path: str):
+        """Forgets the hashes of the path, its ancestors and its descendants
+        (i.e: all the paths whose data is affected by writing to this path)."""
+        segments = self._split(path)
+        if not segments:
+            self.clear()
+            return
+
+        node = self._root
+        for segment in segments[:-1]:
+            node.hash = node.data = None
+            node = node.children.get(segment)
+            if node is None:
+                return
+        node.hash = node.data = None
+        node.children.pop(segments[-1], None)
+
+    def clear(self):
+        """Forgets all known hashes."""
+        self._root = _PathNode()
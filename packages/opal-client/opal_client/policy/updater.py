@@ -1,5 +1,5 @@
 import asyncio
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 import pydantic
 from fastapi_websocket_pubsub import PubSubClient
@@ -18,6 +18,7 @@ from opal_client.policy_store.policy_store_client_factory import (
 )
 from opal_common.async_utils import TakeANumberQueue, TasksPool
 from opal_common.config import opal_common_config
+from opal_common.git_utils.bundle_utils import BundleUtils
 from opal_common.schemas.data import DataUpdateReport
 from opal_common.schemas.policy import PolicyBundle, PolicyUpdateMessage
 from opal_common.schemas.store import TransactionType
@@ -109,6 +110,8 @@ class PolicyUpdater:
         self._tasks = TasksPool()
         self._on_connect_callbacks = on_connect or []
         self._on_disconnect_callbacks = on_disconnect or []
+        # called with the paths of the policy store written by data modules of bundles
+        self._bundle_data_callbacks: List[Callable[[List[str]], None]] = []
 
     async def __aenter__(self):
         await self.start()
@@ -346,7 +349,11 @@ class PolicyUpdater:
                 error=bundle_error,
             )
             if bundle:
-                await store_transaction.set_policies(bundle)
+                try:
+                    await store_transaction.set_policies(bundle)
+                finally:
+                    # even a failed bundle may have written some of its data
+                    self._notify_bundle_data_written(bundle)
                 # if we got here, we did not throw during the transaction
                 if self._should_send_reports:
                     # spin off reporting (no need to wait on it)
@@ -355,6 +362,21 @@ class PolicyUpdater:
                         self._callbacks_reporter.report_update_results(report)
                     )
 
+    def on_bundle_data_written(self, callback: Callable[[List[str]], None]):
+        """Registers a callback, called with the paths of the policy store
+        whose data was written (or deleted) by the data modules of a policy
+        bundle."""
+        self._bundle_data_callbacks.append(callback)
+
+    def _notify_bundle_data_written(self, bundle: PolicyBundle):
+        paths = [module.path for module in bundle.data_modules] + [
+            str(path) for path in BundleUtils.sorted_data_modules_to_delete(bundle)
+        ]
+        if not paths:
+            return
+        for callback in self._bundle_data_callbacks:
+            callback(paths)
+
     async def handle_policy_updates(self):
         while True:
             try:
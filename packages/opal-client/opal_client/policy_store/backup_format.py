@@ -0,0 +1,218 @@
+"""The format of policy store backups (see BasePolicyStoreClient.full_export),
+written and read incrementally - so backing up (or restoring) a large store
+never holds the whole backup, or a parsed copy of it, in memory.
+
+A backup is a sequence of JSON lines:
+
+    {"opal_store_backup": 2, ...}             header (e.g. "journal_seq")
+    {"policy_id": "...", "policy_code": "..."} a policy (one line per policy)
+    {"path": "/users", "data": {...}}          a document of the data
+    {"path": "/users", "merge": {...}}         keys added to the document
+    {"raw_data": true}                         the rest of the backup is the
+                                               data, as a single JSON document
+
+The data is written as a series of documents in pre-order (each document
+before the ones under it), each up to STORE_BACKUP_CHUNK_SIZE - objects
+larger than that are written in groups of their keys (the first group as
+the document, the rest merged into it), and their keys larger than that
+are written as documents of their own, following the groups. Documents
+kept as raw JSON (see RawJson) are written as is, as documents of their
+own.
+
+Backups of older versions (a single JSON document of policies and data)
+are read as well.
+"""
+
+import codecs
+import re
+from typing import Any, AsyncIterator, Dict, Iterator
+
+from aiofiles.threadpool.text import AsyncTextIOWrapper
+from opal_common.serialization import json_dumps, json_loads
+
+BACKUP_VERSION = 2
+
+# keys that can be written to by their path (without escaping) - OpaClient's
+# _merge_policy_data writes the keys of "merge" records as "/{key}", relying on it
+_PATH_KEY = re.compile(r"^[A-Za-z0-9_.:@-]+$")
+
+
+class RawJson:
+    """A JSON document kept serialized (e.g. written to the policy store as raw
+    JSON, see OpaStaticDataCache), parsed whenever it's read.
+
+    The document is kept on a single line - line breaks can only be
+    whitespace in JSON, so they're replaced with spaces.
+    """
+
+    __slots__ = ("raw",)
+
+    def __init__(self, raw: bytes):
+        self.raw = raw.replace(b"\r", b" ").replace(b"\n", b" ")
+
+    def parse(self) -> Any:
+        return json_loads(self.raw)
+
+
+def parse_raw_json(node: Any) -> Any:
+    """Returns the node with the RawJson documents in it parsed (copying only
+    the objects and arrays that hold them)."""
+    if isinstance(node, RawJson):
+        return node.parse()
+    if isinstance(node, dict):
+        parsed = {key: parse_raw_json(value) for key, value in node.items()}
+        if any(parsed[key] is not value for key, value in node.items()):
+            return parsed
+    elif isinstance(node, list):
+        parsed = [parse_raw_json(value) for value in node]
+        if any(item is not value for item, value in zip(parsed, node)):
+            return parsed
+    return node
+
+
+def _estimate_size(node: Any, limit: int) -> int:
+    """(Roughly) the size of the serialized node - without serializing it,
+    and only walking it until it's known to be larger than limit."""
+    total = 0
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, dict):
+            total += 2 + len(node)
+            for key, value in node.items():
+                total += len(str(key)) + 3
+                nodes.append(value)
+        elif isinstance(node, list):
+            total += 2 + len(node)
+            nodes.extend(node)
+        elif isinstance(node, str):
+            total += len(node) + 2
+        elif isinstance(node, RawJson):
+            total += len(node.raw)
+        else:
+            total += 8
+        if total > limit:
+            break
+    return total
+
+
+def iter_data_chunks(
+    data: Any, chunk_size: int, path: str = ""
+) -> Iterator[Dict[str, Any]]:
+    """Splits the data into "data" and "merge" records of documents of up to
+    (roughly) chunk_size, in pre-order (see the module's docs).
+
+    Only objects whose keys can all be written to by their path are
+    split - other documents are written as a whole, whatever their size.
+    RawJson documents are only parsed if they're within such a document.
+    """
+    if isinstance(data, RawJson):
+        yield {"path": path, "data": data}
+        return
+    if (
+        not isinstance(data, dict)
+        or _estimate_size(data, chunk_size) <= chunk_size
+        or not all(isinstance(key, str) and _PATH_KEY.match(key) for key in data)
+    ):
+        yield {"path": path, "data": parse_raw_json(data)}
+        return
+    op, group, group_size, larger = "data", {}, 0, []
+    for key, value in data.items():
+        size = _estimate_size(value, chunk_size) + len(key) + 4
+        if isinstance(value, RawJson) or (
+            size > chunk_size and isinstance(value, dict)
+        ):
+            larger.append(key)
+            continue
+        if group and group_size + size > chunk_size:
+            yield {"path": path, op: group}
+            op, group, group_size = "merge", {}, 0
+        group[key] = parse_raw_json(value)
+        group_size += size
+    if group or op == "data":
+        yield {"path": path, op: group}
+    for key in larger:
+        yield from iter_data_chunks(data[key], chunk_size, f"{path}/{key}")
+
+
+class StoreBackupWriter:
+    """Writes a backup, record by record."""
+
+    def __init__(self, writer: AsyncTextIOWrapper):
+        self._writer = writer
+
+    async def _write_record(self, record: Dict[str, Any]):
+        data = record.get("data")
+        if isinstance(data, RawJson):
+            # written as is, rather than parsed and serialized again
+            path = json_dumps(record["path"])
+            await self._writer.write(f'{{"path": {path}, "data": ')
+            await self._writer.write(data.raw.decode("utf-8") + "}\n")
+            return
+        await self._writer.write(json_dumps(record, default=str) + "\n")
+
+    async def write_header(self, **fields: Any):
+        await self._write_record({"opal_store_backup": BACKUP_VERSION, **fields})
+
+    async def write_policy(self, policy_id: str, policy_code: str):
+        await self._write_record({"policy_id": policy_id, "policy_code": policy_code})
+
+    async def write_data(self, data: Any, chunk_size: int):
+        for record in iter_data_chunks(data, chunk_size):
+            await self._write_record(record)
+
+    async def write_raw_data(self, chunks: AsyncIterator[bytes]):
+        """Writes the data as a single (raw) JSON document, chunk by chunk -
+        must be the last record of the backup."""
+        await self._write_record({"raw_data": True})
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        async for chunk in chunks:
+            await self._writer.write(decoder.decode(chunk))
+        await self._writer.write(decoder.decode(b"", final=True))
+
+
+async def read_store_backup(
+    reader: AsyncTextIOWrapper,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yields the records of a backup (see the module's docs), one by one.
+
+    A "raw_data" record is followed by the rest of the backup, read by
+    iter_raw_data. Backups of older versions are yielded as records of
+    the same format.
+    """
+    line = await reader.readline()
+    if not line:
+        return
+    header = json_loads(line) if line.endswith("\n") else None
+    if not isinstance(header, dict) or "opal_store_backup" not in header:
+        # a backup of an older version - a single document of policies and data
+        backup = json_loads(line + await reader.read())
+        policies, data = backup.pop("policies"), backup.pop("data")
+        yield {"opal_store_backup": 1, **backup}
+        for policy_id, policy_code in policies.items():
+            yield {"policy_id": policy_id, "policy_code": policy_code}
+        yield {"path": "", "data": data}
+        return
+    yield header
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        if not line.endswith("\n"):
+            raise ValueError("The backup is truncated")
+        record = json_loads(line)
+        yield record
+        if record.get("raw_data"):
+            return
+
+
+async def iter_raw_data(
+    reader: AsyncTextIOWrapper, chunk_size: int = 2**16
+) -> AsyncIterator[bytes]:
+    """Yields the rest of the backup (following a "raw_data" record), chunk by
+    chunk."""
+    while True:
+        chunk = await reader.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk.encode("utf-8")
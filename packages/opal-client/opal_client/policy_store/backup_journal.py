@@ -0,0 +1,182 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+from opal_client.logger import logger
+from opal_common.async_utils import run_sync
+from opal_common.serialization import json_dumps_bytes, json_loads
+
+
+class StoreBackupJournal:
+    """An append-only journal of the operations applied to the policy store
+    since its last backup snapshot (see OpalClient.backup_store).
+
+    Each operation is appended as a line of JSON, numbered by a sequence
+    number, and the journal is fsynced after each write to the store - so
+    a crash loses at most the write in progress. Backups are then
+    restored by importing the snapshot, and replaying the operations
+    journaled after it (those with a larger sequence number than the
+    snapshot's).
+
+    Once the journal grows larger than the snapshot, a new snapshot is
+    taken (compaction) and the operations it includes are dropped from
+    the journal - so the cost of backups is proportional to the rate of
+    change, rather than to the size of the store. The journal then starts
+    with a "snapshot" record, holding the sequence number of the last
+    operation included in the snapshot.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._pending: List[bytes] = []
+        self._lock = asyncio.Lock()
+        self._file = None
+        self._seq = 0
+        self._size = 0
+        # the last operation included in the saved snapshot
+        self._snapshot_seq = 0
+        # the last operation included in the snapshot being taken (see mark_snapshot)
+        self._marked_seq: Optional[int] = None
+        self._scan()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def seq(self) -> int:
+        """The sequence number of the last journaled operation."""
+        return self._seq
+
+    @property
+    def size(self) -> int:
+        """The size (in bytes) of the journal."""
+        return self._size
+
+    @property
+    def changed(self) -> bool:
+        """Whether operations were journaled since the last snapshot."""
+        return self._seq > self._snapshot_seq
+
+    def _scan(self):
+        """Finds the last sequence number in the journal, and drops a partial
+        operation at its end (written when the client crashed)."""
+        if not os.path.isfile(self._path):
+            return
+        valid_size = 0
+        with open(self._path, "rb") as f:
+            for line in f:
+                try:
+                    record = json_loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                if record["op"] == "snapshot" and not valid_size:
+                    self._snapshot_seq = record["seq"]
+                self._seq = record["seq"]
+                valid_size += len(line)
+        if valid_size < os.path.getsize(self._path):
+            logger.warning(
+                "Dropping a partially written operation at the end of the policy store journal: {path}",
+                path=self._path,
+            )
+            os.truncate(self._path, valid_size)
+        self._size = valid_size
+
+    def record(self, op: str, data: Optional[bytes] = None, **fields: Any):
+        """Journals an operation applied to the store (written by sync).
+
+        Args:
+            op (str): the operation (see OpaClient.replay_backup_journal)
+            data (bytes, optional): the serialized (JSON) data of the operation
+            fields: the other (JSON serializable) arguments of the operation
+        """
+        self._seq += 1
+        line = json_dumps_bytes({"seq": self._seq, "op": op, **fields})
+        if data is not None:
+            line = line[:-1] + b',"data":' + data + b"}"
+        self._pending.append(line + b"\n")
+
+    async def sync(self):
+        """Writes the recorded operations to the journal, and fsyncs it.
+
+        Operations recorded while a previous sync is in progress are
+        written together (with a single fsync).
+        """
+        async with self._lock:
+            if self._pending:
+                lines, self._pending = self._pending, []
+                await run_sync(self._write, lines)
+
+    def _write(self, lines: List[bytes]):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            self._file = open(self._path, "ab")
+        for line in lines:
+            self._file.write(line)
+            self._size += len(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def mark_snapshot(self) -> int:
+        """Marks that a snapshot of the store is being taken - it must include
+        all the operations journaled so far (and none of the ones journaled
+        after), returns the sequence number of the last of them."""
+        self._marked_seq = self._seq
+        return self._seq
+
+    async def commit_snapshot(self):
+        """Drops the operations included in the snapshot marked last (see
+        mark_snapshot), once it was saved."""
+        if self._marked_seq is None:
+            return
+        snapshot_seq, self._marked_seq = self._marked_seq, None
+        async with self._lock:
+            await run_sync(self._truncate, snapshot_seq)
+        self._snapshot_seq = snapshot_seq
+
+    def _truncate(self, snapshot_seq: int):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        # keeps the sequence numbers going (e.g. after a restart)
+        lines = [json_dumps_bytes({"seq": snapshot_seq, "op": "snapshot"}) + b"\n"]
+        if os.path.isfile(self._path):
+            with open(self._path, "rb") as f:
+                # operations journaled while the snapshot was being saved are kept
+                lines += [line for line in f if json_loads(line)["seq"] > snapshot_seq]
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+        self._size = sum(len(line) for line in lines)
+
+    async def read(self, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """Returns the journaled operations with a sequence number larger than
+        the given one (e.g. those a snapshot doesn't include), in order."""
+        await self.sync()
+        return await run_sync(self._read, after_seq)
+
+    def _read(self, after_seq: int) -> List[Dict[str, Any]]:
+        if not os.path.isfile(self._path):
+            return []
+        with open(self._path, "rb") as f:
+            records = [json_loads(line) for line in f]
+        return [
+            record
+            for record in records
+            if record["seq"] > after_seq and record["op"] != "snapshot"
+        ]
+
+    async def close(self):
+        """Writes the operations recorded last, and closes the journal (called
+        on the client's shutdown)."""
+        await self.sync()
+        async with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
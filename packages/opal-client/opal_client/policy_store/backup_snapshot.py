@@ -0,0 +1,278 @@
+"""A binary snapshot of a policy store backup (see backup_format), for fast
+restores on cold start.
+
+The snapshot holds the same policies and data documents as the backup
+it's converted from, each as a separate section of raw JSON - written
+to the policy store as is, without parsing and serializing it again:
+
+    b"OPALSNAP"                      magic
+    section, section, ...            each document of the data (in
+                                     pre-order, see backup_format), then
+                                     the policies (a JSON object of
+                                     policy_id -> policy_code)
+    index                            JSON: the header, and the offset,
+                                     length and CRC-32 of each section
+    footer                           index offset (8 bytes), index length
+                                     (4 bytes), index CRC-32 (4 bytes),
+                                     b"OPALSNAP"
+
+The snapshot is memory-mapped, so opening it only reads its index - each
+section is read (and its checksum verified) when it's restored.
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import zlib
+from itertools import groupby
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+import aiofiles
+import aiofiles.os
+from aiofiles.threadpool.binary import AsyncBufferedIOBase
+from opal_client.policy_store.backup_format import iter_raw_data, read_store_backup
+from opal_common.async_utils import run_sync
+from opal_common.fetcher.data_stream import SpooledDataStream
+from opal_common.serialization import json_dumps_bytes, json_loads
+
+SNAPSHOT_VERSION = 1
+
+_MAGIC = b"OPALSNAP"
+_FOOTER = struct.Struct(">QII8s")
+
+
+class SnapshotSection(NamedTuple):
+    """A document of the data (see backup_format) in the snapshot."""
+
+    path: str
+    offset: int
+    length: int
+    crc: int
+    # whether the document's keys are merged into the document at path
+    merge: bool = False
+
+
+class StoreSnapshotWriter:
+    """Writes a snapshot, section by section."""
+
+    def __init__(self, writer: AsyncBufferedIOBase):
+        self._writer = writer
+        self._offset = 0
+        self._policies: Optional[List[int]] = None
+        self._documents: List[List[Any]] = []
+
+    async def _write(self, chunk: bytes):
+        await self._writer.write(chunk)
+        self._offset += len(chunk)
+
+    async def _write_section(self, chunks: AsyncIterator[bytes]) -> List[int]:
+        if not self._offset:
+            await self._write(_MAGIC)
+        offset, crc = self._offset, 0
+        async for chunk in chunks:
+            await self._write(chunk)
+            crc = zlib.crc32(chunk, crc)
+        return [offset, self._offset - offset, crc]
+
+    @staticmethod
+    async def _chunks(*chunks: bytes) -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            yield chunk
+
+    async def write_policies(self, policies: Dict[str, str]):
+        self._policies = await self._write_section(
+            self._chunks(json_dumps_bytes(policies))
+        )
+
+    async def write_document(self, path: str, data: Any, merge: bool = False):
+        location = await self._write_section(
+            self._chunks(json_dumps_bytes(data, default=str))
+        )
+        self._documents.append([path, *location, merge])
+
+    async def write_raw_document(self, path: str, chunks: AsyncIterator[bytes]):
+        """Writes a document of raw (serialized) JSON, chunk by chunk."""
+        self._documents.append([path, *await self._write_section(chunks), False])
+
+    async def finish(self, **header: Any):
+        """Writes the index (with the given header fields) - the snapshot is
+        unreadable until it's written."""
+        if self._policies is None:
+            await self.write_policies({})
+        index = json_dumps_bytes(
+            {
+                "header": {"opal_store_snapshot": SNAPSHOT_VERSION, **header},
+                "policies": self._policies,
+                "documents": self._documents,
+            }
+        )
+        index_offset = self._offset
+        await self._write(index)
+        await self._write(
+            _FOOTER.pack(index_offset, len(index), zlib.crc32(index), _MAGIC)
+        )
+
+
+class StoreSnapshot:
+    """A memory-mapped snapshot (see the module's docs).
+
+    Raises ValueError if the file isn't a (complete) snapshot.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < len(_MAGIC) + _FOOTER.size:
+                raise ValueError(f"Not a policy store snapshot: {path}")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            self._file.close()
+            raise
+        try:
+            self._read_index(path)
+        except:
+            self.close()
+            raise
+
+    def _read_index(self, path: str):
+        index_offset, index_length, index_crc, magic = _FOOTER.unpack(
+            self._mmap[-_FOOTER.size :]
+        )
+        if magic != _MAGIC or self._mmap[: len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"Not a policy store snapshot: {path}")
+        index = self._read(path, index_offset, index_length, index_crc)
+        index = json_loads(index)
+        self.header: Dict[str, Any] = index["header"]
+        self._policies: List[int] = index["policies"]
+        self._sections = [SnapshotSection(*section) for section in index["documents"]]
+
+    def _read(self, path: str, offset: int, length: int, crc: int) -> bytes:
+        data = self._mmap[offset : offset + length]
+        if len(data) != length or zlib.crc32(data) != crc:
+            raise ValueError(f"Corrupted policy store snapshot: {path}")
+        return data
+
+    @property
+    def paths(self) -> List[str]:
+        """The paths of the documents of the data, in pre-order."""
+        return list(dict.fromkeys(section.path for section in self._sections))
+
+    def sections(self, path: str = "") -> List[SnapshotSection]:
+        """The documents of the data of the subtree at path, in pre-order."""
+        return [
+            section
+            for section in self._sections
+            if not path or section.path == path or section.path.startswith(f"{path}/")
+        ]
+
+    def policies(self) -> Dict[str, str]:
+        return json_loads(self._read(self._file.name, *self._policies))
+
+    def read_raw(self, section: SnapshotSection) -> bytes:
+        """Returns the raw (serialized) JSON of the document."""
+        return self._read(self._file.name, section.offset, section.length, section.crc)
+
+    def read(self, section: SnapshotSection) -> Any:
+        return json_loads(self.read_raw(section))
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "StoreSnapshot":
+        return self
+
+    def __exit__(self, exc_type=None, exc_val=None, tb=None):
+        self.close()
+
+
+async def restore_snapshot_data(
+    snapshot: StoreSnapshot,
+    set_policy_data: Callable[[SpooledDataStream, str], Awaitable[Any]],
+    merge_policy_data: Optional[Callable[[Dict[str, Any], str], Awaitable[Any]]],
+    concurrency: int,
+    path: str = "",
+):
+    """Writes the documents of the data of the snapshot (of the subtree at
+    path) to the policy store - as raw JSON, except for the merged ones.
+
+    Each document must be written after the ones above it, and merged
+    into after it's written, but documents of the same depth are
+    disjoint - so they're written (or merged) concurrently.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def restore(section: SnapshotSection):
+        async with semaphore:
+            if section.merge:
+                if merge_policy_data is None:
+                    raise ValueError("The policy store can't merge documents")
+                data = await run_sync(snapshot.read, section)
+                await merge_policy_data(data, section.path)
+                return
+            stream = SpooledDataStream()
+            try:
+                await stream.write(snapshot.read_raw(section))
+                await set_policy_data(stream, section.path)
+            finally:
+                stream.close()
+
+    def order(section: SnapshotSection):
+        return section.path.count("/"), section.merge
+
+    for _, sections in groupby(sorted(snapshot.sections(path), key=order), key=order):
+        await asyncio.gather(*(restore(section) for section in sections))
+
+
+async def is_snapshot_of(snapshot_path: str, backup_path: str) -> bool:
+    """Whether the snapshot was converted from the backup file as it is now
+    (see convert_backup_to_snapshot)."""
+    try:
+        stat = await aiofiles.os.stat(backup_path)
+        with StoreSnapshot(snapshot_path) as snapshot:
+            return snapshot.header.get("backup") == [stat.st_size, stat.st_mtime_ns]
+    except (OSError, ValueError):
+        return False
+
+
+async def convert_backup_to_snapshot(backup_path: str, snapshot_path: str):
+    """Converts a backup file (see backup_format) to a snapshot, replacing the
+    snapshot file atomically once it's written."""
+    stat = await aiofiles.os.stat(backup_path)
+    tmp_snapshot_path = f"{snapshot_path}.tmp"
+    header: Dict[str, Any] = {}
+    policies: Dict[str, str] = {}
+    async with aiofiles.open(backup_path, "r") as reader, aiofiles.open(
+        tmp_snapshot_path, "wb"
+    ) as writer:
+        snapshot = StoreSnapshotWriter(writer)
+        async for record in read_store_backup(reader):
+            if "opal_store_backup" in record:
+                header = {
+                    key: value
+                    for key, value in record.items()
+                    if key != "opal_store_backup"
+                }
+            elif "policy_id" in record:
+                policies[record["policy_id"]] = record["policy_code"]
+            elif "merge" in record:
+                await snapshot.write_document(record["path"], record["merge"], True)
+            elif "path" in record:
+                await snapshot.write_document(record["path"], record["data"])
+            elif record.get("raw_data"):
+                await snapshot.write_raw_document("", iter_raw_data(reader))
+        await snapshot.write_policies(policies)
+        # the backup file it was converted from (see is_snapshot_of)
+        await snapshot.finish(backup=[stat.st_size, stat.st_mtime_ns], **header)
+    await aiofiles.os.replace(tmp_snapshot_path, snapshot_path)
@@ -3,11 +3,16 @@ import uuid
 from datetime import datetime
 from functools import partial
 from inspect import signature
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from aiofiles.threadpool.text import AsyncTextIOWrapper
 from opal_client.config import opal_client_config
 from opal_client.logger import logger
+from opal_client.policy_store.backup_journal import StoreBackupJournal
+from opal_client.policy_store.backup_snapshot import (
+    StoreSnapshot,
+    restore_snapshot_data,
+)
 from opal_common.schemas.data import JsonableValue
 from opal_common.schemas.policy import PolicyBundle
 from opal_common.schemas.store import RemoteStatus, StoreTransaction
@@ -55,6 +60,11 @@ class AbstractPolicyStore:
     async def get_data(self, path: str) -> Dict:
         raise NotImplementedError()
 
+    async def get_data_if_exists(self, path: str) -> Tuple[bool, Any]:
+        """Returns whether the path has data, and its data (None if it
+        doesn't) - unlike get_data, a missing path isn't read as empty."""
+        raise NotImplementedError()
+
     async def get_data_with_input(self, path: str, input: BaseModel) -> Dict:
         raise NotImplementedError()
 
@@ -170,6 +180,33 @@ class BasePolicyStoreClient(AbstractPolicyStore):
             self, transaction_id=transaction_id, transaction_type=transaction_type
         )
 
+    def set_backup_journal(self, journal: StoreBackupJournal) -> bool:
+        """Journals the operations applied to the store (so backups can be
+        taken incrementally, see StoreBackupJournal).
+
+        Returns:
+            bool: False if the store doesn't support journaling its operations
+        """
+        return False
+
+    async def replay_backup_journal(self, after_seq: int = 0) -> int:
+        """Applies the journaled operations with a sequence number larger than
+        the given one, returns their number (see set_backup_journal)."""
+        return 0
+
+    async def import_snapshot(self, snapshot: StoreSnapshot) -> None:
+        """Imports a binary snapshot of a backup (see StoreSnapshot), and the
+        operations journaled after it."""
+        for policy_id, policy_code in snapshot.policies().items():
+            await self.set_policy(policy_id=policy_id, policy_code=policy_code)
+        await restore_snapshot_data(
+            snapshot,
+            self.set_policy_data,
+            None,
+            opal_client_config.STORE_BACKUP_RESTORE_CONCURRENCY,
+        )
+        await self.replay_backup_journal(snapshot.header.get("journal_seq", 0))
+
     async def start_transaction(self, transaction_id: str = None):
         """PolicyStoreTranscationContextManager calls here on __aenter__ Start
         a series of operations with the policy store."""
@@ -1,5 +1,4 @@
 import asyncio
-import json
 from typing import Dict, List, Optional, Set, Union
 from urllib.parse import quote_plus
 
@@ -8,6 +7,11 @@ from aiofiles.threadpool.text import AsyncTextIOWrapper
 from fastapi import status
 from opal_client.config import opal_client_config
 from opal_client.logger import logger
+from opal_client.policy_store.backup_format import (
+    StoreBackupWriter,
+    iter_raw_data,
+    read_store_backup,
+)
 from opal_client.policy_store.base_policy_store_client import (
     BasePolicyStoreClient,
     JsonableValue,
@@ -21,6 +25,7 @@ from opal_client.policy_store.opa_client import (
     should_ignore_path,
 )
 from opal_client.policy_store.schemas import PolicyStoreAuth
+from opal_common.fetcher.data_stream import SpooledDataStream
 from opal_common.schemas.policy import PolicyBundle
 from opal_common.schemas.store import StoreTransaction, TransactionType
 from tenacity import retry
@@ -179,14 +184,15 @@ class CedarClient(LivenessProbeMixin, BasePolicyStoreClient):
     @retry(**RETRY_CONFIG)
     async def set_policy_data(
         self,
-        policy_data: JsonableValue,
+        policy_data: Union[JsonableValue, SpooledDataStream],
         path: str = "",
         transaction_id: Optional[str] = None,
     ):
         if path != "":
             raise ValueError("Cedar can only change the entire data structure at once.")
 
-        if not isinstance(policy_data, list):
+        is_stream = isinstance(policy_data, SpooledDataStream)
+        if not is_stream and not isinstance(policy_data, list):
             logger.warning(
                 "OPAL client was instructed to put something that is not a list on Cedar. This will probably not work."
             )
@@ -196,10 +202,16 @@ class CedarClient(LivenessProbeMixin, BasePolicyStoreClient):
         ) as session:
             try:
                 headers = await self._get_auth_headers()
+                if is_stream:
+                    # raw (unparsed) data is streamed as is
+                    headers["Content-Type"] = "application/json"
+                    body = {"data": policy_data.iter_chunks()}
+                else:
+                    body = {"json": policy_data}
                 async with session.put(
                     f"{self._cedar_url}/data",
-                    json=policy_data,
                     headers=headers,
+                    **body,
                 ) as cedar_response:
                     response = await proxy_response_unless_invalid(
                         cedar_response,
@@ -318,19 +330,37 @@ class CedarClient(LivenessProbeMixin, BasePolicyStoreClient):
         return self._engine_reachable
 
     async def full_export(self, writer: AsyncTextIOWrapper) -> None:
-        policies = await self.get_policies()
-        data = await self.get_data("")
-        await writer.write(
-            json.dumps({"policies": policies, "data": data}, default=str)
-        )
+        backup = StoreBackupWriter(writer)
+        await backup.write_header()
+        for policy_id, policy_code in ((await self.get_policies()) or {}).items():
+            await backup.write_policy(policy_id, policy_code)
+        # cedar's data can't be split by path - streamed as a single document instead
+        headers = await self._get_auth_headers()
+        async with aiohttp.ClientSession(trust_env=True) as session:
+            async with session.get(
+                f"{self._cedar_url}/data", headers=headers
+            ) as cedar_response:
+                cedar_response.raise_for_status()
+                await backup.write_raw_data(
+                    cedar_response.content.iter_chunked(2**16)
+                )
 
     async def full_import(self, reader: AsyncTextIOWrapper) -> None:
-        import_data = json.loads(await reader.read())
-
-        for id, raw in import_data["policies"].items():
-            self.set_policy(policy_id=id, policy_code=raw)
-
-        await self.set_policy_data(import_data["data"])
+        async for record in read_store_backup(reader):
+            if "policy_id" in record:
+                await self.set_policy(
+                    policy_id=record["policy_id"], policy_code=record["policy_code"]
+                )
+            elif "path" in record:
+                await self.set_policy_data(record["data"])
+            elif record.get("raw_data"):
+                stream = SpooledDataStream()
+                try:
+                    async for chunk in iter_raw_data(reader):
+                        await stream.write(chunk)
+                    await self.set_policy_data(stream)
+                finally:
+                    stream.close()
 
     async def get_policy_version(self) -> Optional[str]:
         return self._policy_version
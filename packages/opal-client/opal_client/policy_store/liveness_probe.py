@@ -6,6 +6,16 @@ and folds the result into `is_healthy()` via the subclass-supplied
 guards lifecycle transitions, and a single long-lived `aiohttp.ClientSession`
 reused across samples.
 
+The mixin also owns a second, connection-pooled session used by the
+subclass for its regular policy-store traffic (see `_get_pooled_session`).
+It is kept separate from the probe session so that a saturated pool can
+never starve the probe, but shares its lifecycle: it is closed together
+with the probe in `stop_liveness_probe()`, and it is recycled whenever the
+probe observes the engine coming back after an outage (e.g. the inline OPA
+runner restarted), so no request is sent over a keep-alive connection to a
+dead process. Requests already in flight on the recycled session are left
+to finish: it is only closed once they are done.
+
 Subclasses provide:
 - `_probe_engine_reachable(session)` — issues one HTTP request and returns
   True iff the engine answered with a 2xx. Must not catch the exceptions
@@ -18,7 +28,7 @@ Subclasses provide:
 """
 import asyncio
 from abc import abstractmethod
-from typing import Optional
+from typing import Optional, Set
 
 import aiohttp
 from opal_client.config import opal_client_config
@@ -29,6 +39,9 @@ class LivenessProbeMixin:
     _liveness_probe_task: Optional[asyncio.Task]
     _liveness_probe_lock: asyncio.Lock
     _liveness_probe_session: Optional[aiohttp.ClientSession]
+    _pooled_session: Optional[aiohttp.ClientSession]
+    _pooled_session_loop: Optional[asyncio.AbstractEventLoop]
+    _retired_session_closers: Set[asyncio.Task]
 
     def _init_liveness_probe(self) -> None:
         """Initialize mixin state.
@@ -38,6 +51,9 @@ class LivenessProbeMixin:
         self._liveness_probe_task = None
         self._liveness_probe_lock = asyncio.Lock()
         self._liveness_probe_session = None
+        self._pooled_session = None
+        self._pooled_session_loop = None
+        self._retired_session_closers = set()
 
     @property
     def _probe_log_label(self) -> str:
@@ -55,6 +71,62 @@ class LivenessProbeMixin:
     def _get_engine_reachable(self) -> bool:
         raise NotImplementedError
 
+    def _get_pooled_session(self) -> aiohttp.ClientSession:
+        """Return the long-lived, keep-alive session for policy-store requests,
+        creating it on first use.
+
+        A new session is created if the previous one was closed or
+        retired (see `_reset_pooled_session`, `_retire_pooled_session`)
+        or belongs to another event loop.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._pooled_session
+        if session is None or session.closed or self._pooled_session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=opal_client_config.POLICY_STORE_CONN_POOL_LIMIT,
+                limit_per_host=opal_client_config.POLICY_STORE_CONN_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=opal_client_config.POLICY_STORE_CONN_KEEPALIVE_TIMEOUT,
+                enable_cleanup_closed=True,
+            )
+            session = aiohttp.ClientSession(connector=connector, trust_env=True)
+            self._pooled_session = session
+            self._pooled_session_loop = loop
+        return session
+
+    async def _reset_pooled_session(self) -> None:
+        """Close the pooled session, dropping all its keep-alive connections.
+
+        The next call to `_get_pooled_session` opens a fresh pool.
+        """
+        session = self._pooled_session
+        self._pooled_session = None
+        self._pooled_session_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+
+    def _retire_pooled_session(self) -> None:
+        """Swap in a fresh pooled session for the next requests, without
+        aborting the requests in flight on the current one.
+
+        The current session is closed once its requests are done - they
+        can't outlast its timeout - or when the probe is stopped.
+        """
+        session = self._pooled_session
+        self._pooled_session = None
+        self._pooled_session_loop = None
+        if session is None or session.closed:
+            return
+        closer = asyncio.create_task(self._close_retired_session(session))
+        self._retired_session_closers.add(closer)
+        closer.add_done_callback(self._retired_session_closers.discard)
+
+    @staticmethod
+    async def _close_retired_session(session: aiohttp.ClientSession) -> None:
+        try:
+            await asyncio.sleep(session.timeout.total or 0)
+        finally:
+            await session.close()
+
     async def start_liveness_probe(self) -> None:
         """Spawn the background liveness probe task (idempotent).
 
@@ -109,7 +181,8 @@ class LivenessProbeMixin:
             )
 
     async def stop_liveness_probe(self) -> None:
-        """Cancel the probe task and close its session (idempotent)."""
+        """Cancel the probe task and close its session, as well as the pooled
+        policy-store session (idempotent)."""
         async with self._liveness_probe_lock:
             task = self._liveness_probe_task
             session = self._liveness_probe_session
@@ -131,6 +204,12 @@ class LivenessProbeMixin:
         if session is not None:
             await session.close()
 
+        await self._reset_pooled_session()
+        closers = list(self._retired_session_closers)
+        for closer in closers:
+            closer.cancel()
+        await asyncio.gather(*closers, return_exceptions=True)
+
     def _on_probe_task_done(self, task: asyncio.Task) -> None:
         if task.cancelled():
             return
@@ -188,6 +267,9 @@ class LivenessProbeMixin:
                         "{label} liveness probe: engine became reachable",
                         label=self._probe_log_label,
                     )
+                    # pooled keep-alive connections point at the engine
+                    # process that went away, don't reuse them
+                    self._retire_pooled_session()
                 else:
                     logger.info(
                         "{label} liveness probe: engine became unreachable",
@@ -1,6 +1,6 @@
 import asyncio
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import jsonpatch
 from opal_client.policy_store.base_policy_store_client import (
@@ -8,6 +8,7 @@ from opal_client.policy_store.base_policy_store_client import (
     JsonableValue,
 )
 from opal_client.utils import exclude_none_fields
+from opal_common.fetcher.data_stream import SpooledDataStream
 from opal_common.schemas.policy import PolicyBundle
 from opal_common.schemas.store import JSONPatchAction, StoreTransaction
 from pydantic import BaseModel
@@ -55,6 +56,8 @@ class MockPolicyStoreClient(BasePolicyStoreClient):
         path: str = "",
         transaction_id: Optional[str] = None,
     ):
+        if isinstance(policy_data, SpooledDataStream):
+            policy_data = await policy_data.read_json()
         self._data[path] = policy_data
         self.has_data_event.set()
 
@@ -79,6 +82,13 @@ class MockPolicyStoreClient(BasePolicyStoreClient):
         else:
             return self._data[path]
 
+    async def get_data_if_exists(self, path: str) -> Tuple[bool, Any]:
+        if path is None or path == "":
+            return True, self._data
+        if path not in self._data:
+            return False, None
+        return True, self._data[path]
+
     async def get_data_with_input(self, path: str, input: BaseModel) -> Dict:
         return {}
 
@@ -1,18 +1,30 @@
 import asyncio
+import contextvars
+import copy
 import functools
 import json
 import ssl
+import sys
 import time
-from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
 from urllib.parse import urlencode
 
 import aiohttp
-import dpath
-import jsonpatch
 from aiofiles.threadpool.text import AsyncTextIOWrapper
 from fastapi import Response, status
 from opal_client.config import opal_client_config
 from opal_client.logger import logger
+from opal_client.policy_store.backup_format import (
+    RawJson,
+    StoreBackupWriter,
+    parse_raw_json,
+    read_store_backup,
+)
+from opal_client.policy_store.backup_journal import StoreBackupJournal
+from opal_client.policy_store.backup_snapshot import (
+    StoreSnapshot,
+    restore_snapshot_data,
+)
 from opal_client.policy_store.base_policy_store_client import (
     BasePolicyStoreClient,
     JsonableValue,
@@ -21,10 +33,13 @@ from opal_client.policy_store.liveness_probe import LivenessProbeMixin
 from opal_client.policy_store.schemas import PolicyStoreAuth
 from opal_client.utils import exclude_none_fields, proxy_response
 from opal_common.engine.parsing import get_rego_package
+from opal_common.fetcher.data_stream import SpooledDataStream
 from opal_common.git_utils.bundle_utils import BundleUtils
+from opal_common.monitoring import metrics
 from opal_common.paths import PathUtils
 from opal_common.schemas.policy import DataModule, PolicyBundle, RegoModule
 from opal_common.schemas.store import JSONPatchAction, StoreTransaction, TransactionType
+from opal_common.serialization import json_dumps_bytes, json_loads
 from pydantic import BaseModel
 from tenacity import RetryError, retry
 
@@ -33,6 +48,9 @@ JSONPatchDocument = List[JSONPatchAction]
 
 RETRY_CONFIG = opal_client_config.POLICY_STORE_CONN_RETRY.toTenacityConfig()
 
+# set while restoring a backup, whose operations mustn't be journaled again
+_restoring_backup = contextvars.ContextVar("restoring_backup", default=False)
+
 
 def should_ignore_path(path, ignore_paths):
     """Helper function to check if the policy-store should ignore the given
@@ -88,6 +106,29 @@ async def proxy_response_unless_invalid(
     return response
 
 
+def _patch_document(patch: List[Union[JSONPatchAction, dict]]) -> List[dict]:
+    """The JSON of a patch (see exclude_none_fields) - keeping the null values
+    of its add and replace actions, which are left out (as unset fields)
+    otherwise."""
+    actions = exclude_none_fields(patch)
+    if not isinstance(actions, list):
+        return actions
+    for action in actions:
+        if action.get("op") in ("add", "replace") and "value" not in action:
+            action["value"] = None
+    return actions
+
+
+async def _is_json_object(stream: SpooledDataStream) -> bool:
+    """Whether the raw JSON data of the stream is an object (by its first non-
+    whitespace character)."""
+    async for chunk in stream.iter_chunks():
+        chunk = chunk.lstrip()
+        if chunk:
+            return chunk.startswith(b"{")
+    return False
+
+
 class OpaTransactionLogState:
     """Holds a mutatable state of the transaction log.
 
@@ -274,41 +315,221 @@ class OpaTransactionLogPolicyWriter:
         )
 
 
+class _CachedDict(dict):
+    """A dict copied by OpaStaticDataCache (so only referenced by it)."""
+
+    __slots__ = ("generation",)
+
+
+class _CachedList(list):
+    """A list copied by OpaStaticDataCache (so only referenced by it)."""
+
+    __slots__ = ("generation",)
+
+
 class OpaStaticDataCache:
     """Caching OPA's static data, so we can back it up without querying.
 
     /v1/data which also includes virtual documents.
+
+    The cache keeps references to the documents written to OPA (rather than
+    copies of them), and never modifies them - so documents must not be
+    modified once written (e.g. fetched data is kept as is, and may also be
+    referenced by the data updater). A write copies only the objects and
+    arrays on the path to the written document (the first time they're
+    written under), sharing everything else with the documents written
+    before, so its cost is proportional to the change rather than to the
+    whole data.
+
+    A snapshot of the data (see snapshot) is taken in O(1): the objects and
+    arrays copied before it are copied again (rather than modified) by
+    later writes.
+
+    Documents written to OPA as raw JSON are kept as such (see RawJson),
+    and only parsed once they're written under (or backed up within a
+    larger document) - e.g. restoring a backup snapshot doesn't parse
+    it.
     """
 
     def __init__(self):
         self._root_data = {}
+        # objects and arrays copied in previous generations belong to snapshots
+        self._generation = 0
+
+    @staticmethod
+    def _path_keys(path: str) -> List[str]:
+        return [key for key in (path or "").split("/") if key]
+
+    @staticmethod
+    def _pointer_keys(pointer: str) -> List[str]:
+        """The keys of a JSON pointer (RFC 6901)."""
+        if not pointer:
+            return []
+        keys = pointer.split("/")[1:]
+        return [key.replace("~1", "/").replace("~0", "~") for key in keys]
+
+    def _own(self, node: Any) -> Any:
+        """Returns the node if it was copied by the cache (since the last
+        snapshot), otherwise a copy of it (that the cache may modify)."""
+        if isinstance(node, RawJson):
+            node = node.parse()
+        if isinstance(node, (_CachedDict, _CachedList)):
+            if node.generation == self._generation:
+                return node
+        if isinstance(node, dict):
+            copied = _CachedDict(node)
+        elif isinstance(node, list):
+            copied = _CachedList(node)
+        else:
+            raise KeyError(f"Not an object or an array: {node!r}")
+        copied.generation = self._generation
+        return copied
+
+    @staticmethod
+    def _list_index(node: list, key: str, allow_end: bool = False) -> int:
+        if allow_end and key == "-":
+            return len(node)
+        index = int(key)
+        if not 0 <= index < len(node) + (1 if allow_end else 0):
+            raise IndexError(f"Array index out of range: {key}")
+        return index
+
+    def _get(self, keys: List[str]) -> Any:
+        node = self._root_data
+        for key in keys:
+            if isinstance(node, RawJson):
+                node = node.parse()
+            if isinstance(node, list):
+                key = self._list_index(node, key)
+            node = node[key]
+        return node.parse() if isinstance(node, RawJson) else node
+
+    def _writable_parent(self, keys: List[str], create: bool = False) -> Any:
+        """Returns the object (or array) holding the last of the keys, copying
+        the objects and arrays on the path to it that weren't copied yet."""
+        self._root_data = node = self._own(self._root_data)
+        for key in keys[:-1]:
+            if isinstance(node, list):
+                key = self._list_index(node, key)
+                child = node[key]
+            else:
+                child = node.get(key)
+                if create and not isinstance(child, (dict, list)):
+                    child = {}
+            node[key] = child = self._own(child)
+            node = child
+        return node
+
+    def _add(self, keys: List[str], value: Any, replace: bool = False):
+        if not keys:
+            self._root_data = value
+            return
+        parent = self._writable_parent(keys)
+        key = keys[-1]
+        if isinstance(parent, list):
+            if replace:
+                parent[self._list_index(parent, key)] = value
+            else:
+                parent.insert(self._list_index(parent, key, allow_end=True), value)
+        else:
+            if replace and key not in parent:
+                raise KeyError(key)
+            parent[key] = value
+
+    def _remove(self, keys: List[str]) -> Any:
+        if not keys:
+            raise KeyError("Can't remove the root document")
+        parent = self._writable_parent(keys)
+        key = keys[-1]
+        if isinstance(parent, list):
+            return parent.pop(self._list_index(parent, key))
+        return parent.pop(key)
 
     def set(self, path, data):
-        if not path or path == "/":
-            assert isinstance(data, dict), ValueError(
+        keys = self._path_keys(path)
+        if not keys:
+            assert isinstance(data, (dict, RawJson)), ValueError(
                 "Setting root document must be a dict"
             )
-            self._root_data = data.copy()
-        else:
-            # This would overwrite already existing paths
-            dpath.new(self._root_data, path, data)
-
-    def patch(self, path, data: List[JSONPatchAction]):
-        for i, _ in enumerate(data):
-            if not path == "/":
-                data[i].path = path + data[i].path
-        patch = jsonpatch.JsonPatch.from_string(json.dumps(exclude_none_fields(data)))
-        patch.apply(self._root_data, in_place=True)
+            self._root_data = data
+            return
+        # This would overwrite already existing paths
+        parent = self._writable_parent(keys, create=True)
+        key = keys[-1]
+        if isinstance(parent, list):
+            key = self._list_index(parent, key)
+        parent[key] = data
+
+    def patch(self, path, data: List[Union[JSONPatchAction, dict]]):
+        """Applies a JSON patch (RFC 6902) to the document at the path - the
+        patch's values are referenced as is, and must not be modified once
+        applied (e.g. pass the copy made by exclude_none_fields)."""
+        prefix = self._path_keys(path)
+        for action in data:
+            if isinstance(action, JSONPatchAction):
+                action = action.dict(by_alias=True)
+            op = action["op"]
+            keys = prefix + self._pointer_keys(action["path"])
+            if op == "add":
+                self._add(keys, action["value"])
+            elif op == "replace":
+                self._add(keys, action["value"], replace=True)
+            elif op == "remove":
+                self._remove(keys)
+            elif op == "move":
+                value = self._remove(prefix + self._pointer_keys(action["from"]))
+                self._add(keys, value)
+            elif op == "copy":
+                # the copy may be modified (by later writes) independently of its source
+                source = self._get(prefix + self._pointer_keys(action["from"]))
+                self._add(keys, copy.deepcopy(source))
+            elif op == "test":
+                if self._get(keys) != action["value"]:
+                    raise ValueError(f"JSON patch test failed at {action['path']}")
+            else:
+                raise ValueError(f"Unknown JSON patch operation: {op}")
 
     def delete(self, path):
-        if not path or path == "/":
+        keys = self._path_keys(path)
+        if not keys:
             self._root_data = {}
-        else:
-            dpath.delete(self._root_data, path)
+            return
+        try:
+            self._remove(keys)
+        except (KeyError, IndexError, ValueError):
+            pass
 
     def get_data(self):
+        return parse_raw_json(self._root_data)
+
+    def snapshot(self):
+        """Returns the data, which later writes won't modify (holding RawJson
+        documents, see backup_format)."""
+        self._generation += 1
         return self._root_data
 
+    def memory_footprint(self) -> int:
+        """The approximate memory (in bytes) held by the cached data - objects
+        shared by several documents (or with their writers) are counted
+        once."""
+        seen: Set[int] = set()
+        size = 0
+        nodes = [self._root_data]
+        while nodes:
+            node = nodes.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            if isinstance(node, RawJson):
+                node = node.raw
+            size += sys.getsizeof(node)
+            if isinstance(node, dict):
+                nodes.extend(node.keys())
+                nodes.extend(node.values())
+            elif isinstance(node, list):
+                nodes.extend(node)
+        return size
+
 
 class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
     """Communicates with OPA via its REST API."""
@@ -403,6 +624,7 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
         self._policy_data_cache: Optional[OpaStaticDataCache] = None
         if cache_policy_data:
             self._policy_data_cache = OpaStaticDataCache()
+        self._backup_journal: Optional[StoreBackupJournal] = None
 
         self._init_liveness_probe()
 
@@ -428,36 +650,32 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
     async def _get_oauth_token(self):
         logger.info("Retrieving a new OAuth access_token.")
 
-        async with aiohttp.ClientSession(
-            trust_env=True,
-        ) as session:
-            try:
-                async with session.post(
-                    self._oauth_server,
-                    headers={
-                        "accept": "application/json",
-                        "content-type": "application/x-www-form-urlencoded;charset=UTF-8",
-                    },
-                    data=urlencode({"grant_type": "client_credentials"}).encode(
-                        "utf-8"
-                    ),
-                    auth=aiohttp.BasicAuth(
-                        self._oauth_client_id, self._oauth_client_secret
-                    ),
-                ) as oauth_response:
-                    response = await oauth_response.json()
-                    logger.info(
-                        f"got access_token, expires in {response['expires_in']} seconds"
-                    )
+        session = self._get_pooled_session()
+        try:
+            async with session.post(
+                self._oauth_server,
+                headers={
+                    "accept": "application/json",
+                    "content-type": "application/x-www-form-urlencoded;charset=UTF-8",
+                },
+                data=urlencode({"grant_type": "client_credentials"}).encode("utf-8"),
+                auth=aiohttp.BasicAuth(
+                    self._oauth_client_id, self._oauth_client_secret
+                ),
+            ) as oauth_response:
+                response = await oauth_response.json()
+                logger.info(
+                    f"got access_token, expires in {response['expires_in']} seconds"
+                )
 
-                    return {
-                        # refresh token before it expires, lets subtract 10 seconds
-                        "expires": time.time() + response["expires_in"] - 10,
-                        "token": response["access_token"],
-                    }
-            except aiohttp.ClientError as e:
-                logger.warning("OAuth server connection error: {err}", err=repr(e))
-                raise
+                return {
+                    # refresh token before it expires, lets subtract 10 seconds
+                    "expires": time.time() + response["expires_in"] - 10,
+                    "token": response["access_token"],
+                }
+        except aiohttp.ClientError as e:
+            logger.warning("OAuth server connection error: {err}", err=repr(e))
+            raise
 
     async def _get_auth_headers(self) -> {}:
         headers = {}
@@ -494,69 +712,68 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
                 f"Ignoring setting policy - {policy_id}, set in POLICY_STORE_POLICY_PATHS_TO_IGNORE."
             )
             return
-        async with aiohttp.ClientSession(
-            trust_env=True,
-        ) as session:
-            try:
-                headers = await self._get_auth_headers()
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
 
-                async with session.put(
-                    f"{self._opa_url}/policies/{policy_id}",
-                    data=policy_code,
-                    headers={"content-type": "text/plain", **headers},
-                    **self._ssl_context_kwargs,
-                ) as opa_response:
-                    return await proxy_response_unless_invalid(
-                        opa_response,
-                        accepted_status_codes=[
-                            status.HTTP_200_OK,
-                            # No point in immediate retry, this means erroneous rego (bad syntax, duplicated definition, etc)
-                            status.HTTP_400_BAD_REQUEST,
-                        ],
-                    )
-            except aiohttp.ClientError as e:
-                logger.warning("Opa connection error: {err}", err=repr(e))
-                raise
+            async with session.put(
+                f"{self._opa_url}/policies/{policy_id}",
+                data=policy_code,
+                headers={"content-type": "text/plain", **headers},
+                **self._ssl_context_kwargs,
+            ) as opa_response:
+                response = await proxy_response_unless_invalid(
+                    opa_response,
+                    accepted_status_codes=[
+                        status.HTTP_200_OK,
+                        # No point in immediate retry, this means erroneous rego (bad syntax, duplicated definition, etc)
+                        status.HTTP_400_BAD_REQUEST,
+                    ],
+                )
+            if opa_response.status == status.HTTP_200_OK:
+                await self._journal(
+                    "set_policy", policy_id=policy_id, policy_code=policy_code
+                )
+            return response
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
 
     @fail_silently()
     @retry(**RETRY_CONFIG)
     async def get_policy(self, policy_id: str) -> Optional[str]:
-        async with aiohttp.ClientSession(
-            trust_env=True,
-        ) as session:
-            try:
-                headers = await self._get_auth_headers()
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
 
-                async with session.get(
-                    f"{self._opa_url}/policies/{policy_id}",
-                    headers=headers,
-                    **self._ssl_context_kwargs,
-                ) as opa_response:
-                    result = await opa_response.json()
-                    return result.get("result", {}).get("raw", None)
-            except aiohttp.ClientError as e:
-                logger.warning("Opa connection error: {err}", err=repr(e))
-                raise
+            async with session.get(
+                f"{self._opa_url}/policies/{policy_id}",
+                headers=headers,
+                **self._ssl_context_kwargs,
+            ) as opa_response:
+                result = await opa_response.json()
+                return result.get("result", {}).get("raw", None)
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
 
     @fail_silently()
     @retry(**RETRY_CONFIG)
     async def get_policies(self) -> Optional[Dict[str, str]]:
-        async with aiohttp.ClientSession(
-            trust_env=True,
-        ) as session:
-            try:
-                headers = await self._get_auth_headers()
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
 
-                async with session.get(
-                    f"{self._opa_url}/policies",
-                    headers=headers,
-                    **self._ssl_context_kwargs,
-                ) as opa_response:
-                    result = await opa_response.json()
-                    return OpaClient._extract_modules_from_policies_json(result)
-            except aiohttp.ClientError as e:
-                logger.warning("Opa connection error: {err}", err=repr(e))
-                raise
+            async with session.get(
+                f"{self._opa_url}/policies",
+                headers=headers,
+                **self._ssl_context_kwargs,
+            ) as opa_response:
+                result = await opa_response.json()
+                return OpaClient._extract_modules_from_policies_json(result)
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
 
     @affects_transaction
     @retry(**RETRY_CONFIG)
@@ -570,27 +787,27 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
             )
             return
 
-        async with aiohttp.ClientSession(
-            trust_env=True,
-        ) as session:
-            try:
-                headers = await self._get_auth_headers()
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
 
-                async with session.delete(
-                    f"{self._opa_url}/policies/{policy_id}",
-                    headers=headers,
-                    **self._ssl_context_kwargs,
-                ) as opa_response:
-                    return await proxy_response_unless_invalid(
-                        opa_response,
-                        accepted_status_codes=[
-                            status.HTTP_200_OK,
-                            status.HTTP_404_NOT_FOUND,
-                        ],
-                    )
-            except aiohttp.ClientError as e:
-                logger.warning("Opa connection error: {err}", err=repr(e))
-                raise
+            async with session.delete(
+                f"{self._opa_url}/policies/{policy_id}",
+                headers=headers,
+                **self._ssl_context_kwargs,
+            ) as opa_response:
+                response = await proxy_response_unless_invalid(
+                    opa_response,
+                    accepted_status_codes=[
+                        status.HTTP_200_OK,
+                        status.HTTP_404_NOT_FOUND,
+                    ],
+                )
+            await self._journal("delete_policy", policy_id=policy_id)
+            return response
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
 
     async def get_policy_module_ids(self) -> List[str]:
         modules = await self.get_policies()
@@ -753,7 +970,7 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
     ):
         module_path = self._safe_data_module_path(module.path)
         try:
-            module_data = json.loads(module.data)
+            module_data = json_loads(module.data)
             return await self.set_policy_data(
                 policy_data=module_data,
                 path=module_path,
@@ -773,12 +990,18 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
     @retry(**RETRY_CONFIG)
     async def set_policy_data(
         self,
-        policy_data: JsonableValue,
+        policy_data: Union[JsonableValue, SpooledDataStream],
         path: str = "",
         transaction_id: Optional[str] = None,
     ):
         path = self._safe_data_module_path(path)
 
+        if isinstance(policy_data, SpooledDataStream):
+            if path or await _is_json_object(policy_data):
+                return await self._set_policy_data_from_stream(policy_data, path)
+            # other documents can't be OPA's root document as is, see below
+            policy_data = await policy_data.read_json()
+
         # in OPA, the root document must be an object, so we must wrap list values
         if not path and isinstance(policy_data, list):
             logger.warning(
@@ -786,15 +1009,22 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
             )
             policy_data = {"items": policy_data}
 
-        async with aiohttp.ClientSession(
-            trust_env=True,
-        ) as session:
-            try:
-                headers = await self._get_auth_headers()
-                data = json.dumps(exclude_none_fields(policy_data))
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
+            headers["Content-Type"] = "application/json"
+            # a copy of the data (without fields set to None), that the cache may
+            # reference
+            document = exclude_none_fields(policy_data)
+            body = json_dumps_bytes(document)
+            tags = {"method": "PUT"}
+            metrics.histogram(
+                "opa_client.write_bytes", len(body), tags, metrics.SIZE_BUCKETS
+            )
+            with metrics.timer("opa_client.write_duration", tags):
                 async with session.put(
                     f"{self._opa_url}/data{path}",
-                    data=data,
+                    data=body,
                     headers=headers,
                     **self._ssl_context_kwargs,
                 ) as opa_response:
@@ -805,12 +1035,53 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
                             status.HTTP_304_NOT_MODIFIED,
                         ],
                     )
-                    if self._policy_data_cache:
-                        self._policy_data_cache.set(path, json.loads(data))
-                    return response
-            except aiohttp.ClientError as e:
-                logger.warning("Opa connection error: {err}", err=repr(e))
-                raise
+                if self._policy_data_cache:
+                    self._policy_data_cache.set(path, document)
+                    await self._journal("set_data", body, path=path)
+                return response
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
+
+    async def _set_policy_data_from_stream(self, stream: SpooledDataStream, path: str):
+        """Streams raw (unparsed) JSON data as the body of OPA's PUT request,
+        so large documents are never fully held in memory.
+
+        If the data has to be cached (for backups), it's cached (and
+        journaled) as raw JSON too - without parsing it, but the cache
+        holds all of it in memory, so streaming doesn't bound the memory
+        of the client when backups are enabled.
+        """
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
+            headers["Content-Type"] = "application/json"
+            tags = {"method": "PUT"}
+            metrics.histogram(
+                "opa_client.write_bytes", stream.size, tags, metrics.SIZE_BUCKETS
+            )
+            with metrics.timer("opa_client.write_duration", tags):
+                async with session.put(
+                    f"{self._opa_url}/data{path}",
+                    data=stream.iter_chunks(),
+                    headers=headers,
+                    **self._ssl_context_kwargs,
+                ) as opa_response:
+                    response = await proxy_response_unless_invalid(
+                        opa_response,
+                        accepted_status_codes=[
+                            status.HTTP_204_NO_CONTENT,
+                            status.HTTP_304_NOT_MODIFIED,
+                        ],
+                    )
+                if self._policy_data_cache:
+                    data = RawJson(await stream.read())
+                    self._policy_data_cache.set(path, data)
+                    await self._journal("set_data", data.raw, path=path)
+                return response
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
 
     @affects_transaction
     @retry(**RETRY_CONFIG)
@@ -821,24 +1092,25 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
         transaction_id: Optional[str] = None,
     ):
         path = self._safe_data_module_path(path)
+        # unlike a list PUT to the root document, a patch (a list of operations) is
+        # never wrapped - its operations apply to the root document as is
 
-        # in OPA, the root document must be an object, so we must wrap list values
-        if not path and isinstance(policy_data, list):
-            logger.warning(
-                "OPAL client was instructed to put a list on OPA's root document. In OPA the root document must be an object so the original value was wrapped."
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
+            headers["Content-Type"] = "application/json-patch+json"
+
+            # a copy of the patch, that the cache may reference
+            actions = _patch_document(policy_data)
+            body = json_dumps_bytes(actions)
+            tags = {"method": "PATCH"}
+            metrics.histogram(
+                "opa_client.write_bytes", len(body), tags, metrics.SIZE_BUCKETS
             )
-            policy_data = {"items": policy_data}
-
-        async with aiohttp.ClientSession(
-            trust_env=True,
-        ) as session:
-            try:
-                headers = await self._get_auth_headers()
-                headers["Content-Type"] = "application/json-patch+json"
-
+            with metrics.timer("opa_client.write_duration", tags):
                 async with session.patch(
                     f"{self._opa_url}/data{path}",
-                    data=json.dumps(exclude_none_fields(policy_data)),
+                    data=body,
                     headers=headers,
                     **self._ssl_context_kwargs,
                 ) as opa_response:
@@ -849,30 +1121,38 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
                             status.HTTP_304_NOT_MODIFIED,
                         ],
                     )
-                    if self._policy_data_cache:
-                        self._policy_data_cache.patch(path, policy_data)
-                    return response
-            except aiohttp.ClientError as e:
-                logger.warning("Opa connection error: {err}", err=repr(e))
-                raise
+                if self._policy_data_cache and isinstance(actions, list):
+                    self._policy_data_cache.patch(path, actions)
+                    await self._journal("patch_data", body, path=path)
+                return response
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
 
-    @affects_transaction
     @retry(**RETRY_CONFIG)
-    async def delete_policy_data(
-        self, path: str = "", transaction_id: Optional[str] = None
-    ):
+    async def _merge_policy_data(self, policy_data: Dict[str, Any], path: str = ""):
+        """Adds the keys of policy_data to the object at path (see
+        backup_format), in a single PATCH request."""
         path = self._safe_data_module_path(path)
-        if not path:
-            return await self.set_policy_data({})
-
-        async with aiohttp.ClientSession(
-            trust_env=True,
-        ) as session:
-            try:
-                headers = await self._get_auth_headers()
-
-                async with session.delete(
+        # not escaped as JSON pointers: the keys of "merge" records only match
+        # backup_format's _PATH_KEY (no "/" or "~")
+        actions = [
+            {"op": "add", "path": f"/{key}", "value": value}
+            for key, value in policy_data.items()
+        ]
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
+            headers["Content-Type"] = "application/json-patch+json"
+            body = json_dumps_bytes(actions)
+            tags = {"method": "PATCH"}
+            metrics.histogram(
+                "opa_client.write_bytes", len(body), tags, metrics.SIZE_BUCKETS
+            )
+            with metrics.timer("opa_client.write_duration", tags):
+                async with session.patch(
                     f"{self._opa_url}/data{path}",
+                    data=body,
                     headers=headers,
                     **self._ssl_context_kwargs,
                 ) as opa_response:
@@ -880,15 +1160,49 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
                         opa_response,
                         accepted_status_codes=[
                             status.HTTP_204_NO_CONTENT,
-                            status.HTTP_404_NOT_FOUND,
+                            status.HTTP_304_NOT_MODIFIED,
                         ],
                     )
-                    if self._policy_data_cache:
-                        self._policy_data_cache.delete(path)
-                    return response
-            except aiohttp.ClientError as e:
-                logger.warning("Opa connection error: {err}", err=repr(e))
-                raise
+                if self._policy_data_cache:
+                    self._policy_data_cache.patch(path, actions)
+                    await self._journal("patch_data", body, path=path)
+                return response
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
+
+    @affects_transaction
+    @retry(**RETRY_CONFIG)
+    async def delete_policy_data(
+        self, path: str = "", transaction_id: Optional[str] = None
+    ):
+        path = self._safe_data_module_path(path)
+        if not path:
+            return await self.set_policy_data({})
+
+        session = self._get_pooled_session()
+        try:
+            headers = await self._get_auth_headers()
+
+            async with session.delete(
+                f"{self._opa_url}/data{path}",
+                headers=headers,
+                **self._ssl_context_kwargs,
+            ) as opa_response:
+                response = await proxy_response_unless_invalid(
+                    opa_response,
+                    accepted_status_codes=[
+                        status.HTTP_204_NO_CONTENT,
+                        status.HTTP_404_NOT_FOUND,
+                    ],
+                )
+                if self._policy_data_cache:
+                    self._policy_data_cache.delete(path)
+                    await self._journal("delete_data", path=path)
+                return response
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
 
     @fail_silently()
     @retry(**RETRY_CONFIG)
@@ -905,20 +1219,47 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
         try:
             headers = await self._get_auth_headers()
 
-            async with aiohttp.ClientSession(
-                trust_env=True,
-            ) as session:
-                async with session.get(
-                    f"{self._opa_url}/data{path}",
-                    headers=headers,
-                    **self._ssl_context_kwargs,
-                ) as opa_response:
-                    json_response = await opa_response.json()
-                    return json_response.get("result", {})
+            session = self._get_pooled_session()
+            async with session.get(
+                f"{self._opa_url}/data{path}",
+                headers=headers,
+                **self._ssl_context_kwargs,
+            ) as opa_response:
+                json_response = await opa_response.json()
+                return json_response.get("result", {})
         except aiohttp.ClientError as e:
             logger.warning("Opa connection error: {err}", err=repr(e))
             raise
 
+    @retry(**RETRY_CONFIG)
+    async def get_data_if_exists(self, path: str) -> Tuple[bool, Any]:
+        """Like get_data, but tells a missing path apart from an empty document
+        (OPA leaves the result out of the response if the path is undefined).
+
+        Unlike get_data, errors are raised.
+        """
+        if path != "" and not path.startswith("/"):
+            path = "/" + path
+        try:
+            headers = await self._get_auth_headers()
+
+            session = self._get_pooled_session()
+            async with session.get(
+                f"{self._opa_url}/data{path}",
+                headers=headers,
+                **self._ssl_context_kwargs,
+            ) as opa_response:
+                await proxy_response_unless_invalid(
+                    opa_response, accepted_status_codes=[status.HTTP_200_OK]
+                )
+                json_response = await opa_response.json()
+        except aiohttp.ClientError as e:
+            logger.warning("Opa connection error: {err}", err=repr(e))
+            raise
+        if "result" not in json_response:
+            return False, None
+        return True, json_response["result"]
+
     @retry(**RETRY_CONFIG)
     async def get_data_with_input(self, path: str, input: BaseModel) -> Dict:
         """Evaluates a data document against an input. that is how OPA "runs
@@ -936,17 +1277,16 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
             path = path[1:]
         try:
             headers = await self._get_auth_headers()
-
-            async with aiohttp.ClientSession(
-                trust_env=True,
-            ) as session:
-                async with session.post(
-                    f"{self._opa_url}/data/{path}",
-                    data=json.dumps(opa_input),
-                    headers=headers,
-                    **self._ssl_context_kwargs,
-                ) as opa_response:
-                    return await proxy_response(opa_response)
+            headers["Content-Type"] = "application/json"
+
+            session = self._get_pooled_session()
+            async with session.post(
+                f"{self._opa_url}/data/{path}",
+                data=json_dumps_bytes(opa_input),
+                headers=headers,
+                **self._ssl_context_kwargs,
+            ) as opa_response:
+                return await proxy_response(opa_response)
         except aiohttp.ClientError as e:
             logger.warning("Opa connection error: {err}", err=repr(e))
             raise
@@ -1017,21 +1357,127 @@ class OpaClient(LivenessProbeMixin, BasePolicyStoreClient):
     def _get_engine_reachable(self) -> bool:
         return self._transaction_state.engine_reachable
 
+    def set_backup_journal(self, journal: StoreBackupJournal) -> bool:
+        if self._policy_data_cache is None:
+            # snapshots of the journaled data are taken from the cache
+            return False
+        self._backup_journal = journal
+        return True
+
+    async def _journal(self, op: str, data: Optional[bytes] = None, **fields):
+        """Journals an operation applied to OPA (see set_backup_journal).
+
+        Must be called right after the operation is applied to the data
+        cache (without awaiting anything in between), so the operation
+        is journaled after the ones included in a snapshot of the cache.
+        """
+        if self._backup_journal is None or _restoring_backup.get():
+            return
+        self._backup_journal.record(op, data, **fields)
+        try:
+            await self._backup_journal.sync()
+        except OSError:
+            logger.exception("Failed to write to the policy store journal")
+
     async def full_export(self, writer: AsyncTextIOWrapper) -> None:
-        policies = await self.get_policies()
-        data = self._policy_data_cache.get_data()
-        await writer.write(
-            json.dumps({"policies": policies, "data": data}, default=str)
+        data = self._policy_data_cache.snapshot()
+        header = {}
+        if self._backup_journal is not None:
+            # the snapshot includes exactly the data operations journaled so far
+            header["journal_seq"] = self._backup_journal.mark_snapshot()
+        backup = StoreBackupWriter(writer)
+        await backup.write_header(**header)
+        # policy operations journaled after the snapshot may be included in it too,
+        # replaying them is harmless (policies are set or deleted as a whole)
+        for policy_id, policy_code in ((await self.get_policies()) or {}).items():
+            await backup.write_policy(policy_id, policy_code)
+        await backup.write_data(data, opal_client_config.STORE_BACKUP_CHUNK_SIZE)
+        metrics.gauge(
+            "opa_client.data_cache_bytes", self._policy_data_cache.memory_footprint()
         )
 
     async def full_import(self, reader: AsyncTextIOWrapper) -> None:
-        import_data = json.loads(await reader.read())
+        journal_seq = 0
+        policies: Dict[str, str] = {}
+        policies_set = False
+        token = _restoring_backup.set(True)
+        try:
+            async for record in read_store_backup(reader):
+                if "opal_store_backup" in record:
+                    journal_seq = record.get("journal_seq", 0)
+                elif "policy_id" in record:
+                    policies[record["policy_id"]] = record["policy_code"]
+                elif "path" in record:
+                    if not policies_set:
+                        await self._import_policies(policies)
+                        policies_set = True
+                    # documents are written (in pre-order) one by one, so the
+                    # restore only holds one of them in memory at a time
+                    if "merge" in record:
+                        await self._merge_policy_data(record["merge"], record["path"])
+                    else:
+                        await self.set_policy_data(record["data"], path=record["path"])
+            if not policies_set:
+                await self._import_policies(policies)
+        finally:
+            _restoring_backup.reset(token)
+        await self.replay_backup_journal(journal_seq)
+
+    async def import_snapshot(self, snapshot: StoreSnapshot) -> None:
+        token = _restoring_backup.set(True)
+        try:
+            await self._import_policies(snapshot.policies())
+            await restore_snapshot_data(
+                snapshot,
+                self.set_policy_data,
+                self._merge_policy_data,
+                opal_client_config.STORE_BACKUP_RESTORE_CONCURRENCY,
+            )
+        finally:
+            _restoring_backup.reset(token)
+        await self.replay_backup_journal(snapshot.header.get("journal_seq", 0))
 
+    async def _import_policies(self, policies: Dict[str, str]):
         await OpaClient._attempt_operations_with_postponed_failure_retry(
             [
                 functools.partial(self.set_policy, policy_id=id, policy_code=raw)
-                for id, raw in import_data["policies"].items()
+                for id, raw in policies.items()
             ]
         )
 
-        await self.set_policy_data(import_data["data"])
+    async def replay_backup_journal(self, after_seq: int = 0) -> int:
+        """Applies the journaled operations with a sequence number larger than
+        the given one (e.g. those made after the imported snapshot was taken),
+        returns their number."""
+        if self._backup_journal is None:
+            return 0
+        records = await self._backup_journal.read(after_seq)
+        token = _restoring_backup.set(True)
+        try:
+            for record in records:
+                op = record["op"]
+                if op == "set_data":
+                    await self.set_policy_data(record["data"], path=record["path"])
+                elif op == "patch_data":
+                    await self.patch_policy_data(
+                        [JSONPatchAction(**action) for action in record["data"]],
+                        path=record["path"],
+                    )
+                elif op == "delete_data":
+                    await self.delete_policy_data(path=record["path"])
+                elif op == "set_policy":
+                    await self.set_policy(record["policy_id"], record["policy_code"])
+                elif op == "delete_policy":
+                    await self.delete_policy(record["policy_id"])
+                else:
+                    logger.warning(
+                        "Unknown policy store journal operation: {op}", op=op
+                    )
+        finally:
+            _restoring_backup.reset(token)
+        if records:
+            logger.info(
+                "Replayed {count} operations from the policy store journal",
+                count=len(records),
+            )
+        return len(records)
@@ -0,0 +1,61 @@
+from opal_client.data.coalescer import DataUpdateCoalescer
+from opal_common.schemas.data import DataEntryReport, DataSourceEntry
+
+
+def put(dst_path: str) -> DataSourceEntry:
+    return DataSourceEntry(url="", data={"a": 1}, dst_path=dst_path)
+
+
+def patch(dst_path: str, value: int) -> DataSourceEntry:
+    return DataSourceEntry(
+        url="",
+        data=[{"op": "add", "path": "/a", "value": value}],
+        dst_path=dst_path,
+        save_method="PATCH",
+    )
+
+
+def test_put_does_not_supersede_waiting_entries():
+    """Overwritten entries are dropped by the write sequencer, once the PUT
+    overwriting them was written."""
+    coalescer = DataUpdateCoalescer()
+    waiting = coalescer.register(put("/users"), "1")
+    descendant = coalescer.register(patch("/users/alice", 1), "2")
+    coalescer.register(put("/users"), "3")
+    assert waiting.coalesced_into is None
+    assert descendant.coalesced_into is None
+    assert coalescer.start(descendant) == []
+
+
+def test_consecutive_patches_are_merged():
+    coalescer = DataUpdateCoalescer()
+    first = coalescer.register(patch("/users", 1), "1")
+    second = coalescer.register(patch("/users", 2), "2")
+    unrelated = coalescer.register(put("/roles"), "3")
+    third = coalescer.register(patch("/users", 3), "4")
+    barrier = coalescer.register(patch("/users/alice", 4), "5")
+    fourth = coalescer.register(patch("/users", 5), "6")
+
+    merged = coalescer.start(first)
+    assert merged == [second, third]
+    # only skipped once the merged patch was written
+    assert second.coalesced_into is None and third.coalesced_into is None
+
+    entry = coalescer.merge_patches(first, merged)
+    assert [op.value for op in entry.data] == [1, 2, 3]
+    assert first.entry.data[0].value == 1
+
+    coalescer.merged(
+        first, merged, DataEntryReport(entry=entry, fetched=True, saved=True)
+    )
+    assert second.coalesced_into == third.coalesced_into == "1"
+    assert barrier.coalesced_into is None and fourth.coalesced_into is None
+    assert unrelated.coalesced_into is None
+    report = coalescer.coalesced_report(second)
+    assert report.entry is second.entry and report.saved
+
+    for pending in (first, second, third):
+        coalescer.done(pending)
+    # the patch after the barrier is merged into nothing, it must be applied after it
+    assert coalescer.start(barrier) == []
+    assert coalescer.start(fourth) == []
@@ -0,0 +1,27 @@
+from typing import Awaitable, Callable
+
+import pytest_asyncio
+from aiohttp import web
+
+
+@pytest_asyncio.fixture
+async def serve_app() -> Callable[[web.Application], Awaitable[str]]:
+    """Serves aiohttp apps (e.g. stubs of data sources, or of OPA) on free
+    local ports until the test ends.
+
+    Returns an async function that starts serving an app, and returns
+    its base url.
+    """
+    runners = []
+
+    async def serve(app: web.Application) -> str:
+        runner = web.AppRunner(app)
+        await runner.setup()
+        runners.append(runner)
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    yield serve
+    for runner in reversed(runners):
+        await runner.cleanup()
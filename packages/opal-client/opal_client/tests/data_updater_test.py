@@ -1,16 +1,20 @@
 import asyncio
+import hashlib
 import json
 import logging
 import multiprocessing
 import os
 import sys
+import time
 from multiprocessing import Event, Process
 
+import jsonpatch
 import pytest
 import requests
 import uvicorn
-from aiohttp import ClientSession
+from aiohttp import ClientSession, web
 from fastapi_websocket_pubsub import PubSubClient
+from jsonpointer import JsonPointerException
 from pydantic.json import pydantic_encoder
 
 # Add parent path to use local src as package for tests
@@ -20,22 +24,30 @@ root_dir = os.path.abspath(
 sys.path.append(root_dir)
 
 from opal_client.config import opal_client_config
+from opal_client.data.coalescer import DataUpdateCoalescer
 from opal_client.data.rpc import TenantAwareRpcEventClientMethods
 from opal_client.data.updater import DataSourceEntry, DataUpdate, DataUpdater
+from opal_client.policy.updater import PolicyUpdater
+from opal_client.policy_store.opa_client import OpaClient
 from opal_client.policy_store.policy_store_client_factory import (
     PolicyStoreClientFactory,
 )
 from opal_client.policy_store.schemas import PolicyStoreTypes
+from opal_client.utils import exclude_none_fields
+from opal_common.monitoring import metrics
 from opal_common.schemas.data import (
     DataSourceConfig,
     DataUpdateReport,
     ServerDataSourceConfig,
     UpdateCallback,
 )
-from opal_common.schemas.store import JSONPatchAction
+from opal_common.schemas.policy import DataModule, PolicyBundle
+from opal_common.schemas.store import JSONPatchAction, TransactionType
 from opal_common.tests.test_utils import wait_for_server
 from opal_common.utils import get_authorization_header
 from opal_server.config import opal_server_config
+from opal_server.data.blob_store import DataBlobStore
+from opal_server.data.data_update_publisher import DataUpdatePublisher
 from opal_server.server import OpalServer
 
 PORT = int(os.environ.get("PORT") or "9123")
@@ -327,3 +339,1074 @@ async def test_client_get_initial_data(server):
     # cleanup
     finally:
         await updater.stop()
+
+
+def _create_write_recording_policy_store():
+    """Creates a mock policy store, and a list to which the paths of all policy
+    data writes (PUT) are appended."""
+    policy_store = PolicyStoreClientFactory.create(store_type=PolicyStoreTypes.MOCK)
+    writes = []
+    set_policy_data = policy_store.set_policy_data
+
+    async def recording_set_policy_data(policy_data, path="", transaction_id=None):
+        writes.append(path)
+        return await set_policy_data(policy_data, path, transaction_id)
+
+    policy_store.set_policy_data = recording_set_policy_data
+    return policy_store, writes
+
+
+@pytest.mark.asyncio
+async def test_data_updater_conditional_fetch_skips_unmodified_data(serve_app):
+    """Data sources answering 304 (Not Modified) to a conditional fetch are not
+    written again to the policy store."""
+    etag = '"v1"'
+    requests_headers = []
+
+    async def handle_data(request: web.Request) -> web.Response:
+        requests_headers.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(TEST_DATA, headers={"ETag": etag})
+
+    app = web.Application()
+    app.router.add_get(DATA_ROUTE, handle_data)
+    base_url = await serve_app(app)
+
+    policy_store, writes = _create_write_recording_policy_store()
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    updater._conditional_fetch = True
+    update = DataUpdate(
+        reason="conditional",
+        entries=[
+            DataSourceEntry(
+                url=f"{base_url}{DATA_ROUTE}",
+                topics=DATA_TOPICS,
+                dst_path="/conditional",
+            )
+        ],
+    )
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(update)
+        await updater._update_policy_data(update)
+        assert requests_headers[0].get("If-None-Match") is None
+        assert requests_headers[1].get("If-None-Match") == etag
+        assert writes == ["/conditional"]
+        assert policy_store._data["/conditional"] == TEST_DATA
+
+        # once the policy store lost its data, the next fetch is unconditional
+        updater.forget_written_data()
+        await updater._update_policy_data(update)
+        assert requests_headers[2].get("If-None-Match") is None
+        assert writes == ["/conditional", "/conditional"]
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_skips_unchanged_writes(monkeypatch):
+    """Data identical to the data last written to the same path (or root key,
+    when splitting root data) is not written again to the policy store."""
+    monkeypatch.setattr(opal_client_config, "SPLIT_ROOT_DATA", True)
+    policy_store, writes = _create_write_recording_policy_store()
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    updater._skip_unchanged_writes = True
+
+    def make_update(data: dict, dst_path: str = "/") -> DataUpdate:
+        return DataUpdate(
+            reason="dedup",
+            entries=[
+                DataSourceEntry(
+                    url="", data=data, topics=DATA_TOPICS, dst_path=dst_path
+                )
+            ],
+        )
+
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(make_update({"users": [1], "roles": [2]}))
+        assert sorted(writes) == ["/roles", "/users"]
+
+        # only the changed root key is rewritten
+        await updater._update_policy_data(make_update({"users": [1], "roles": [3]}))
+        assert sorted(writes) == ["/roles", "/roles", "/users"]
+
+        # writing under a path makes the known hash of the path stale
+        await updater._update_policy_data(make_update([4], dst_path="/roles/admins"))
+        await updater._update_policy_data(make_update({"users": [1], "roles": [3]}))
+        assert sorted(writes) == [
+            "/roles",
+            "/roles",
+            "/roles",
+            "/roles/admins",
+            "/users",
+        ]
+
+        # once the policy store lost its data, everything is rewritten
+        updater.forget_written_data()
+        await updater._update_policy_data(make_update({"users": [1], "roles": [3]}))
+        assert writes.count("/users") == 2
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_rewrites_data_overwritten_by_bundles():
+    """Data written by the data modules of a policy bundle makes the known
+    hashes of their paths stale, so identical data is written again."""
+    policy_store, writes = _create_write_recording_policy_store()
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    updater._skip_unchanged_writes = True
+    policy_updater = PolicyUpdater(pubsub_url=UPDATES_URL, policy_store=policy_store)
+    policy_updater.on_bundle_data_written(updater.forget_written_data_of)
+
+    async def fetch_policy_bundle(directories, base_hash=None):
+        return PolicyBundle(
+            manifest=[],
+            hash="abc",
+            data_modules=[DataModule(path="users", data='{"bundled": true}')],
+            policy_modules=[],
+        )
+
+    policy_updater._policy_fetcher.fetch_policy_bundle = fetch_policy_bundle
+
+    def make_update(dst_path: str) -> DataUpdate:
+        return DataUpdate(
+            reason="bundle",
+            entries=[
+                DataSourceEntry(
+                    url="", data=TEST_DATA, topics=DATA_TOPICS, dst_path=dst_path
+                )
+            ],
+        )
+
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(make_update("/users"))
+        await updater._update_policy_data(make_update("/roles"))
+        await policy_updater.update_policy(["."], force_full_update=True)
+        await updater._update_policy_data(make_update("/users"))
+        await updater._update_policy_data(make_update("/roles"))
+        assert writes == ["/users", "/roles", "/users"]
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_streams_data_to_store(monkeypatch, serve_app):
+    """Data sources fetched in streaming mode are passed as is to the policy
+    store, and split (after parsing) when SPLIT_ROOT_DATA is set."""
+    raw = json.dumps(TEST_DATA).encode()
+
+    async def handle_data(request: web.Request) -> web.Response:
+        return web.Response(body=raw, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get(DATA_ROUTE, handle_data)
+    base_url = await serve_app(app)
+
+    policy_store = PolicyStoreClientFactory.create(store_type=PolicyStoreTypes.MOCK)
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+
+    def make_entry(dst_path: str) -> DataSourceEntry:
+        return DataSourceEntry(
+            url=f"{base_url}{DATA_ROUTE}",
+            config={"streaming": True},
+            topics=DATA_TOPICS,
+            dst_path=dst_path,
+        )
+
+    await updater._data_fetcher.start()
+    try:
+        async with policy_store.transaction_context(
+            "streaming", transaction_type=TransactionType.data
+        ) as tx:
+            report = await updater._fetch_and_save_data(make_entry("/streamed"), tx)
+        assert report.saved
+        assert report.hash == hashlib.sha256(raw).hexdigest()
+        assert policy_store._data["/streamed"] == TEST_DATA
+
+        monkeypatch.setattr(opal_client_config, "SPLIT_ROOT_DATA", True)
+        async with policy_store.transaction_context(
+            "streaming", transaction_type=TransactionType.data
+        ) as tx:
+            report = await updater._fetch_and_save_data(make_entry("/"), tx)
+        assert report.saved
+        assert policy_store._data["/hello"] == "world"
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_coalesces_waiting_updates():
+    """A burst of updates to the same path results in a few writes."""
+    policy_store, writes = _create_write_recording_policy_store()
+    patches = []
+    patch_policy_data = policy_store.patch_policy_data
+
+    async def recording_patch_policy_data(policy_data, path="", transaction_id=None):
+        patches.append([op.value for op in policy_data])
+        return await patch_policy_data(policy_data, path, transaction_id)
+
+    policy_store.patch_policy_data = recording_patch_policy_data
+
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    updater._coalescer = DataUpdateCoalescer()
+
+    def make_update(update_id: str, data, save_method: str = "PUT") -> DataUpdate:
+        return DataUpdate(
+            id=update_id,
+            entries=[
+                DataSourceEntry(
+                    url="",
+                    data=data,
+                    topics=DATA_TOPICS,
+                    dst_path="/",
+                    save_method=save_method,
+                )
+            ],
+        )
+
+    reports = {}
+
+    async def record_reports(entry_reports, update):
+        reports[update.id] = entry_reports[0]
+
+    updater._send_reports = record_reports
+
+    await updater._data_fetcher.start()
+    try:
+        tasks = []
+        # hold the destination lock, so all updates wait for it
+        async with updater._dst_lock.lock("/"):
+            for i in range(50):
+                tasks.append(
+                    asyncio.create_task(
+                        updater._update_policy_data(make_update(f"put{i}", {"i": i}))
+                    )
+                )
+            for i in range(3):
+                patch = [{"op": "add", "path": f"/p{i}", "value": i}]
+                tasks.append(
+                    asyncio.create_task(
+                        updater._update_policy_data(
+                            make_update(f"patch{i}", patch, save_method="PATCH")
+                        )
+                    )
+                )
+            # let all of them register and wait on the lock
+            await asyncio.sleep(0.1)
+        await asyncio.gather(*tasks)
+
+        # only the last PUT was written, followed by a single merged PATCH
+        assert writes == ["/"]
+        assert policy_store._data["/"] == {"i": 49}
+        assert patches == [[0, 1, 2]]
+
+        # the earlier PUTs were dropped once the last one was written
+        assert not reports["put0"].saved and reports["put0"].fetched
+        assert reports["put0"].coalesced_into is None
+        assert reports["put49"].saved and reports["put49"].coalesced_into is None
+        assert reports["patch0"].saved and reports["patch0"].coalesced_into is None
+        assert reports["patch2"].saved and reports["patch2"].coalesced_into == "patch0"
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_fetches_concurrently_and_drops_stale_writes(serve_app):
+    """Updates to the same path are fetched concurrently, and data fetched by a
+    slow update is not written over the data of a later update."""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handle_data(request: web.Request) -> web.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(float(request.query["delay"]))
+        in_flight -= 1
+        return web.json_response({"version": request.query["version"]})
+
+    app = web.Application()
+    app.router.add_get(DATA_ROUTE, handle_data)
+    base_url = await serve_app(app)
+
+    policy_store, writes = _create_write_recording_policy_store()
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+
+    reports = {}
+
+    async def record_reports(entry_reports, update):
+        reports[update.id] = entry_reports[0]
+
+    updater._send_reports = record_reports
+
+    def make_update(version: str, delay: float) -> DataUpdate:
+        return DataUpdate(
+            id=version,
+            entries=[
+                DataSourceEntry(
+                    url=f"{base_url}{DATA_ROUTE}?version={version}&delay={delay}",
+                    topics=DATA_TOPICS,
+                    dst_path="/versioned",
+                )
+            ],
+        )
+
+    await updater._data_fetcher.start()
+    try:
+        slow = asyncio.create_task(updater._update_policy_data(make_update("1", 0.5)))
+        await asyncio.sleep(0.05)
+        await updater._update_policy_data(make_update("2", 0))
+        await slow
+
+        assert max_in_flight == 2
+        assert writes == ["/versioned"]
+        assert policy_store._data["/versioned"] == {"version": "2"}
+        assert reports["1"].fetched and not reports["1"].saved
+        assert reports["2"].saved
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_shares_fetches_of_the_same_data_source(serve_app):
+    """Entries of an update fetching the same data source (e.g. polled
+    together) fetch it once, and its data is written to each of them."""
+    requests_count = 0
+
+    async def handle_data(request: web.Request) -> web.Response:
+        nonlocal requests_count
+        requests_count += 1
+        return web.json_response(TEST_DATA)
+
+    app = web.Application()
+    app.router.add_get(DATA_ROUTE, handle_data)
+    base_url = await serve_app(app)
+
+    policy_store, writes = _create_write_recording_policy_store()
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    update = DataUpdate(
+        reason="shared",
+        entries=[
+            DataSourceEntry(
+                url=f"{base_url}{DATA_ROUTE}",
+                topics=DATA_TOPICS,
+                dst_path=dst_path,
+            )
+            for dst_path in ("/first", "/second")
+        ],
+    )
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(update)
+        assert requests_count == 1
+        assert writes == ["/first", "/second"]
+        assert policy_store._data["/second"] == TEST_DATA
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_writes_split_root_keys_concurrently(monkeypatch):
+    """Root keys of data split by SPLIT_ROOT_DATA are written concurrently (up
+    to the configured limit), and failing keys are reported without stopping
+    the writes of the others."""
+    monkeypatch.setattr(opal_client_config, "SPLIT_ROOT_DATA", True)
+    monkeypatch.setattr(opal_client_config, "SPLIT_ROOT_DATA_MAX_CONCURRENT_WRITES", 3)
+    policy_store, writes = _create_write_recording_policy_store()
+    set_policy_data = policy_store.set_policy_data
+    in_flight = 0
+    max_in_flight = 0
+
+    async def slow_set_policy_data(policy_data, path="", transaction_id=None):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if path.startswith("/bad"):
+                raise ValueError("OPA Client: unexpected status code: 400")
+            return await set_policy_data(policy_data, path, transaction_id)
+        finally:
+            in_flight -= 1
+
+    policy_store.set_policy_data = slow_set_policy_data
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    reports = []
+
+    async def record_reports(entry_reports, update):
+        reports.extend(entry_reports)
+
+    updater._send_reports = record_reports
+
+    data = {f"key{i}": [i] for i in range(10)}
+    data.update({"bad1": [], "bad2": []})
+    update = DataUpdate(
+        reason="split",
+        entries=[DataSourceEntry(url="", data=data, topics=DATA_TOPICS, dst_path="/")],
+    )
+    await updater._update_policy_data(update)
+
+    assert max_in_flight == 3
+    assert len(writes) == 10
+    assert policy_store._data["/key9"] == [9]
+    assert not reports[0].saved
+    assert reports[0].failed_keys == ["bad1", "bad2"]
+
+
+@pytest.mark.asyncio
+async def test_data_updater_writes_small_changes_as_patches(monkeypatch):
+    """Data whose changes (since it was last written to the same path) are much
+    smaller than the data itself is written as a JSON patch."""
+    monkeypatch.setattr(opal_client_config, "DATA_UPDATER_DELTA_WRITES_MAX_RATIO", 0.5)
+    policy_store, writes = _create_write_recording_policy_store()
+    patches = []
+
+    async def recording_patch_policy_data(policy_data, path="", transaction_id=None):
+        patches.append(
+            (path, [op.dict(by_alias=True, exclude_none=True) for op in policy_data])
+        )
+
+    policy_store.patch_policy_data = recording_patch_policy_data
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    updater._delta_writes = True
+
+    def make_update(data, dst_path: str = "/users") -> DataUpdate:
+        return DataUpdate(
+            reason="delta",
+            entries=[
+                DataSourceEntry(
+                    url="", data=data, topics=DATA_TOPICS, dst_path=dst_path
+                )
+            ],
+        )
+
+    users = {f"user{i}": {"roles": ["viewer"], "active": True} for i in range(50)}
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(make_update(users))
+        assert writes == ["/users"] and patches == []
+
+        # a small change is written as a patch
+        users = {**users, "user7": {"roles": ["admin"], "active": True}}
+        await updater._update_policy_data(make_update(users))
+        assert writes == ["/users"]
+        assert patches == [
+            ("/users", [{"op": "replace", "path": "/user7/roles/0", "value": "admin"}])
+        ]
+
+        # unchanged data isn't written at all
+        await updater._update_policy_data(make_update(users))
+        assert writes == ["/users"] and len(patches) == 1
+
+        # large changes are PUT
+        users = {f"user{i}": {"roles": ["editor"], "active": True} for i in range(50)}
+        await updater._update_policy_data(make_update(users))
+        assert writes == ["/users", "/users"] and len(patches) == 1
+
+        # null values are diffed as the policy store gets them: left out
+        users = {**users, "user7": {"roles": None, "active": True}}
+        await updater._update_policy_data(make_update(users))
+        assert patches[-1] == ("/users", [{"op": "remove", "path": "/user7/roles"}])
+        users = {**users, "user7": {"roles": ["editor"], "active": True}}
+        await updater._update_policy_data(make_update(users))
+        assert patches[-1] == (
+            "/users",
+            [{"op": "add", "path": "/user7/roles", "value": ["editor"]}],
+        )
+        assert writes == ["/users", "/users"]
+
+        # the last written data is kept as a copy, changing it doesn't change
+        # the base of the next patch
+        users = {f"user{i}": {"roles": ["editor"], "active": True} for i in range(50)}
+        await updater._update_policy_data(make_update(users))
+        users["user3"]["roles"][0] = "admin"
+        await updater._update_policy_data(make_update(users))
+        assert patches[-1] == (
+            "/users",
+            [{"op": "replace", "path": "/user3/roles/0", "value": "admin"}],
+        )
+        writes.clear()
+        patches.clear()
+
+        # a renamed key is diffed as a move, which the policy store can't apply
+        users = {("dave" if key == "user3" else key): v for key, v in users.items()}
+        await updater._update_policy_data(make_update(users))
+        # and so is a reordered list
+        items = list(range(100))
+        await updater._update_policy_data(make_update(items, "/items"))
+        await updater._update_policy_data(
+            make_update(items[-1:] + items[:-1], "/items")
+        )
+        assert writes == ["/users", "/items", "/items"] and patches == []
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_writes_rejected_patches_in_full(monkeypatch):
+    """Patches are based on the data the policy store got (without null
+    values), and data whose patch the policy store rejects (e.g. since it lost
+    the data of the path) is written in full instead."""
+    monkeypatch.setattr(opal_client_config, "DATA_UPDATER_DELTA_WRITES_MAX_RATIO", 10)
+    policy_store, writes = _create_write_recording_policy_store()
+    set_policy_data = policy_store.set_policy_data
+    patches = []
+
+    async def opa_like_set_policy_data(policy_data, path="", transaction_id=None):
+        # like OPA, keeps the data without null values
+        return await set_policy_data(
+            exclude_none_fields(policy_data), path, transaction_id
+        )
+
+    async def opa_like_patch_policy_data(policy_data, path="", transaction_id=None):
+        # like OPA, rejects patches of paths that don't exist
+        operations = [op.dict(by_alias=True, exclude_none=True) for op in policy_data]
+        patches.append(operations)
+        try:
+            policy_store._data[path] = jsonpatch.apply_patch(
+                policy_store._data[path], operations
+            )
+        except (KeyError, jsonpatch.JsonPatchException, JsonPointerException):
+            raise ValueError("OPA Client: unexpected status code: 404")
+
+    policy_store.set_policy_data = opa_like_set_policy_data
+    policy_store.patch_policy_data = opa_like_patch_policy_data
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    updater._delta_writes = True
+    reports = []
+
+    async def record_reports(entry_reports, update):
+        reports.extend(entry_reports)
+
+    updater._send_reports = record_reports
+
+    def make_update(data) -> DataUpdate:
+        return DataUpdate(
+            reason="delta",
+            entries=[
+                DataSourceEntry(url="", data=data, topics=DATA_TOPICS, dst_path="/doc")
+            ],
+        )
+
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(make_update({"a": 1, "b": None}))
+        assert policy_store._data["/doc"] == {"a": 1}
+
+        # the null value never reached the policy store, so there's nothing to remove
+        await updater._update_policy_data(make_update({"a": 1}))
+        assert writes == ["/doc"] and patches == []
+        assert reports[-1].saved
+
+        # the policy store lost the data of the path, so the patch is rejected
+        del policy_store._data["/doc"]
+        await updater._update_policy_data(make_update({"a": 2}))
+        assert len(patches) == 1
+        assert writes == ["/doc", "/doc"]
+        assert policy_store._data["/doc"] == {"a": 2}
+        assert reports[-1].saved
+    finally:
+        await updater._data_fetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_data_updater_writes_root_document_changes_as_patches(
+    monkeypatch, serve_app
+):
+    """Changes to the root document are written to OPA as a single JSON patch
+    of the root document."""
+    monkeypatch.setattr(opal_client_config, "DATA_UPDATER_DELTA_WRITES_MAX_RATIO", 0.5)
+    requests_ = []
+    document = {}
+
+    async def handle_put_data(request: web.Request) -> web.Response:
+        nonlocal document
+        requests_.append("PUT")
+        document = json.loads(await request.read())
+        return web.Response(status=204)
+
+    async def handle_patch_data(request: web.Request) -> web.Response:
+        nonlocal document
+        requests_.append("PATCH")
+        # like OPA, rejects anything but a list of operations
+        operations = json.loads(await request.read())
+        if not isinstance(operations, list):
+            return web.json_response({"code": "invalid_parameter"}, status=400)
+        document = jsonpatch.apply_patch(document, operations)
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_put("/v1/data", handle_put_data)
+    app.router.add_patch("/v1/data", handle_patch_data)
+    base_url = await serve_app(app)
+
+    policy_store = OpaClient(base_url)
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    updater._delta_writes = True
+
+    def make_update(data) -> DataUpdate:
+        return DataUpdate(
+            reason="delta",
+            entries=[DataSourceEntry(url="", data=data, topics=DATA_TOPICS)],
+        )
+
+    users = {f"user{i}": {"roles": ["viewer"]} for i in range(50)}
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(make_update({"users": users}))
+        users = {**users, "user7": {"roles": ["admin"]}}
+        await updater._update_policy_data(make_update({"users": users}))
+    finally:
+        await updater._data_fetcher.stop()
+        await policy_store.stop_liveness_probe()
+
+    assert requests_ == ["PUT", "PATCH"]
+    assert document == {"users": users}
+
+
+@pytest.mark.asyncio
+async def test_data_updater_records_stage_histograms(monkeypatch):
+    """The stages of applying an update are recorded as histograms (labelled by
+    data source and topic), exposed in the Prometheus format."""
+    monkeypatch.setattr(metrics, "_record_histograms", True)
+    metrics.reset_histograms()
+    policy_store, writes = _create_write_recording_policy_store()
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    update = DataUpdate(
+        reason="metrics",
+        entries=[
+            DataSourceEntry(
+                url="", data={"a": 1, "b": 2}, topics=DATA_TOPICS, dst_path="/ab"
+            )
+        ],
+    )
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(update, received_at=time.monotonic())
+    finally:
+        await updater._data_fetcher.stop()
+
+    assert writes == ["/ab"]
+    exposition = metrics.render_prometheus()
+    labels = '{source="inline",topic="policy_data"}'
+    for metric in ("lock_wait", "store_duration", "items"):
+        assert f"opal_data_updater_{metric}_count{labels} 1" in exposition
+    assert f"opal_data_updater_items_sum{labels} 2.0" in exposition
+    assert 'opal_data_updater_update_latency_count{topic="policy_data"} 1' in exposition
+
+
+@pytest.mark.asyncio
+async def test_data_updater_writes_paginated_data_page_by_page(serve_app):
+    """Pages of a paginated data source are written as they are fetched: the
+    first page is PUT, the following ones are appended with PATCHes."""
+    users = [{"id": i} for i in range(7)]
+
+    async def handle_data(request: web.Request) -> web.Response:
+        offset = int(request.query.get("cursor", 0))
+        page = {"data": {"users": users[offset : offset + 3]}}
+        if offset + 3 < len(users):
+            page["next_cursor"] = str(offset + 3)
+        return web.json_response(page)
+
+    app = web.Application()
+    app.router.add_get(DATA_ROUTE, handle_data)
+    base_url = await serve_app(app)
+
+    policy_store, writes = _create_write_recording_policy_store()
+    patches = []
+
+    async def recording_patch_policy_data(policy_data, path="", transaction_id=None):
+        patches.append((path, [op.value for op in policy_data]))
+
+    policy_store.patch_policy_data = recording_patch_policy_data
+    reports = []
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+
+    async def record_reports(reports_: list, update: DataUpdate):
+        reports.extend(reports_)
+
+    updater._send_reports = record_reports
+    update = DataUpdate(
+        reason="paginated",
+        entries=[
+            DataSourceEntry(
+                url=f"{base_url}{DATA_ROUTE}",
+                config={
+                    "fetcher": "PaginatedFetchProvider",
+                    "items_path": "data.users",
+                    "next_path": "next_cursor",
+                    "cursor_param": "cursor",
+                },
+                topics=DATA_TOPICS,
+                dst_path="/users",
+            )
+        ],
+    )
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(update)
+    finally:
+        await updater._data_fetcher.stop()
+
+    assert writes == ["/users"]
+    assert policy_store._data["/users"] == users[:3]
+    assert patches == [("/users", users[3:6]), ("/users", users[6:])]
+    assert reports[0].saved and reports[0].hash
+
+
+@pytest.mark.asyncio
+async def test_data_updater_restores_previous_data_if_a_page_fails(serve_app):
+    """If a page of a paginated data source fails, the previous data of the
+    path is written back; pages are written like a PUT of the whole data (null
+    values of objects are left out, null items are kept)."""
+
+    async def handle_data(request: web.Request) -> web.Response:
+        cursor = request.query.get("cursor")
+        if cursor == "2":
+            return web.Response(status=404)
+        if cursor == "1":
+            return web.json_response({"users": [None, {"id": 3}], "next": "2"})
+        return web.json_response({"users": [{"id": 1, "x": None}, None], "next": "1"})
+
+    app = web.Application()
+    app.router.add_get(DATA_ROUTE, handle_data)
+    base_url = await serve_app(app)
+
+    policy_store, writes = _create_write_recording_policy_store()
+    policy_store._data["/users"] = [{"id": 0}]
+    patches = []
+
+    async def recording_patch_policy_data(policy_data, path="", transaction_id=None):
+        patches.append((path, [op.value for op in policy_data]))
+
+    policy_store.patch_policy_data = recording_patch_policy_data
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    update = DataUpdate(
+        reason="paginated",
+        entries=[
+            DataSourceEntry(
+                url=f"{base_url}{DATA_ROUTE}",
+                config={
+                    "fetcher": "PaginatedFetchProvider",
+                    "items_path": "users",
+                    "next_path": "next",
+                    "cursor_param": "cursor",
+                },
+                topics=DATA_TOPICS,
+                dst_path="/users",
+            )
+        ],
+    )
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(update)
+    finally:
+        await updater._data_fetcher.stop()
+
+    assert patches == [("/users", [None, {"id": 3}])]
+    # the first page, then the previous data
+    assert writes == ["/users", "/users"]
+    assert policy_store._data["/users"] == [{"id": 0}]
+
+
+@pytest.mark.asyncio
+async def test_data_updater_deletes_new_path_if_a_page_fails(serve_app):
+    """If a page of a paginated data source fails and its path didn't exist
+    before (OPA reads a missing path as empty), the path is deleted rather than
+    written back empty."""
+    store = {"/groups": ["admins"]}
+
+    async def handle_data(request: web.Request) -> web.Response:
+        if request.query.get("cursor") == "1":
+            return web.Response(status=404)
+        return web.json_response({"users": [{"id": 1}], "next": "1"})
+
+    async def handle_opa_data(request: web.Request) -> web.Response:
+        path = "/" + request.match_info["path"]
+        if request.method == "GET":
+            if path not in store:
+                return web.json_response({})
+            return web.json_response({"result": store[path]})
+        if request.method == "PUT":
+            store[path] = await request.json()
+        else:
+            store.pop(path, None)
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_get(DATA_ROUTE, handle_data)
+    app.router.add_route("*", "/v1/data/{path:.*}", handle_opa_data)
+    base_url = await serve_app(app)
+
+    policy_store = OpaClient(f"{base_url}")
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+    )
+    update = DataUpdate(
+        reason="paginated",
+        entries=[
+            DataSourceEntry(
+                url=f"{base_url}{DATA_ROUTE}",
+                config={
+                    "fetcher": "PaginatedFetchProvider",
+                    "items_path": "users",
+                    "next_path": "next",
+                    "cursor_param": "cursor",
+                },
+                topics=DATA_TOPICS,
+                dst_path="/users",
+            )
+        ],
+    )
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(update)
+    finally:
+        await updater._data_fetcher.stop()
+        await policy_store.stop_liveness_probe()
+
+    assert store == {"/groups": ["admins"]}
+
+
+@pytest.mark.asyncio
+async def test_data_updater_fetches_data_blobs_from_server(monkeypatch, serve_app):
+    """Entries whose data is published as a data blob (by its hash) fetch it
+    from the server (keeping their config), and fail if it doesn't match the
+    hash."""
+    blob = json.dumps(TEST_DATA).encode()
+    blob_hash = hashlib.sha256(blob).hexdigest()
+    blobs_route = opal_server_config.DATA_BLOBS_ROUTE
+    requests_headers = []
+
+    async def handle_blob(request: web.Request) -> web.Response:
+        requests_headers.append(dict(request.headers))
+        body = blob if request.match_info["hash"] == blob_hash else b'{"x": 1}'
+        return web.Response(body=body, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get(f"{blobs_route}/{{hash}}", handle_blob)
+    base_url = await serve_app(app)
+    monkeypatch.setattr(opal_client_config, "SERVER_URL", base_url)
+
+    policy_store, writes = _create_write_recording_policy_store()
+    reports = []
+    updater = DataUpdater(
+        pubsub_url=UPDATES_URL,
+        policy_store=policy_store,
+        fetch_on_connect=False,
+        data_topics=DATA_TOPICS,
+        should_send_reports=False,
+        token="blob-token",
+    )
+
+    async def record_reports(reports_: list, update: DataUpdate):
+        reports.extend(reports_)
+
+    updater._send_reports = record_reports
+    corrupt_hash = "0" * 64
+    update = DataUpdate(
+        reason="blobs",
+        entries=[
+            DataSourceEntry(
+                url=f"{blobs_route}/{blob_hash}",
+                blob=blob_hash,
+                config={"headers": {"X-Tenant": "acme"}},
+                topics=DATA_TOPICS,
+                dst_path="/blob",
+            ),
+            DataSourceEntry(
+                url=f"{blobs_route}/{corrupt_hash}",
+                blob=corrupt_hash,
+                topics=DATA_TOPICS,
+                dst_path="/corrupt",
+            ),
+        ],
+    )
+    await updater._data_fetcher.start()
+    try:
+        await updater._update_policy_data(update)
+    finally:
+        await updater._data_fetcher.stop()
+
+    assert writes == ["/blob"]
+    assert policy_store._data["/blob"] == TEST_DATA
+    assert [report.saved for report in reports] == [True, False]
+    assert requests_headers[0]["Authorization"] == "Bearer blob-token"
+    assert requests_headers[0]["X-Tenant"] == "acme"
+    # the client's token isn't added to the entries (which are reported and logged)
+    assert update.entries[0].config == {"headers": {"X-Tenant": "acme"}}
+    assert update.entries[1].config is None
+    assert "blob-token" not in reports[0].json()
+
+
+@pytest.mark.asyncio
+async def test_data_blobs_are_written_like_inline_data(
+    monkeypatch, serve_app, tmp_path
+):
+    """An update writes the same data to OPA whether its data is published
+    inline or as data blobs (without null fields, and with a list written to
+    the root document wrapped)."""
+    blob_store = DataBlobStore(str(tmp_path), ttl=60)
+    published = []
+    written = []
+
+    class RecordingPublisher:
+        async def publish(self, topics, data=None):
+            published.append(data)
+
+    async def handle_blob(request: web.Request) -> web.Response:
+        return web.FileResponse(blob_store.path(request.match_info["hash"]))
+
+    async def handle_data(request: web.Request) -> web.Response:
+        path = request.match_info.get("path", "")
+        written[-1].append(
+            (f"/{path}" if path else "", json.loads(await request.read()))
+        )
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_get(f"{opal_server_config.DATA_BLOBS_ROUTE}/{{hash}}", handle_blob)
+    app.router.add_put("/v1/data", handle_data)
+    app.router.add_put("/v1/data/{path:.*}", handle_data)
+    base_url = await serve_app(app)
+    monkeypatch.setattr(opal_client_config, "SERVER_URL", base_url)
+
+    update = DataUpdate(
+        reason="blobs",
+        entries=[
+            DataSourceEntry(
+                url="",
+                data=[{"id": 1, "name": None}],
+                topics=DATA_TOPICS,
+                dst_path="",
+            ),
+            DataSourceEntry(
+                url="",
+                data={"alice": {"role": "admin", "team": None}},
+                topics=DATA_TOPICS,
+                dst_path="/users",
+            ),
+        ],
+    )
+    # published inline (blobs disabled), then as blobs
+    for blob_threshold in (0, 1):
+        publisher = DataUpdatePublisher(
+            RecordingPublisher(), blob_store=blob_store, blob_threshold=blob_threshold
+        )
+        await publisher.publish_data_updates(update)
+        written.append([])
+        policy_store = OpaClient(base_url)
+        updater = DataUpdater(
+            pubsub_url=UPDATES_URL,
+            policy_store=policy_store,
+            fetch_on_connect=False,
+            data_topics=DATA_TOPICS,
+            should_send_reports=False,
+        )
+        await updater._data_fetcher.start()
+        try:
+            await updater._update_policy_data(DataUpdate(**published[-1]))
+        finally:
+            await updater._data_fetcher.stop()
+            await policy_store.stop_liveness_probe()
+
+    inline, blobs = published
+    assert all(entry["blob"] is None for entry in inline["entries"])
+    assert all(entry["blob"] is not None for entry in blobs["entries"])
+    assert sorted(written[0]) == [
+        ("", {"items": [{"id": 1}]}),
+        ("/users", {"alice": {"role": "admin"}}),
+    ]
+    assert sorted(written[1]) == sorted(written[0])
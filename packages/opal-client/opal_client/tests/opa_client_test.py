@@ -1,11 +1,35 @@
+import asyncio
 import functools
+import json
 import os
 import random
 
+import aiofiles
 import pytest
+from aiohttp import web
 from fastapi import Response, status
-from opal_client.policy_store.opa_client import OpaClient, should_ignore_path
+from opal_client.config import opal_client_config
+from opal_client.policy_store.backup_format import (
+    RawJson,
+    StoreBackupWriter,
+    iter_data_chunks,
+    read_store_backup,
+)
+from opal_client.policy_store.backup_journal import StoreBackupJournal
+from opal_client.policy_store.backup_snapshot import (
+    StoreSnapshot,
+    convert_backup_to_snapshot,
+    is_snapshot_of,
+)
+from opal_client.policy_store.opa_client import (
+    OpaClient,
+    OpaStaticDataCache,
+    _patch_document,
+    should_ignore_path,
+)
 from opal_client.policy_store.schemas import PolicyStoreAuth
+from opal_common.fetcher.data_stream import SpooledDataStream
+from opal_common.schemas.store import JSONPatchAction
 
 TEST_CA_CERT = """-----BEGIN CERTIFICATE-----
 MIIBdjCCAR2gAwIBAgIUaQ/M1qL0GzsTMChEAJsLLFgz7a4wCgYIKoZIzj0EAwIw
@@ -64,6 +88,242 @@ def test_constructor_should_set_up_ca_certificate_even_without_tls_auth_type(tmp
     assert len(certs) == 1
 
 
+@pytest.mark.asyncio
+async def test_requests_reuse_pooled_keepalive_connection(serve_app):
+    peers = set()
+
+    async def handle_put_data(request: web.Request) -> web.Response:
+        peers.add(request.transport.get_extra_info("peername"))
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_put("/v1/data/{path:.*}", handle_put_data)
+    base_url = await serve_app(app)
+
+    client = OpaClient(base_url)
+    try:
+        for i in range(5):
+            await client.set_policy_data({"value": i}, path=f"/key{i}")
+        session = client._pooled_session
+        assert session is not None and not session.closed
+        # all writes went over a single keep-alive connection
+        assert len(peers) == 1
+
+        # stopping the client's background probe also releases the pool
+        await client.stop_liveness_probe()
+        assert session.closed
+        assert client._pooled_session is None
+
+        # and the pool is transparently re-created on the next request
+        await client.set_policy_data({"value": "again"}, path="/key0")
+        assert client._pooled_session is not session
+    finally:
+        await client.stop_liveness_probe()
+
+
+@pytest.mark.asyncio
+async def test_retiring_the_pool_lets_requests_in_flight_finish(serve_app):
+    """When the pool is recycled (the engine came back after an outage), new
+    requests use a new pool, and requests in flight on the old one aren't
+    aborted - it's closed once they're done (or when the client stops)."""
+    received = asyncio.Event()
+    respond = asyncio.Event()
+
+    async def handle_put_data(request: web.Request) -> web.Response:
+        if request.match_info["path"] == "slow":
+            received.set()
+            await respond.wait()
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_put("/v1/data/{path:.*}", handle_put_data)
+    base_url = await serve_app(app)
+
+    client = OpaClient(base_url)
+    try:
+        slow_write = asyncio.create_task(
+            client.set_policy_data({"value": 1}, path="/slow")
+        )
+        await received.wait()
+        session = client._pooled_session
+        client._retire_pooled_session()
+
+        await client.set_policy_data({"value": 2}, path="/fast")
+        assert client._pooled_session is not session
+        assert not session.closed
+        respond.set()
+        await slow_write
+    finally:
+        await client.stop_liveness_probe()
+    assert session.closed
+    assert not client._retired_session_closers
+
+
+@pytest.mark.asyncio
+async def test_set_policy_data_caches_a_copy_of_the_written_data(serve_app):
+    """The cache holds the data as it was written to OPA (without fields set to
+    None), unaffected by later changes to the caller's object."""
+
+    async def handle_put_data(request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_put("/v1/data/{path:.*}", handle_put_data)
+    base_url = await serve_app(app)
+
+    client = OpaClient(base_url, cache_policy_data=True)
+    try:
+        users = {"alice": {"role": "admin", "team": None}}
+        await client.set_policy_data(users, path="/users")
+        users["bob"] = {"role": "viewer"}
+        assert client._policy_data_cache.get_data() == {
+            "users": {"alice": {"role": "admin"}}
+        }
+    finally:
+        await client.stop_liveness_probe()
+
+
+@pytest.mark.asyncio
+async def test_set_policy_data_from_stream(serve_app):
+    received = {}
+
+    async def handle_put_data(request: web.Request) -> web.Response:
+        received[request.match_info.get("path", "")] = (
+            await request.read(),
+            request.headers.get("Content-Type"),
+        )
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_put("/v1/data", handle_put_data)
+    app.router.add_put("/v1/data/{path:.*}", handle_put_data)
+    base_url = await serve_app(app)
+
+    raw = b'{"users":\n ["alice", "bob"]}'
+    stream = SpooledDataStream()
+    await stream.write(raw[:10])
+    await stream.write(raw[10:])
+
+    client = OpaClient(base_url, cache_policy_data=True)
+    try:
+        await client.set_policy_data(stream, path="/tenant")
+        # the raw data is passed through as is
+        assert received["tenant"] == (raw, "application/json")
+        # and cached as is, parsed once it's read (or written under)
+        cached = client._policy_data_cache.snapshot()["tenant"]
+        assert isinstance(cached, RawJson)
+        assert client._policy_data_cache.get_data() == {
+            "tenant": {"users": ["alice", "bob"]}
+        }
+        client._policy_data_cache.patch(
+            "/tenant", [{"op": "add", "path": "/users/-", "value": "carol"}]
+        )
+        assert client._policy_data_cache.get_data() == {
+            "tenant": {"users": ["alice", "bob", "carol"]}
+        }
+
+        # a list can't be the root document, so it's wrapped (as when not streamed)
+        root_stream = SpooledDataStream()
+        await root_stream.write(b' ["alice", "bob"]')
+        try:
+            await client.set_policy_data(root_stream)
+        finally:
+            root_stream.close()
+        assert json.loads(received[""][0]) == {"items": ["alice", "bob"]}
+    finally:
+        stream.close()
+        await client.stop_liveness_probe()
+
+
+@pytest.mark.asyncio
+async def test_set_policy_data_from_stream_keeps_null_fields(serve_app):
+    """Streamed data is written to OPA as is, with its fields set to null -
+    unlike the same data written parsed (see exclude_none_fields)."""
+    received = {}
+
+    async def handle_put_data(request: web.Request) -> web.Response:
+        received[request.match_info["path"]] = json.loads(await request.read())
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_put("/v1/data/{path:.*}", handle_put_data)
+    base_url = await serve_app(app)
+
+    raw = b'{"alice": {"role": "admin", "manager": null}}'
+    stream = SpooledDataStream()
+    await stream.write(raw)
+
+    client = OpaClient(base_url)
+    try:
+        await client.set_policy_data(stream, path="/streamed")
+        await client.set_policy_data(json.loads(raw), path="/parsed")
+        assert received["streamed"] == {"alice": {"role": "admin", "manager": None}}
+        assert received["parsed"] == {"alice": {"role": "admin"}}
+    finally:
+        stream.close()
+        await client.stop_liveness_probe()
+
+
+def test_patch_document_keeps_null_values():
+    patch = [
+        JSONPatchAction(op="add", path="/-", value=None),
+        JSONPatchAction(op="add", path="/-", value={"a": None, "b": 1}),
+        JSONPatchAction(op="remove", path="/0"),
+    ]
+    assert _patch_document(patch) == [
+        {"op": "add", "path": "/-", "value": None},
+        {"op": "add", "path": "/-", "value": {"b": 1}},
+        {"op": "remove", "path": "/0"},
+    ]
+    # the value may be null, but must be given
+    with pytest.raises(ValueError):
+        JSONPatchAction(op="add", path="/-")
+
+
+def test_static_data_cache_shares_written_documents():
+    """The cache references written documents as is, and copies only what's on
+    the path of later writes - never modifying the documents written to it."""
+    cache = OpaStaticDataCache()
+    users = {"alice": {"roles": ["admin"]}, "bob": {"roles": ["viewer"]}}
+    groups = [{"name": "devs"}]
+    cache.set("/", {"tenants": {}})
+    cache.set("/tenants/t1/users", users)
+    cache.set("/tenants/t1/groups", groups)
+    assert cache.get_data()["tenants"]["t1"]["users"] is users
+
+    patch = [
+        JSONPatchAction(op="add", path="/alice/roles/-", value="editor"),
+        JSONPatchAction(op="remove", path="/bob"),
+        JSONPatchAction(op="copy", path="/carol", **{"from": "/alice"}),
+    ]
+    cache.patch("/tenants/t1/users", patch)
+    cache.patch(
+        "/tenants/t1/groups", [{"op": "replace", "path": "/0/name", "value": "ops"}]
+    )
+    cache.delete("/tenants/t1/missing")
+
+    assert cache.get_data() == {
+        "tenants": {
+            "t1": {
+                "users": {
+                    "alice": {"roles": ["admin", "editor"]},
+                    "carol": {"roles": ["admin", "editor"]},
+                },
+                "groups": [{"name": "ops"}],
+            }
+        }
+    }
+    # the written documents (and the patch) are left as they were
+    assert users == {"alice": {"roles": ["admin"]}, "bob": {"roles": ["viewer"]}}
+    assert groups == [{"name": "devs"}]
+    assert [action.path for action in patch] == ["/alice/roles/-", "/bob", "/carol"]
+
+    # objects shared by several documents are counted once
+    footprint = cache.memory_footprint()
+    cache.set("/tenants/t2/users", cache.get_data()["tenants"]["t1"]["users"])
+    assert 0 < cache.memory_footprint() - footprint < 1000
+
+
 @pytest.mark.asyncio
 async def test_attempt_operations_with_postponed_failure_retry():
     class OrderStrictOps:
@@ -227,3 +487,263 @@ def test_should_ignore_path_keeping_higher_priority_to_ones_defined_as_not_to_ig
     )
     assert should_ignore_path("otherFolder", ignore_paths) == True
     assert should_ignore_path("otherFolder/file.txt", ignore_paths) == True
+
+
+@pytest.mark.asyncio
+async def test_backup_journal_restores_snapshot_and_later_operations(
+    tmp_path, serve_app
+):
+    """Operations are journaled as they're applied, and a backup is restored by
+    replaying the journal on top of the snapshot (only the operations that the
+    snapshot doesn't include)."""
+    policies = {}
+
+    async def handle_data(request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+    async def handle_put_policy(request: web.Request) -> web.Response:
+        policies[request.match_info["id"]] = await request.text()
+        return web.json_response({})
+
+    async def handle_get_policies(request: web.Request) -> web.Response:
+        return web.json_response(
+            {"result": [{"id": id, "raw": raw} for id, raw in policies.items()]}
+        )
+
+    app = web.Application()
+    app.router.add_route("*", "/v1/data", handle_data)
+    app.router.add_route("*", "/v1/data/{path:.*}", handle_data)
+    app.router.add_put("/v1/policies/{id}", handle_put_policy)
+    app.router.add_get("/v1/policies", handle_get_policies)
+    url = await serve_app(app)
+
+    backup_path = tmp_path / "opa.json"
+    journal_path = str(tmp_path / "opa.json.journal")
+
+    def make_client():
+        client = OpaClient(url, cache_policy_data=True)
+        assert client.set_backup_journal(StoreBackupJournal(journal_path))
+        return client
+
+    async def restore() -> OpaClient:
+        client = make_client()
+        if backup_path.exists():
+            async with aiofiles.open(backup_path, "r") as f:
+                await client.full_import(f)
+        else:
+            await client.replay_backup_journal()
+        return client
+
+    client = make_client()
+    await client.set_policy("authz", "package authz")
+    await client.set_policy_data({"alice": ["admin"]}, path="/users")
+    await client.patch_policy_data(
+        [JSONPatchAction(op="add", path="/bob", value=["viewer"])], path="/users"
+    )
+    # a crash while writing an operation leaves a partial line
+    with open(journal_path, "ab") as f:
+        f.write(b'{"seq": 4, "op": "set_da')
+
+    restored = await restore()
+    assert (
+        restored._policy_data_cache.get_data() == client._policy_data_cache.get_data()
+    )
+    assert restored._backup_journal.seq == 3
+
+    # compaction: the snapshot includes the operations journaled so far
+    async with aiofiles.open(backup_path, "w") as f:
+        await restored.full_export(f)
+    await restored.patch_policy_data(
+        [JSONPatchAction(op="remove", path="/alice")], path="/users"
+    )
+    await restored._backup_journal.commit_snapshot()
+    await restored.delete_policy_data(path="/groups")
+    assert [r["op"] for r in await restored._backup_journal.read()] == [
+        "patch_data",
+        "delete_data",
+    ]
+
+    restored_again = await restore()
+    assert restored_again._policy_data_cache.get_data() == {
+        "users": {"bob": ["viewer"]}
+    }
+    assert restored_again._backup_journal.seq == 5
+    assert policies == {"authz": "package authz"}
+
+    # closing the journal (on the client's shutdown) writes the last operations
+    restored_again._backup_journal.record("delete_data", path="/tmp")
+    await restored_again._backup_journal.close()
+    assert StoreBackupJournal(journal_path).seq == 6
+
+
+def test_backup_data_is_split_into_documents_by_path():
+    data = {
+        "users": {"alice": ["admin"] * 10, "bob": ["viewer"], "carol": ["viewer"]},
+        "tenants": [{"id": i} for i in range(20)],
+        "small": 1,
+    }
+    assert list(iter_data_chunks(data, chunk_size=64)) == [
+        # arrays (and objects of keys that can't be written to by path) aren't split
+        {"path": "", "data": {"tenants": data["tenants"]}},
+        {"path": "", "merge": {"small": 1}},
+        {"path": "/users", "data": {"alice": ["admin"] * 10}},
+        {"path": "/users", "merge": {"bob": ["viewer"], "carol": ["viewer"]}},
+    ]
+    assert list(iter_data_chunks({"a/b": "x" * 100}, chunk_size=64)) == [
+        {"path": "", "data": {"a/b": "x" * 100}}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_raw_json_documents_are_backed_up_as_is(tmp_path):
+    raw = RawJson(b'{"alice":\r\n ["admin"]}')
+    data = {"users": raw, "small": {"x": RawJson(b"[1]")}}
+    records = list(iter_data_chunks(data, chunk_size=24))
+    # only raw documents within other documents are parsed
+    assert records == [
+        {"path": "", "data": {"small": {"x": [1]}}},
+        {"path": "/users", "data": raw},
+    ]
+
+    backup_path = tmp_path / "opa.json"
+    async with aiofiles.open(backup_path, "w") as f:
+        backup = StoreBackupWriter(f)
+        await backup.write_header()
+        await backup.write_data(data, chunk_size=24)
+    async with aiofiles.open(backup_path, "r") as f:
+        restored = [record async for record in read_store_backup(f)]
+    assert restored[1:] == [
+        {"path": "", "data": {"small": {"x": [1]}}},
+        {"path": "/users", "data": {"alice": ["admin"]}},
+    ]
+
+
+def make_opa_stub(written: list, policies: dict) -> web.Application:
+    """Serves OPA's data and policies API, recording the data written to it."""
+
+    async def handle_data(request: web.Request) -> web.Response:
+        path = request.match_info.get("path", "")
+        body = json.loads(await request.text())
+        written.append((request.method, f"/{path}" if path else "", body))
+        return web.Response(status=204)
+
+    async def handle_put_policy(request: web.Request) -> web.Response:
+        policies[request.match_info["id"]] = await request.text()
+        return web.json_response({})
+
+    async def handle_get_policies(request: web.Request) -> web.Response:
+        return web.json_response(
+            {"result": [{"id": id, "raw": raw} for id, raw in policies.items()]}
+        )
+
+    app = web.Application()
+    app.router.add_route("*", "/v1/data", handle_data)
+    app.router.add_route("*", "/v1/data/{path:.*}", handle_data)
+    app.router.add_put("/v1/policies/{id}", handle_put_policy)
+    app.router.add_get("/v1/policies", handle_get_policies)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_full_export_and_import_stream_data_documents(
+    tmp_path, monkeypatch, serve_app
+):
+    """Backups are written as a series of documents, and restored by writing
+    them one by one (backups of older versions are restored too)."""
+    written, policies = [], {"authz": "package authz"}
+    url = await serve_app(make_opa_stub(written, policies))
+    monkeypatch.setattr(opal_client_config, "STORE_BACKUP_CHUNK_SIZE", 64)
+
+    data = {"users": {"alice": ["admin"] * 10, "bob": ["viewer"] * 10}, "x": 1}
+    backup_path = tmp_path / "opa.json"
+    client = OpaClient(url, cache_policy_data=True)
+    await client.set_policy_data(data)
+    async with aiofiles.open(backup_path, "w") as f:
+        await client.full_export(f)
+    lines = backup_path.read_text().splitlines()
+    assert json.loads(lines[0]) == {"opal_store_backup": 2}
+    assert json.loads(lines[1]) == {
+        "policy_id": "authz",
+        "policy_code": "package authz",
+    }
+    assert len(lines) == 5
+
+    written.clear()
+    restored = OpaClient(url, cache_policy_data=True)
+    async with aiofiles.open(backup_path, "r") as f:
+        await restored.full_import(f)
+    assert written == [
+        ("PUT", "", {"x": 1}),
+        ("PUT", "/users", {"alice": ["admin"] * 10}),
+        (
+            "PATCH",
+            "/users",
+            [{"op": "add", "path": "/bob", "value": ["viewer"] * 10}],
+        ),
+    ]
+    assert restored._policy_data_cache.get_data() == data
+
+    # a backup of an older version is a single document
+    backup_path.write_text(
+        json.dumps({"policies": {"rbac": "package rbac"}, "data": data})
+    )
+    written.clear()
+    restored = OpaClient(url, cache_policy_data=True)
+    async with aiofiles.open(backup_path, "r") as f:
+        await restored.full_import(f)
+    assert written == [("PUT", "", data)]
+    assert policies["rbac"] == "package rbac"
+
+
+@pytest.mark.asyncio
+async def test_backup_snapshot_restores_raw_data_documents(
+    tmp_path, monkeypatch, serve_app
+):
+    """A backup converted to a snapshot is restored from its sections (as raw
+    JSON), each document after the ones above it."""
+    written = []
+    url = await serve_app(make_opa_stub(written, {}))
+    monkeypatch.setattr(opal_client_config, "STORE_BACKUP_CHUNK_SIZE", 64)
+
+    data = {
+        "users": {"alice": ["admin"] * 10, "bob": ["viewer"] * 10},
+        "groups": {"admins": ["alice"] * 10, "viewers": ["bob"] * 10},
+    }
+    backup_path = str(tmp_path / "opa.json")
+    snapshot_path = str(tmp_path / "opa.json.snapshot")
+    client = OpaClient(url, cache_policy_data=True)
+    await client.set_policy_data(data)
+    async with aiofiles.open(backup_path, "w") as f:
+        await client.full_export(f)
+    assert not await is_snapshot_of(snapshot_path, backup_path)
+    await convert_backup_to_snapshot(backup_path, snapshot_path)
+    assert await is_snapshot_of(snapshot_path, backup_path)
+
+    with StoreSnapshot(snapshot_path) as snapshot:
+        assert snapshot.paths == ["", "/users", "/groups"]
+        sections = snapshot.sections("/users")
+        assert [(section.path, section.merge) for section in sections] == [
+            ("/users", False),
+            ("/users", True),
+        ]
+        assert snapshot.read(sections[1]) == {"bob": ["viewer"] * 10}
+
+        written.clear()
+        restored = OpaClient(url, cache_policy_data=True)
+        await restored.import_snapshot(snapshot)
+    # documents (and merged keys) of the same depth are written concurrently
+    assert written[0] == ("PUT", "", {})
+    assert sorted(written[1:3]) == [
+        ("PUT", "/groups", {"admins": ["alice"] * 10}),
+        ("PUT", "/users", {"alice": ["admin"] * 10}),
+    ]
+    assert sorted(request[1] for request in written[3:]) == ["/groups", "/users"]
+    assert restored._policy_data_cache.get_data() == data
+
+    # corrupted sections are detected when they're read
+    with open(snapshot_path, "r+b") as f:
+        f.seek(8)  # the first section (of the root document)
+        f.write(b"#")
+    with StoreSnapshot(snapshot_path) as snapshot:
+        with pytest.raises(ValueError):
+            snapshot.read(snapshot.sections()[0])
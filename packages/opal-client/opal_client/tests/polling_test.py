@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from opal_client.data.polling import DataSourcePoller
+from opal_common.schemas.data import DataSourceEntryWithPollingInterval
+
+
+def make_entry(url: str, dst_path: str, interval: float):
+    return DataSourceEntryWithPollingInterval(
+        url=url, dst_path=dst_path, periodic_update_interval=interval
+    )
+
+
+@pytest.mark.asyncio
+async def test_entries_of_the_same_source_are_polled_together():
+    polls = []
+
+    async def poll(entries):
+        polls.append([entry.dst_path for entry in entries])
+
+    poller = DataSourcePoller(poll)
+    poller.set_entries(
+        [
+            make_entry("http://source/a", "/a1", 0.05),
+            make_entry("http://source/b", "/b", 0.05),
+            make_entry("http://source/a", "/a2", 0.05),
+            # a different interval is polled on its own
+            make_entry("http://source/a", "/a3", 10),
+        ]
+    )
+    schedule = poller.schedule
+    assert len(schedule) == 3
+    assert all(0 <= s.next_due_in <= s.periodic_update_interval for s in schedule)
+    assert sorted(s.dst_paths for s in schedule) == [["/a1", "/a2"], ["/a3"], ["/b"]]
+
+    await asyncio.sleep(0.3)
+    await poller.stop()
+    assert ["/a1", "/a2"] in polls and ["/b"] in polls
+    assert ["/a3"] not in polls
+    # every source is polled about once per interval
+    assert 3 <= polls.count(["/b"]) <= 7
+    assert poller.schedule == []
+
+
+@pytest.mark.asyncio
+async def test_set_entries_replaces_the_schedule():
+    polls = []
+
+    async def poll(entries):
+        polls.append(entries[0].url)
+
+    poller = DataSourcePoller(poll, jitter=0.5)
+    poller.set_entries([make_entry("http://old", "/", 0.02)])
+    await asyncio.sleep(0.1)
+    poller.set_entries([make_entry("http://new", "/", 0.02)])
+    polls.clear()
+    await asyncio.sleep(0.1)
+    await poller.stop()
+    assert polls and set(polls) == {"http://new"}
+
+
+@pytest.mark.asyncio
+async def test_polling_errors_dont_stop_polling():
+    polls = 0
+
+    async def poll(entries):
+        nonlocal polls
+        polls += 1
+        raise ValueError("upstream is down")
+
+    poller = DataSourcePoller(poll)
+    poller.set_entries([make_entry("http://source", "/", 0.02)])
+    await asyncio.sleep(0.15)
+    await poller.stop()
+    assert polls >= 3
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from opal_client.data.scheduler import DataUpdateScheduler, UpdatePriority
+
+
+@pytest.mark.asyncio
+async def test_updates_run_by_priority():
+    scheduler = DataUpdateScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    order = []
+
+    def update(name: str, wait: bool = False):
+        async def run():
+            if wait:
+                await release.wait()
+            order.append(name)
+
+        return run
+
+    # keeps the only slot busy while the rest are queued
+    await scheduler.schedule(update("running", wait=True))
+    await scheduler.schedule(update("periodic1"), UpdatePriority.periodic)
+    await scheduler.schedule(update("base"), UpdatePriority.base)
+    await scheduler.schedule(update("periodic2"), UpdatePriority.periodic)
+    await scheduler.schedule(update("incremental"), UpdatePriority.incremental)
+    assert scheduler.running == 1
+    assert scheduler.queue_depth == {"incremental": 1, "base": 1, "periodic": 2}
+
+    release.set()
+    await scheduler.shutdown()
+    assert order == ["running", "incremental", "base", "periodic1", "periodic2"]
+    assert scheduler.queue_depth == {"incremental": 0, "base": 0, "periodic": 0}
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure():
+    scheduler = DataUpdateScheduler(max_concurrency=1, max_queued=1)
+    release = asyncio.Event()
+
+    async def blocked_update():
+        await release.wait()
+
+    async def update():
+        pass
+
+    admitted = []
+
+    async def schedule(name: str, priority: UpdatePriority):
+        await scheduler.schedule(update, priority)
+        admitted.append(name)
+
+    await scheduler.schedule(blocked_update)
+    await scheduler.schedule(update)
+    periodic = asyncio.create_task(schedule("periodic", UpdatePriority.periodic))
+    await asyncio.sleep(0)
+    incremental = asyncio.create_task(
+        schedule("incremental", UpdatePriority.incremental)
+    )
+    await asyncio.sleep(0.01)
+    assert admitted == []
+
+    # room in the queue is given by priority
+    release.set()
+    await asyncio.gather(periodic, incremental)
+    assert admitted == ["incremental", "periodic"]
+    await scheduler.shutdown()
+    assert scheduler.running == 0
+
+
+@pytest.mark.asyncio
+async def test_shutdown_rejects_new_updates():
+    scheduler = DataUpdateScheduler()
+    done = []
+
+    async def update():
+        await asyncio.sleep(0.01)
+        done.append(True)
+
+    await scheduler.schedule(update)
+    await scheduler.shutdown()
+    assert done == [True]
+    with pytest.raises(RuntimeError):
+        await scheduler.schedule(update)
+
+    scheduler.restart()
+    await scheduler.schedule(update)
+    await scheduler.shutdown()
+    assert done == [True, True]
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+from opal_client.data.write_sequencer import DataWriteSequencer
+from opal_common.schemas.data import DataSourceEntry
+from opal_common.synchronization.hierarchical_lock import HierarchicalLock
+
+
+def put(dst_path: str) -> DataSourceEntry:
+    return DataSourceEntry(url="", data={"a": 1}, dst_path=dst_path)
+
+
+def patch(dst_path: str) -> DataSourceEntry:
+    return DataSourceEntry(
+        url="",
+        data=[{"op": "add", "path": "/a", "value": 1}],
+        dst_path=dst_path,
+        save_method="PATCH",
+    )
+
+
+@pytest.mark.asyncio
+async def test_writes_wait_for_earlier_conflicting_entries():
+    sequencer = DataWriteSequencer(HierarchicalLock())
+    first = sequencer.register(put("/users"))
+    sibling = sequencer.register(put("/users2"))
+    child = sequencer.register(patch("/users/alice"))
+    order = []
+
+    async def write(ticket, name):
+        async with sequencer.write_turn(ticket) as up_to_date:
+            assert up_to_date
+            order.append(name)
+        sequencer.done(ticket)
+
+    child_task = asyncio.create_task(write(child, "child"))
+    sibling_task = asyncio.create_task(write(sibling, "sibling"))
+    await asyncio.sleep(0.01)
+    # the sibling doesn't conflict with the first entry, but the child does
+    assert order == ["sibling"]
+
+    await write(first, "first")
+    await asyncio.gather(child_task, sibling_task)
+    assert order == ["sibling", "first", "child"]
+
+
+@pytest.mark.asyncio
+async def test_put_overwrites_earlier_entries_instead_of_waiting():
+    sequencer = DataWriteSequencer(HierarchicalLock())
+    slow_patch = sequencer.register(patch("/users/alice"))
+    slow_put = sequencer.register(put("/users"))
+    overwriting = sequencer.register(put("/users"))
+    later = sequencer.register(patch("/users"))
+
+    # written before the earlier entries to the same path (and below it)
+    async with sequencer.write_turn(overwriting) as up_to_date:
+        assert up_to_date
+        sequencer.written(overwriting)
+    sequencer.done(overwriting)
+
+    assert slow_patch.stale and slow_put.stale
+    assert not later.stale
+    for ticket in (slow_patch, slow_put):
+        async with sequencer.write_turn(ticket) as up_to_date:
+            assert not up_to_date
+        sequencer.done(ticket)
+
+
+@pytest.mark.asyncio
+async def test_root_put_waits_when_splitting_root_data(monkeypatch):
+    from opal_client.config import opal_client_config
+
+    monkeypatch.setattr(opal_client_config, "SPLIT_ROOT_DATA", True)
+    sequencer = DataWriteSequencer(HierarchicalLock())
+    earlier = sequencer.register(put("/users"))
+    root = sequencer.register(put("/"))
+
+    async def write_root():
+        async with sequencer.write_turn(root) as up_to_date:
+            sequencer.written(root)
+            return up_to_date
+
+    task = asyncio.create_task(write_root())
+    await asyncio.sleep(0.01)
+    assert not task.done()
+    sequencer.done(earlier)
+    assert await task
+    assert not earlier.stale
+
+
+@pytest.mark.asyncio
+async def test_entries_wait_for_a_later_overwriting_put():
+    sequencer = DataWriteSequencer(HierarchicalLock())
+    first = sequencer.register(put("/users/alice"))
+    second = sequencer.register(put("/users"))
+    last = sequencer.register(put("/users"))
+
+    async def write(ticket, succeeds=True):
+        async with sequencer.write_turn(ticket) as up_to_date:
+            if up_to_date and succeeds:
+                sequencer.written(ticket)
+        sequencer.done(ticket)
+        return up_to_date
+
+    earlier = asyncio.gather(write(first), write(second))
+    await asyncio.sleep(0.01)
+    # the earlier entries wait for the last one, instead of being written first
+    assert not earlier.done()
+    assert await write(last)
+    assert await earlier == [False, False]
+
+
+@pytest.mark.asyncio
+async def test_entries_are_written_if_the_overwriting_put_fails():
+    sequencer = DataWriteSequencer(HierarchicalLock())
+    first = sequencer.register(put("/users"))
+    failing = sequencer.register(put("/users"))
+    order = []
+
+    async def write(ticket, name, succeeds=True):
+        async with sequencer.write_turn(ticket) as up_to_date:
+            assert up_to_date
+            order.append(name)
+            if succeeds:
+                sequencer.written(ticket)
+        sequencer.done(ticket)
+
+    first_task = asyncio.create_task(write(first, "first"))
+    await asyncio.sleep(0.01)
+    assert not first_task.done()
+    await write(failing, "failing", succeeds=False)
+    await first_task
+    assert order == ["failing", "first"]
+    assert not first.stale
+
+
+@pytest.mark.asyncio
+async def test_entries_do_not_wait_for_a_put_behind_a_conflicting_entry():
+    sequencer = DataWriteSequencer(HierarchicalLock())
+    first = sequencer.register(put("/users"))
+    # isn't overwritten by the later PUT, and has to be written after the first
+    sequencer.register(patch("/"))
+    sequencer.register(put("/users"))
+
+    async with sequencer.write_turn(first) as up_to_date:
+        assert up_to_date
+    sequencer.done(first)
+
+
+@pytest.mark.asyncio
+async def test_merged_entries_are_stale_once_written():
+    sequencer = DataWriteSequencer(HierarchicalLock())
+    first = sequencer.register(patch("/users"))
+    merged = sequencer.register(patch("/users"))
+
+    async with sequencer.write_turn(first) as up_to_date:
+        assert up_to_date
+        sequencer.written(first, [merged])
+    sequencer.done(first)
+
+    assert merged.stale
+    async with sequencer.write_turn(merged) as up_to_date:
+        assert not up_to_date
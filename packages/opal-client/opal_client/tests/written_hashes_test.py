@@ -0,0 +1,52 @@
+from opal_client.data.written_hashes import WrittenDataHashes
+
+
+def test_written_hashes_set_and_get():
+    hashes = WrittenDataHashes()
+    assert hashes.get("/users") is None
+
+    hashes.set("/users", "a")
+    hashes.set("/roles/admins", "b")
+    assert hashes.get("/users") == "a"
+    assert hashes.get("users/") == "a"
+    assert hashes.get("/roles/admins") == "b"
+    assert hashes.get("/roles") is None
+    assert hashes.get("/users2") is None
+
+
+def test_written_hashes_forget_affected_paths():
+    hashes = WrittenDataHashes()
+    hashes.set("/a", "1")
+    hashes.set("/a/b/c", "2")
+    hashes.set("/a2", "3")
+
+    # writing to a path affects its ancestors and descendants, not its siblings
+    hashes.set("/a/b", "4")
+    assert hashes.get("/a") is None
+    assert hashes.get("/a/b/c") is None
+    assert hashes.get("/a/b") == "4"
+    assert hashes.get("/a2") == "3"
+
+    hashes.forget("/a/b/c")
+    assert hashes.get("/a/b") is None
+    assert hashes.get("/a2") == "3"
+
+    # writing to the root affects everything
+    hashes.set("/x", "5")
+    hashes.forget("/")
+    assert hashes.get("/x") is None
+    assert hashes.get("/a2") is None
+
+
+def test_written_hashes_keep_data():
+    hashes = WrittenDataHashes()
+    hashes.set("/a", "1", data={"x": 1})
+    hashes.set("/b", "2")
+    assert hashes.get_data("/a") == {"x": 1}
+    assert hashes.get_data("/b") is None
+    assert hashes.get_data("/c") is None
+
+    # the data of affected paths is forgotten with their hashes
+    hashes.set("/a/y", "3", data=[2])
+    assert hashes.get_data("/a") is None
+    assert hashes.get_data("/a/y") == [2]
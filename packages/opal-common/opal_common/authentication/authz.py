@@ -1,3 +1,5 @@
+from typing import Iterable
+
 from opal_common.authentication.deps import JWTAuthenticator
 from opal_common.authentication.types import JWTClaims
 from opal_common.authentication.verifier import Unauthorized
@@ -42,3 +44,17 @@ def restrict_optional_topics_to_publish(
             raise Unauthorized(
                 description=f"Invalid 'topics' to publish {unauthorized_topics}"
             )
+
+
+def require_permitted_topic(
+    authenticator: JWTAuthenticator, claims: JWTClaims, topics: Iterable[str]
+):
+    # a peer restricted to some topics may only get what's published to one of them
+    if not authenticator.enabled:
+        return
+
+    if "permitted_topics" not in claims:
+        return
+
+    if set(topics).isdisjoint(claims["permitted_topics"]):
+        raise Unauthorized(description="None of the 'topics' is permitted")
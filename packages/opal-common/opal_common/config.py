@@ -138,6 +138,71 @@ class OpalCommonConfig(Confi):
         10,
         description="Time in seconds to wait for queuing a new task (if the queue is full)",
     )
+    FETCHING_MAX_WORKER_COUNT = confi.int(
+        "FETCHING_MAX_WORKER_COUNT",
+        0,
+        description="If greater than FETCHING_WORKER_COUNT, worker tasks are added (up to this number) "
+        "when fetches back up in the queue (e.g. when all data sources are fetched on startup), based "
+        "on the depth of the queue and the observed fetch latency - and removed once idle for "
+        "FETCHING_WORKER_IDLE_TIMEOUT seconds (down to FETCHING_WORKER_COUNT)",
+    )
+    FETCHING_WORKER_IDLE_TIMEOUT = confi.float(
+        "FETCHING_WORKER_IDLE_TIMEOUT",
+        30,
+        description="Time in seconds a worker task added by autoscaling (see FETCHING_MAX_WORKER_COUNT) "
+        "stays idle before it's removed",
+    )
+    FETCHING_MAX_FETCHES_PER_ORIGIN = confi.int(
+        "FETCHING_MAX_FETCHES_PER_ORIGIN",
+        0,
+        description="Max number of concurrent fetches from the same origin (scheme, host and port), "
+        "0 for no limit",
+    )
+    FETCHING_SINGLE_FLIGHT = confi.bool(
+        "FETCHING_SINGLE_FLIGHT",
+        True,
+        description="If set, identical fetches (same fetcher, url and config) requested while one is "
+        "already in flight are not fetched again, but wait for the result of the fetch in flight",
+    )
+    FETCHING_RESULT_CACHE_TTL = confi.float(
+        "FETCHING_RESULT_CACHE_TTL",
+        0,
+        description="Time in seconds the result of a fetch is reused for identical fetches requested "
+        "right after it (requires FETCHING_SINGLE_FLIGHT), 0 to disable",
+    )
+    FETCHING_CIRCUIT_BREAKER = confi.bool(
+        "FETCHING_CIRCUIT_BREAKER",
+        False,
+        description="If set, fetches are guarded by a circuit breaker per origin (scheme, host and "
+        "port): after FETCHING_CIRCUIT_BREAKER_FAILURE_THRESHOLD consecutive failed attempts the "
+        "circuit opens and fetches from the origin fail fast, until a single probe fetch is let "
+        "through FETCHING_CIRCUIT_BREAKER_RESET_TIMEOUT seconds later. Retries of failed fetches "
+        "(all origins) are also limited by a shared retry budget (see FETCHING_RETRY_BUDGET_RATIO)",
+    )
+    FETCHING_CIRCUIT_BREAKER_FAILURE_THRESHOLD = confi.int(
+        "FETCHING_CIRCUIT_BREAKER_FAILURE_THRESHOLD",
+        5,
+        description="Number of consecutive failed fetch attempts from an origin that open its circuit "
+        "(attempts failing to connect, timing out or getting a 5xx response - but not a 4xx one)",
+    )
+    FETCHING_CIRCUIT_BREAKER_RESET_TIMEOUT = confi.float(
+        "FETCHING_CIRCUIT_BREAKER_RESET_TIMEOUT",
+        30,
+        description="Time in seconds an open circuit fails fetches fast, before letting a probe "
+        "fetch through (which closes the circuit if it succeeds, and reopens it otherwise)",
+    )
+    FETCHING_RETRY_BUDGET_RATIO = confi.float(
+        "FETCHING_RETRY_BUDGET_RATIO",
+        0.2,
+        description="If FETCHING_CIRCUIT_BREAKER is set, the retries of failed fetches are limited "
+        "to this fraction of the fetches (on top of FETCHING_RETRY_BUDGET_MIN_PER_SECOND)",
+    )
+    FETCHING_RETRY_BUDGET_MIN_PER_SECOND = confi.float(
+        "FETCHING_RETRY_BUDGET_MIN_PER_SECOND",
+        1,
+        description="If FETCHING_CIRCUIT_BREAKER is set, retries allowed per second regardless of "
+        "FETCHING_RETRY_BUDGET_RATIO (so fetches can be retried when there are few fetches)",
+    )
 
     GIT_SSH_KEY_FILE = confi.str(
         "GIT_SSH_KEY_FILE",
@@ -198,6 +263,13 @@ class OpalCommonConfig(Confi):
         description="List of extensions to serve as policy modules",
     )
 
+    JSON_SERIALIZER = confi.str(
+        "JSON_SERIALIZER",
+        "auto",
+        description="The JSON serializer used on hot paths (e.g. writing data to the policy store, backups): "
+        "orjson, json (the standard library) or auto - orjson if it is installed, json otherwise",
+    )
+
     ENABLE_METRICS = confi.bool(
         "ENABLE_METRICS", False, description="Enable metrics collection"
     )
@@ -220,6 +292,43 @@ class OpalCommonConfig(Confi):
         description="The timeout for the httpx or aiohttp fetcher provider, in seconds. "
         "if provided different value, 5 seconds will be used.",
     )
+    HTTP_FETCHER_STREAM_SPOOL_MAX_SIZE = confi.int(
+        "HTTP_FETCHER_STREAM_SPOOL_MAX_SIZE",
+        4 * 1024 * 1024,
+        description="When fetching data in streaming mode (see the 'streaming' option of HttpFetcherConfig), "
+        "the max size (in bytes) of fetched data kept in memory, larger data is spooled to a temporary file.",
+    )
+    HTTP_FETCHER_MAX_DECOMPRESSED_SIZE = confi.int(
+        "HTTP_FETCHER_MAX_DECOMPRESSED_SIZE",
+        1024 * 1024 * 1024,
+        description="The max size (in bytes) of a compressed data file once decompressed (see the 'compression' "
+        "option of HttpFetcherConfig), larger files fail to fetch (protecting from decompression bombs). "
+        "0 for unlimited.",
+    )
+    HTTP_FETCHER_POOL_CONNECTIONS = confi.bool(
+        "HTTP_FETCHER_POOL_CONNECTIONS",
+        True,
+        description="If set, the HTTP fetcher provider reuses (keep-alive) connections across fetches, "
+        "from a pool of connections per origin (scheme, host and port) kept by the fetching engine. "
+        "Otherwise, each fetch opens its own connection.",
+    )
+    HTTP_FETCHER_CONN_LIMIT_PER_HOST = confi.int(
+        "HTTP_FETCHER_CONN_LIMIT_PER_HOST",
+        10,
+        description="Max number of simultaneous pooled connections to a single origin "
+        "(see HTTP_FETCHER_POOL_CONNECTIONS), 0 for unlimited.",
+    )
+    HTTP_FETCHER_CONN_KEEPALIVE_TIMEOUT = confi.float(
+        "HTTP_FETCHER_CONN_KEEPALIVE_TIMEOUT",
+        15,
+        description="Time (seconds) an idle pooled connection to a data source is kept open for reuse.",
+    )
+    HTTP_FETCHER_HTTP2 = confi.bool(
+        "HTTP_FETCHER_HTTP2",
+        False,
+        description="If set (and HTTP_FETCHER_PROVIDER_CLIENT is httpx), pooled connections use HTTP/2 "
+        "when the data source supports it. Requires the 'h2' package (pip install httpx[http2]).",
+    )
 
 
 opal_common_config = OpalCommonConfig(prefix="OPAL_")
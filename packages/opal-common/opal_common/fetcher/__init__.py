@@ -1,3 +1,3 @@
 from opal_common.fetcher.engine.fetching_engine import FetchingEngine
-from opal_common.fetcher.events import FetcherConfig, FetchEvent
+from opal_common.fetcher.events import FetcherConfig, FetchEvent, FetchPriority
 from opal_common.fetcher.fetcher_register import FetcherRegister
@@ -0,0 +1,270 @@
+import asyncio
+import time
+from enum import Enum
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+import httpx
+from opal_common.fetcher.logger import get_logger
+from opal_common.http_utils import get_url_origin
+from opal_common.monitoring import metrics
+from pydantic import BaseModel, Field
+
+logger = get_logger("circuit_breaker")
+
+
+class CircuitState(str, Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised by fetches from an origin whose circuit is open (the fetch isn't
+    attempted)."""
+
+
+class CircuitBreakerState(BaseModel):
+    """The state of the circuit breaker of a fetched origin."""
+
+    origin: str = Field(
+        ..., description="Origin (scheme, host and port) of fetched urls"
+    )
+    state: CircuitState = Field(..., description="State of the circuit")
+    consecutive_failures: int = Field(
+        ..., description="Number of consecutive failed fetch attempts from the origin"
+    )
+    probe_in: Optional[float] = Field(
+        None,
+        description="Seconds until a probe fetch is let through (if the circuit is open)",
+    )
+
+
+class CircuitBreaker:
+    """Fails fetches from an origin fast while it's down.
+
+    - closed: fetches are attempted, failure_threshold consecutive failed
+      attempts (see is_origin_failure) open the circuit.
+    - open: fetches fail fast (CircuitOpenError), for reset_timeout seconds.
+    - half_open: a single probe fetch is attempted, its success closes the
+      circuit and its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self._failure_threshold = max(1, failure_threshold)
+        self._reset_timeout = reset_timeout
+        self.state = CircuitState.closed
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Returns whether a fetch attempt is allowed now (if it is, its
+        outcome must be recorded)."""
+        if self.state == CircuitState.closed:
+            return True
+        if self.state == CircuitState.open:
+            if time.monotonic() - self._opened_at < self._reset_timeout:
+                return False
+            self.state = CircuitState.half_open
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = CircuitState.closed
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.state == CircuitState.half_open or (
+            self.state == CircuitState.closed
+            and self.consecutive_failures >= self._failure_threshold
+        ):
+            self.state = CircuitState.open
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """Records an attempt that ended without an outcome (e.g. it was
+        cancelled)."""
+        self._probing = False
+
+    @property
+    def probe_in(self) -> Optional[float]:
+        if self.state != CircuitState.open:
+            return None
+        return max(0.0, self._opened_at + self._reset_timeout - time.monotonic())
+
+
+def _response_status(exc: Exception) -> Optional[int]:
+    """The HTTP status of the response a fetch failed on, if it got one."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    return None
+
+
+def is_origin_failure(exc: Exception) -> bool:
+    """Returns whether a fetch failed because of its origin: it couldn't be
+    reached (or timed out), or responded with a server error (5xx).
+
+    Client errors (4xx) are the fault of the fetch, not of the origin.
+    """
+    status = _response_status(exc)
+    if status is not None:
+        return status >= 500
+    return isinstance(
+        exc,
+        (aiohttp.ClientError, httpx.TransportError, asyncio.TimeoutError, OSError),
+    )
+
+
+class RetryBudget:
+    """Limits retries to a fraction of the fetches (shared by all origins), so
+    an outage doesn't multiply the load on the failing origins (and fill the
+    workers with retries).
+
+    A token bucket: each fetch deposits `ratio` tokens, each retry withdraws
+    one, and `min_per_second` tokens are added every second (up to
+    `capacity`).
+    """
+
+    def __init__(
+        self, ratio: float, min_per_second: float, capacity: Optional[float] = None
+    ):
+        self._ratio = max(0.0, ratio)
+        self._min_per_second = max(0.0, min_per_second)
+        self._capacity = (
+            capacity if capacity is not None else max(10.0, 10 * self._min_per_second)
+        )
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, tokens: float = 0.0):
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity,
+            self._tokens + (now - self._updated) * self._min_per_second + tokens,
+        )
+        self._updated = now
+
+    def deposit(self):
+        """Records a fetch."""
+        self._refill(self._ratio)
+
+    def withdraw(self) -> bool:
+        """Returns whether a retry is allowed (and if so, spends it)."""
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class FetchGuard:
+    """Guards the attempts of a single fetch (see
+    BaseFetchProvider.set_fetch_guard) with the circuit breaker of its origin
+    and the shared retry budget."""
+
+    def __init__(self, origin: str, breaker: CircuitBreaker, budget: RetryBudget):
+        self._origin = origin
+        self._breaker = breaker
+        self._budget = budget
+        self._attempted = False
+
+    async def attempt(self, fetch: Callable[[], Awaitable]):
+        """Attempts the fetch if the circuit allows it, and records its
+        outcome.
+
+        Raises:
+            CircuitOpenError: if the circuit of the origin is open.
+        """
+        if not self._breaker.allow():
+            metrics.increment("fetching_engine.circuit_rejected_fetches")
+            raise CircuitOpenError(
+                f"Circuit of '{self._origin}' is open, not fetching (probing in "
+                f"{self._breaker.probe_in or 0:.1f}s)"
+            )
+        if not self._attempted:
+            self._attempted = True
+            self._budget.deposit()
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            self._breaker.release()
+            raise
+        except Exception as exc:
+            if not is_origin_failure(exc):
+                if _response_status(exc) is not None:
+                    # the origin is up, it rejected the fetch
+                    self._breaker.record_success()
+                else:
+                    self._breaker.release()
+                raise
+            was_open = self._breaker.state == CircuitState.open
+            self._breaker.record_failure()
+            if not was_open and self._breaker.state == CircuitState.open:
+                logger.warning(
+                    f"Circuit of '{self._origin}' opened after "
+                    f"{self._breaker.consecutive_failures} consecutive failed fetches"
+                )
+                metrics.increment("fetching_engine.circuit_opened")
+            raise
+        if self._breaker.state != CircuitState.closed:
+            logger.info(f"Circuit of '{self._origin}' closed")
+        self._breaker.record_success()
+        return result
+
+    def allow_retry(self) -> bool:
+        """Returns whether the failed fetch may be retried (the circuit of its
+        origin is closed, and the retry budget isn't exhausted)."""
+        if self._breaker.state != CircuitState.closed:
+            return False
+        if not self._budget.withdraw():
+            metrics.increment("fetching_engine.retries_over_budget")
+            return False
+        return True
+
+
+class CircuitBreakers:
+    """The circuit breakers (by origin) and retry budget of a fetching
+    engine."""
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        retry_budget_ratio: float,
+        retry_budget_min_per_second: float,
+    ):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._budget = RetryBudget(retry_budget_ratio, retry_budget_min_per_second)
+
+    def guard(self, url: str) -> FetchGuard:
+        """Returns a guard for a fetch of the url."""
+        origin = get_url_origin(url)
+        breaker = self._breakers.get(origin)
+        if breaker is None:
+            breaker = self._breakers[origin] = CircuitBreaker(
+                self._failure_threshold, self._reset_timeout
+            )
+        return FetchGuard(origin, breaker, self._budget)
+
+    @property
+    def states(self) -> List[CircuitBreakerState]:
+        """The states of the circuits of the fetched origins."""
+        return [
+            CircuitBreakerState(
+                origin=origin,
+                state=breaker.state,
+                consecutive_failures=breaker.consecutive_failures,
+                probe_in=breaker.probe_in,
+            )
+            for origin, breaker in sorted(self._breakers.items())
+        ]
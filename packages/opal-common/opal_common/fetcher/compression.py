@@ -0,0 +1,241 @@
+"""Decompression of fetched data, chunk by chunk (so compressed data is never
+held in memory in whole, and is decompressed while it's being received)."""
+
+import re
+import zlib
+from enum import Enum
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Compression(str, Enum):
+    gzip = "gzip"
+    deflate = "deflate"
+    br = "br"
+    zstd = "zstd"
+    # detected by the extension of the url's path (see compression_from_url)
+    auto = "auto"
+
+
+# compression by the extension of a compressed file
+_EXTENSIONS = {
+    ".gz": Compression.gzip,
+    ".gzip": Compression.gzip,
+    ".br": Compression.br,
+    ".zst": Compression.zstd,
+    ".zstd": Compression.zstd,
+}
+
+
+class DecompressedSizeExceeded(ValueError):
+    """The decompressed data is larger than the decompressor's max_size."""
+
+
+class Decompressor:
+    """Decompresses data given chunk by chunk.
+
+    If max_size is given, raises DecompressedSizeExceeded once more than
+    max_size bytes were decompressed (e.g. a decompression bomb).
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self._max_size = max_size if max_size and max_size > 0 else None
+        self._size = 0
+
+    def _count(self, data: bytes) -> bytes:
+        self._size += len(data)
+        if self._max_size is not None and self._size > self._max_size:
+            raise DecompressedSizeExceeded(
+                f"Decompressed data exceeds {self._max_size} bytes"
+            )
+        return data
+
+    @property
+    def _remaining(self) -> int:
+        """Max number of bytes to decompress next (0 for unlimited), one more
+        than allowed - so an exceeding output is detected."""
+        if self._max_size is None:
+            return 0
+        return max(0, self._max_size - self._size) + 1
+
+    def decompress(self, chunk: bytes) -> bytes:
+        raise NotImplementedError()
+
+    def flush(self) -> bytes:
+        """Returns the rest of the decompressed data, once all chunks were
+        given.
+
+        Raises:
+            ValueError: if the compressed data is truncated.
+        """
+        raise NotImplementedError()
+
+
+class _ZlibDecompressor(Decompressor):
+    def __init__(self, wbits: int, max_size: Optional[int] = None):
+        super().__init__(max_size)
+        self._wbits = wbits
+        self._obj = zlib.decompressobj(wbits)
+        # deflate content is usually zlib wrapped, but some servers send raw
+        # deflate data - detected by its first bytes not being a zlib header
+        # (the input is kept until its header is checked, to decompress it again)
+        self._head: Optional[bytes] = b"" if wbits == zlib.MAX_WBITS else None
+
+    def _decompress(self, data: bytes) -> bytes:
+        # the output is bounded by max_size, so a decompression bomb is never
+        # held in memory (the rest of the input is left in unconsumed_tail)
+        return self._count(self._obj.decompress(data, self._remaining))
+
+    def decompress(self, chunk: bytes) -> bytes:
+        if self._head is not None:
+            self._head += chunk
+            try:
+                data = self._decompress(chunk)
+            except zlib.error:
+                self._wbits = -zlib.MAX_WBITS
+                self._obj = zlib.decompressobj(self._wbits)
+                chunk, self._head = self._head, None
+                return self.decompress(chunk)
+            # the zlib header is 2 bytes long
+            if len(self._head) >= 2:
+                self._head = None
+        else:
+            data = self._decompress(chunk)
+        # gzip files may consist of several concatenated members
+        while self._obj.eof and self._obj.unused_data:
+            rest = self._obj.unused_data
+            self._obj = zlib.decompressobj(self._wbits)
+            data += self._decompress(rest)
+        return data
+
+    def flush(self) -> bytes:
+        data = self._count(self._obj.flush())
+        if not self._obj.eof:
+            raise ValueError("Compressed data is truncated")
+        return data
+
+
+class _BrotliDecompressor(Decompressor):
+    def __init__(self, max_size: Optional[int] = None):
+        super().__init__(max_size)
+        self._obj = brotli.Decompressor()
+
+    def decompress(self, chunk: bytes) -> bytes:
+        return self._count(self._obj.process(chunk))
+
+    def flush(self) -> bytes:
+        if not self._obj.is_finished():
+            raise ValueError("Compressed data is truncated")
+        return b""
+
+
+class _ZstdDecompressor(Decompressor):
+    def __init__(self, max_size: Optional[int] = None):
+        super().__init__(max_size)
+        self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, chunk: bytes) -> bytes:
+        data = self._count(self._obj.decompress(chunk))
+        # zstd files may consist of several frames
+        while self._obj.eof and self._obj.unused_data:
+            rest = self._obj.unused_data
+            self._obj = zstandard.ZstdDecompressor().decompressobj()
+            data += self._count(self._obj.decompress(rest))
+        return data
+
+    def flush(self) -> bytes:
+        if not self._obj.eof:
+            raise ValueError("Compressed data is truncated")
+        return b""
+
+
+def supported_compressions() -> List[Compression]:
+    """The compressions that can be decompressed (br and zstd require the
+    brotli and zstandard packages)."""
+    compressions = [Compression.gzip, Compression.deflate]
+    if brotli is not None:
+        compressions.append(Compression.br)
+    if zstandard is not None:
+        compressions.append(Compression.zstd)
+    return compressions
+
+
+def get_decompressor(
+    compression: Compression, max_size: Optional[int] = None
+) -> Decompressor:
+    """Returns a decompressor of the given compression, which raises
+    DecompressedSizeExceeded once more than max_size bytes were decompressed.
+
+    Raises:
+        ValueError: if the compression isn't supported (see supported_compressions).
+    """
+    compression = Compression(compression)
+    if compression not in supported_compressions():
+        package = "brotli" if compression == Compression.br else "zstandard"
+        raise ValueError(
+            f"Decompressing {compression.value} requires the {package} package"
+        )
+    if compression == Compression.gzip:
+        return _ZlibDecompressor(16 + zlib.MAX_WBITS, max_size)
+    if compression == Compression.deflate:
+        # zlib wrapped deflate data (or raw deflate data, see _ZlibDecompressor)
+        return _ZlibDecompressor(zlib.MAX_WBITS, max_size)
+    if compression == Compression.br:
+        return _BrotliDecompressor(max_size)
+    if compression == Compression.zstd:
+        return _ZstdDecompressor(max_size)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def compression_from_url(url: str) -> Optional[Compression]:
+    """Returns the compression of a file by the extension of the url's path
+    (e.g. "https://example.com/export.json.gz" is gzip compressed), or None if
+    it isn't a known compressed file."""
+    path = urlsplit(url).path.lower()
+    for extension, compression in _EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+def http_accept_encoding(client: str) -> str:
+    """The Accept-Encoding header of requests made with the given HTTP client
+    (aiohttp or httpx) - the content encodings it decodes, which depends on
+    the installed packages."""
+    encodings = ["gzip", "deflate"]
+    try:
+        if client == "httpx":
+            # httpx decodes br and zstd with the same packages as get_decompressor
+            if brotli is not None:
+                encodings.append("br")
+            if zstandard is not None and _version(httpx.__version__) >= (0, 27, 1):
+                encodings.append("zstd")
+        else:
+            from aiohttp import compression_utils
+
+            if getattr(compression_utils, "HAS_BROTLI", False):
+                encodings.append("br")
+            if getattr(compression_utils, "HAS_ZSTD", False):
+                encodings.append("zstd")
+    except ImportError:
+        pass
+    return ", ".join(encodings)
+
+
+def _version(version: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in re.findall(r"\d+", version)[:3])
@@ -0,0 +1,86 @@
+import hashlib
+import json
+from tempfile import SpooledTemporaryFile
+from typing import Any, AsyncIterator, Optional
+
+from opal_common.async_utils import run_sync
+from opal_common.config import opal_common_config
+
+
+class SpooledDataStream:
+    """Raw (unparsed) fetched data, spooled in chunks to a temporary file.
+
+    Small payloads are kept in memory, larger ones roll over to disk (see
+    HTTP_FETCHER_STREAM_SPOOL_MAX_SIZE), so the data can be passed on (e.g. as
+    the body of a policy store request) without ever holding all of it - or a
+    parsed copy of it - in memory. The SHA-256 of the raw data is computed
+    while it is being written.
+
+    The stream can be read any number of times (e.g. when a request using it
+    is retried), and must be closed once it is no longer needed.
+    """
+
+    def __init__(self, max_memory_size: Optional[int] = None):
+        self._file = SpooledTemporaryFile(
+            max_size=(
+                max_memory_size
+                if max_memory_size is not None
+                else opal_common_config.HTTP_FETCHER_STREAM_SPOOL_MAX_SIZE
+            )
+        )
+        self._sha256 = hashlib.sha256()
+        self._size = 0
+
+    @property
+    def hash(self) -> str:
+        """The hexadecimal SHA-256 of the data written so far."""
+        return self._sha256.hexdigest()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    async def write(self, chunk: bytes):
+        self._file.seek(0, 2)
+        self._file.write(chunk)
+        self._sha256.update(chunk)
+        self._size += len(chunk)
+
+    async def iter_chunks(self, chunk_size: int = 2**16) -> AsyncIterator[bytes]:
+        """Yields the data from its beginning, chunk by chunk."""
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    async def read(self) -> bytes:
+        """Reads all of the data (in an executor, as it may have to be read
+        from disk)."""
+
+        def _read():
+            self._file.seek(0)
+            return self._file.read()
+
+        return await run_sync(_read)
+
+    async def read_json(self) -> Any:
+        """Parses the data as JSON (in an executor, so the event loop isn't
+        blocked by large documents)."""
+
+        def _load():
+            self._file.seek(0)
+            return json.load(self._file)
+
+        return await run_sync(_load)
+
+    def close(self):
+        self._file.close()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} size={self._size} hash={self.hash}>"
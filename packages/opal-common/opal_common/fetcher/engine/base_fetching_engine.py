@@ -1,8 +1,12 @@
-from typing import Coroutine
+from contextlib import asynccontextmanager
+from typing import Coroutine, Optional
 
+from opal_common.fetcher.circuit_breaker import CircuitBreakers
 from opal_common.fetcher.engine.core_callbacks import OnFetchFailureCallback
-from opal_common.fetcher.events import FetcherConfig, FetchEvent
+from opal_common.fetcher.engine.fetch_queue import QueuedFetch
+from opal_common.fetcher.events import FetcherConfig, FetchEvent, FetchPriority
 from opal_common.fetcher.fetcher_register import FetcherRegister
+from opal_common.fetcher.providers.http_session_pool import HttpSessionPool
 
 
 class BaseFetchingEngine:
@@ -14,6 +18,18 @@ class BaseFetchingEngine:
         """Access to the underlying fetcher providers register."""
         raise NotImplementedError()
 
+    @property
+    def http_session_pool(self) -> Optional[HttpSessionPool]:
+        """The HTTP sessions (by origin) shared by the engine's fetches, if
+        any."""
+        return None
+
+    @property
+    def circuit_breakers(self) -> Optional[CircuitBreakers]:
+        """The circuit breakers (by origin) guarding the engine's fetches, if
+        any."""
+        return None
+
     async def __aenter__(self):
         """Async Context manager to cancel tasks on exit."""
         raise NotImplementedError()
@@ -31,6 +47,7 @@ class BaseFetchingEngine:
         callback: Coroutine,
         config: FetcherConfig = None,
         fetcher="HttpFetchProvider",
+        priority: int = FetchPriority.normal,
     ) -> FetchEvent:
         """Simplified default fetching handler for queuing a fetch task.
 
@@ -39,13 +56,18 @@ class BaseFetchingEngine:
             callback (Coroutine): a callback to call with the fetched result
             config (FetcherConfig, optional): Configuration to be used by the fetcher. Defaults to None.
             fetcher (str, optional): Which fetcher class to use. Defaults to "HttpFetchProvider".
+            priority (int, optional): priority of the fetch (see FetchPriority). Defaults to normal.
         Returns:
             the queued event (which will be mutated to at least have an Id)
         """
         raise NotImplementedError()
 
     async def queue_fetch_event(
-        self, event: FetchEvent, callback: Coroutine
+        self,
+        event: FetchEvent,
+        callback: Coroutine,
+        priority: int = FetchPriority.normal,
+        deadline: Optional[float] = None,
     ) -> FetchEvent:
         """Basic handler to queue a fetch event for a fetcher class. Waits if
         the queue is full.
@@ -53,11 +75,22 @@ class BaseFetchingEngine:
         Args:
             event (FetchEvent): the fetch event to queue as a task
             callback (Coroutine): a callback to call with the fetched result
+            priority (int, optional): priority of the fetch (see FetchPriority). Defaults to normal.
+            deadline (float, optional): time (as time.monotonic()) the fetch must be started by.
         Returns:
             the queued event (which will be mutated to at least have an Id)
         """
         raise NotImplementedError()
 
+    def cancel_fetch(self, event: FetchEvent) -> bool:
+        """Cancels a queued fetch event, so it's dropped instead of being
+        started.
+
+        Returns:
+            True if the event was still queued, False otherwise.
+        """
+        raise NotImplementedError()
+
     def register_failure_handler(self, callback: OnFetchFailureCallback):
         """Register a callback to be called with exception and original event
         in case of failure.
@@ -75,3 +108,33 @@ class BaseFetchingEngine:
             event (FetchEvent): event which was being handled
         """
         raise NotImplementedError()
+
+    def _on_dequeued(self, queued: QueuedFetch):
+        """Called by a worker when it takes a fetch out of the queue."""
+        pass
+
+    @property
+    def worker_idle_timeout(self) -> Optional[float]:
+        """Time in seconds after which an idle worker may retire (see
+        _retire_worker), None if workers never retire."""
+        return None
+
+    def _retire_worker(self, task) -> bool:
+        """Called by a worker that's been idle for worker_idle_timeout, returns
+        whether it should exit."""
+        return False
+
+    def _set_worker_idle(self, task, idle: bool):
+        """Called by a worker when it starts (and stops) waiting for a
+        fetch."""
+        pass
+
+    def _take_origin_slot(self, item: tuple) -> bool:
+        """Called by a worker before it fetches the queue item's event, returns
+        whether to fetch it now (or leave it to the engine to queue again)."""
+        return True
+
+    @asynccontextmanager
+    async def _fetch_slot(self, queued: QueuedFetch):
+        """Held by a worker while it fetches an event."""
+        yield
@@ -0,0 +1,33 @@
+import time
+from typing import Coroutine, Optional
+
+from opal_common.fetcher.events import FetchEvent
+
+
+class QueuedFetch:
+    """A fetch event waiting in the engine's queue (with its callback).
+
+    The fetch is dropped (not started) by the worker taking it, if it
+    was cancelled or its deadline passed while it waited.
+    """
+
+    __slots__ = ("event", "callback", "priority", "deadline", "cancelled", "queued_at")
+
+    def __init__(
+        self,
+        event: FetchEvent,
+        callback: Coroutine,
+        priority: int,
+        deadline: Optional[float] = None,
+    ):
+        self.event = event
+        self.callback = callback
+        self.priority = priority
+        # time.monotonic() after which the fetch is no longer wanted
+        self.deadline = deadline
+        self.cancelled = False
+        self.queued_at = time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
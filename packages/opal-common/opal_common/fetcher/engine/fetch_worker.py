@@ -2,9 +2,12 @@ import asyncio
 from typing import Coroutine
 
 from opal_common.fetcher.engine.base_fetching_engine import BaseFetchingEngine
+from opal_common.fetcher.engine.fetch_queue import QueuedFetch
 from opal_common.fetcher.events import FetchEvent
 from opal_common.fetcher.fetcher_register import FetcherRegister
 from opal_common.fetcher.logger import get_logger
+from opal_common.fetcher.providers.http_fetch_provider import HttpFetchProvider
+from opal_common.monitoring import metrics
 
 logger = get_logger("fetch_worker")
 
@@ -13,23 +16,59 @@ async def fetch_worker(queue: asyncio.Queue, engine):
     """The worker task performing items added to the Engine's Queue.
 
     Args:
-        queue (asyncio.Queue): The Queue
+        queue (asyncio.PriorityQueue): The Queue (of (priority, seq, QueuedFetch))
         engine (BaseFetchingEngine): The engine itself
     """
     engine: BaseFetchingEngine
     register: FetcherRegister = engine.register
+    task = asyncio.current_task()
     while True:
         # types
+        queued: QueuedFetch
         event: FetchEvent
         callback: Coroutine
-        # get a event from the queue
-        event, callback = await queue.get()
+        # get the next event from the queue (by priority)
+        engine._set_worker_idle(task, True)
+        try:
+            item = await asyncio.wait_for(queue.get(), engine.worker_idle_timeout)
+        except asyncio.TimeoutError:
+            # idle for a while, retire if the engine has more workers than needed
+            if engine._retire_worker(task):
+                return
+            continue
+        finally:
+            engine._set_worker_idle(task, False)
+        queued = item[2]
+        event, callback = queued.event, queued.callback
         # take care of it
         try:
+            engine._on_dequeued(queued)
+            if queued.cancelled:
+                # no one is waiting for the fetch anymore
+                metrics.increment("fetching_engine.cancelled_fetches")
+                continue
+            if queued.expired:
+                metrics.increment("fetching_engine.expired_fetches")
+                await engine._on_failure(
+                    asyncio.TimeoutError(
+                        f"Fetch of {event.url} expired before it was started"
+                    ),
+                    event,
+                )
+                continue
             # get fetcher for the event
             fetcher = register.get_fetcher_for_event(event)
+            if isinstance(fetcher, HttpFetchProvider):
+                # reuse the engine's keep-alive connections to the fetched origin
+                fetcher.set_session_pool(engine.http_session_pool)
+            if engine.circuit_breakers is not None:
+                # fail fast while the origin is down, and limit retries
+                fetcher.set_fetch_guard(engine.circuit_breakers.guard(event.url))
+            if not engine._take_origin_slot(item):
+                # the origin is at its limit, the fetch is queued again later
+                continue
             # fetch
-            async with fetcher:
+            async with engine._fetch_slot(queued), fetcher:
                 res = await fetcher.fetch()
                 data = await fetcher.process(res)
             # callback to event owner
@@ -1,28 +1,73 @@
 import asyncio
+import collections
+import itertools
+import json
+import math
+import time
 import uuid
-from typing import Coroutine, Dict, List, Union
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Coroutine, Deque, Dict, List, Optional, Set, Tuple, Union
 
+from opal_common.fetcher.circuit_breaker import CircuitBreakers
 from opal_common.fetcher.engine.base_fetching_engine import BaseFetchingEngine
 from opal_common.fetcher.engine.core_callbacks import OnFetchFailureCallback
+from opal_common.fetcher.engine.fetch_queue import QueuedFetch
 from opal_common.fetcher.engine.fetch_worker import fetch_worker
-from opal_common.fetcher.events import FetcherConfig, FetchEvent
+from opal_common.fetcher.events import FetcherConfig, FetchEvent, FetchPriority
 from opal_common.fetcher.fetch_provider import BaseFetchProvider
 from opal_common.fetcher.fetcher_register import FetcherRegister
 from opal_common.fetcher.logger import get_logger
+from opal_common.fetcher.providers.http_session_pool import HttpSessionPool
+from opal_common.http_utils import get_url_origin
+from opal_common.monitoring import metrics
+from pydantic import BaseModel, Field
 
 logger = get_logger("engine")
 
 
+class FetchingEngineStats(BaseModel):
+    """Utilization of the workers of a fetching engine."""
+
+    workers: int = Field(..., description="Number of worker tasks")
+    min_workers: int = Field(..., description="Minimal number of worker tasks")
+    max_workers: int = Field(..., description="Maximal number of worker tasks")
+    busy_workers: int = Field(..., description="Number of fetches in flight")
+    utilization: float = Field(..., description="Fraction of the workers busy fetching")
+    queued: int = Field(..., description="Number of fetches waiting in the queue")
+    avg_queue_wait: Optional[float] = Field(
+        None,
+        description="Moving average of the time (in seconds) fetches waited in the queue",
+    )
+    avg_fetch_latency: Optional[float] = Field(
+        None, description="Moving average of the time (in seconds) fetches took"
+    )
+
+
+def _moving_average(average: Optional[float], value: float, alpha: float = 0.2):
+    return value if average is None else average + alpha * (value - average)
+
+
 class FetchingEngine(BaseFetchingEngine):
     """A Task queue manager for fetching events.
 
     - Configure with different fetcher providers - via __init__'s register_config or via self.register.register_fetcher()
     - Use queue_url() to fetch a given URL with the default FetchProvider
     - Use queue_fetch_event() to fetch data using a configured FetchProvider
+    - Queued events are started by priority, and dropped if cancelled (see cancel_fetch)
+      or if their deadline passed before a worker got to them
     - Use with 'async with' to terminate tasks (or call self.terminate_tasks() when done)
+    - Identical fetches awaited with handle_url() while one is in flight share its result
+      (single flight), and optionally reuse the result of a fetch done just before
+    - Optionally guard fetches with circuit breakers (by origin) and a shared retry budget
+    - Optionally autoscale the workers (between worker_count and max_worker_count) by the
+      depth of the queue and the observed fetch latency, and cap the fetches per origin
     """
 
     DEFAULT_WORKER_COUNT = 6
+    DEFAULT_WORKER_IDLE_TIMEOUT = 30
+    # when autoscaling, workers are added to drain the queued fetches within this time (in seconds)
+    AUTOSCALE_DRAIN_TIME = 1.0
     DEFAULT_CALLBACK_TIMEOUT = 10
     DEFAULT_ENQUEUE_TIMEOUT = 10
 
@@ -37,26 +82,66 @@ class FetchingEngine(BaseFetchingEngine):
         callback_timeout: int = DEFAULT_CALLBACK_TIMEOUT,
         enqueue_timeout: int = DEFAULT_ENQUEUE_TIMEOUT,
         retry_config=None,
+        single_flight: bool = True,
+        result_cache_ttl: float = 0,
+        circuit_breakers: Optional[CircuitBreakers] = None,
+        max_worker_count: Optional[int] = None,
+        worker_idle_timeout: float = DEFAULT_WORKER_IDLE_TIMEOUT,
+        max_fetches_per_origin: int = 0,
     ) -> None:
-        # The internal task queue (created at start_workers)
-        self._queue: asyncio.Queue = None
+        # The internal task queue (created at start_workers), of (priority, seq, QueuedFetch)
+        self._queue: asyncio.PriorityQueue = None
+        self._queue_seq = itertools.count()
+        # fetches waiting in the queue, by event id
+        self._queued: Dict[str, QueuedFetch] = {}
         # Worker working the queue
         self._tasks: List[asyncio.Task] = []
         # register of the fetch providers workers can use
         self._fetcher_register = FetcherRegister(register_config)
         # core event callback registers
         self._failure_handlers: List[OnFetchFailureCallback] = []
-        # how many workers to run
+        # how many workers to run (at least, and at most if autoscaling)
         self._worker_count: int = worker_count
+        self._max_worker_count: int = max(worker_count, max_worker_count or 0)
+        # time in seconds a worker added by autoscaling stays idle before it retires
+        self._worker_idle_timeout = worker_idle_timeout
+        # workers waiting for a fetch, and the most workers busy at once since
+        # the current scale down window started (see _scale_down)
+        self._idle_workers: Set[asyncio.Task] = set()
+        self._peak_busy_workers = 0
+        self._scale_down_window_start = time.monotonic()
+        # number of workers fetching, and moving averages of queue wait and fetch time
+        self._busy_workers = 0
+        self._avg_queue_wait: Optional[float] = None
+        self._avg_fetch_latency: Optional[float] = None
+        # max concurrent fetches per origin (0 for no limit), the number of fetches in
+        # flight from each origin, and the queue items of the fetches waiting for a slot
+        # of each origin (queued again once one is free, see _take_origin_slot)
+        self._max_fetches_per_origin = max_fetches_per_origin
+        self._origin_fetches: Dict[str, int] = {}
+        self._origin_waiters: Dict[str, Deque[tuple]] = {}
         # time in seconds before timeout on a fetch callback
         self._callback_timeout = callback_timeout
         # time in seconds before time out on adding a task to queue (when full)
         self._enqueue_timeout = enqueue_timeout
         self._retry_config = retry_config
+        # whether handle_url() collapses identical fetches in flight
+        self._single_flight = single_flight
+        # time in seconds the result of handle_url() is reused for identical fetches
+        self._result_cache_ttl = result_cache_ttl
+        # fetches in flight (and results of fetches done recently), by fetch key
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._recent_results: Dict[str, Tuple[float, Any]] = {}
+        # keep-alive HTTP sessions (by origin) shared by the fetches of the workers
+        self._http_session_pool = HttpSessionPool()
+        # circuit breakers (by origin) and retry budget guarding the fetches, if any
+        self._circuit_breakers = circuit_breakers
+        # results of fetches awaited with handle_url(), by (the id of) their event
+        self._url_waiters: Dict[int, asyncio.Future] = {}
 
     def start_workers(self):
         if self._queue is None:
-            self._queue = asyncio.Queue()
+            self._queue = asyncio.PriorityQueue()
             # create worker tasks
             for _ in range(self._worker_count):
                 self.create_worker()
@@ -65,6 +150,36 @@ class FetchingEngine(BaseFetchingEngine):
     def register(self) -> FetcherRegister:
         return self._fetcher_register
 
+    @property
+    def http_session_pool(self) -> Optional[HttpSessionPool]:
+        return self._http_session_pool
+
+    @property
+    def circuit_breakers(self) -> Optional[CircuitBreakers]:
+        return self._circuit_breakers
+
+    @property
+    def autoscaling(self) -> bool:
+        return self._max_worker_count > self._worker_count
+
+    @property
+    def worker_idle_timeout(self) -> Optional[float]:
+        return self._worker_idle_timeout if self.autoscaling else None
+
+    @property
+    def stats(self) -> FetchingEngineStats:
+        workers = len(self._tasks)
+        return FetchingEngineStats(
+            workers=workers,
+            min_workers=self._worker_count,
+            max_workers=self._max_worker_count,
+            busy_workers=self._busy_workers,
+            utilization=self._busy_workers / workers if workers else 0.0,
+            queued=self._queue.qsize() if self._queue is not None else 0,
+            avg_queue_wait=self._avg_queue_wait,
+            avg_fetch_latency=self._avg_fetch_latency,
+        )
+
     async def __aenter__(self):
         """Async Context manager to cancel tasks on exit."""
         self.start_workers()
@@ -85,40 +200,130 @@ class FetchingEngine(BaseFetchingEngine):
             task.cancel()
         # Wait until all worker tasks are cancelled.
         await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # close the pooled connections
+        await self._http_session_pool.close()
         # reset queue
         self._queue = None
+        self._queued.clear()
+        self._busy_workers = 0
+        self._idle_workers.clear()
+        self._origin_fetches.clear()
+        self._origin_waiters.clear()
+        self._in_flight.clear()
+        self._recent_results.clear()
 
-    async def handle_url(self, url: str, timeout: float = None, **kwargs):
-        """
-        Same as self.queue_url but instead of using a callback, you can wait on this coroutine for the result as a return value
+    async def handle_url(
+        self,
+        url: str,
+        timeout: float = None,
+        priority: int = FetchPriority.normal,
+        **kwargs,
+    ):
+        """Same as self.queue_url but instead of using a callback, you can wait
+        on this coroutine for the result as a return value (the fetch is
+        dropped if it wasn't started by the time the wait times out)
+
+        If single flight is enabled, and an identical fetch (same fetcher, url and config) is already in flight,
+        waits for its result instead of fetching again (the result is then shared, and shouldn't be mutated).
         Args:
             url (str):
             timeout (float, optional): time in seconds to wait on the queued fetch task. Defaults to self._callback_timeout.
+            priority (int, optional): priority of the fetch (see FetchPriority). Defaults to normal.
             kwargs: additional args passed to self.queue_url
 
         Raises:
             asyncio.TimeoutError: if the given timeout has expired
+            Exception: the error the fetch failed with (e.g. CircuitOpenError)
             also - @see self.queue_fetch_event
         """
+        key = self._single_flight_key(url, **kwargs) if self._single_flight else None
+        if key is None:
+            return await self._handle_url(url, timeout, priority, **kwargs)
+
+        recent = self._recent_results.get(key)
+        if recent is not None:
+            expires_at, result = recent
+            if time.monotonic() < expires_at:
+                metrics.increment("fetching_engine.cached_fetches")
+                return result
+            del self._recent_results[key]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            in_flight = asyncio.create_task(
+                self._handle_url(url, timeout, priority, **kwargs)
+            )
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(partial(self._on_fetch_done, key))
+        else:
+            logger.debug(f"Joining the fetch of {url} already in flight")
+            metrics.increment("fetching_engine.collapsed_fetches")
+        # the fetch is shared, don't cancel it if one of its waiters is cancelled
+        return await asyncio.shield(in_flight)
+
+    def _single_flight_key(
+        self,
+        url: str,
+        config: Union[FetcherConfig, dict, None] = None,
+        fetcher: str = "HttpFetchProvider",
+    ) -> Optional[str]:
+        """Returns the key identifying identical fetches, or None if the fetch
+        shouldn't be shared (its result is a stream, or a raw response, that
+        can only be consumed once)."""
+        if isinstance(config, FetcherConfig):
+            config = config.dict(exclude_none=True)
+        config = {k: v for k, v in (config or {}).items() if v is not None}
+        if config.get("streaming") or config.get("process_data") is False:
+            return None
+        fetcher = config.get("fetcher") or fetcher
+        fetcher_class = self._fetcher_register.get_fetcher_class(fetcher)
+        if fetcher_class is not None and not fetcher_class.SHAREABLE_RESULTS:
+            return None
+        return json.dumps([fetcher, url, config], sort_keys=True, default=str)
+
+    def _on_fetch_done(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self._result_cache_ttl > 0:
+            now = time.monotonic()
+            # drop expired results, so the cache doesn't grow unbounded
+            self._recent_results = {
+                k: v for k, v in self._recent_results.items() if v[0] > now
+            }
+            self._recent_results[key] = (now + self._result_cache_ttl, task.result())
+
+    async def _handle_url(
+        self,
+        url: str,
+        timeout: float = None,
+        priority: int = FetchPriority.normal,
+        **kwargs,
+    ):
+        """Fetches the url (see handle_url), without sharing the fetch."""
         timeout = self._callback_timeout if timeout is None else timeout
-        wait_event = asyncio.Event()
-        data = {"result": None}
-        # Callback to wait and retrieve data
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        # resolved by the callback, or failed by self._on_failure
+        result = asyncio.get_running_loop().create_future()
 
         async def waiter_callback(answer):
-            data["result"] = answer
-            # Signal callback is done
-            wait_event.set()
-
-        await self.queue_url(url, waiter_callback, **kwargs)
-        # Wait with timeout
-        if timeout is not None:
-            await asyncio.wait_for(wait_event.wait(), timeout)
-        # wait forever
-        else:
-            await wait_event.wait()
-        # return saved result value from callback
-        return data["result"]
+            if not result.done():
+                result.set_result(answer)
+
+        event = self._url_event(url, **kwargs)
+        self._url_waiters[id(event)] = result
+        try:
+            await self.queue_fetch_event(
+                event, waiter_callback, priority=priority, deadline=deadline
+            )
+            # Wait with timeout (or forever)
+            return await asyncio.wait_for(result, timeout)
+        finally:
+            self._url_waiters.pop(id(event), None)
+            # no one waits for the fetch anymore, don't start it if it's still queued
+            self.cancel_fetch(event)
 
     async def queue_url(
         self,
@@ -126,6 +331,7 @@ class FetchingEngine(BaseFetchingEngine):
         callback: Coroutine,
         config: Union[FetcherConfig, dict, None] = None,
         fetcher="HttpFetchProvider",
+        priority: int = FetchPriority.normal,
     ) -> FetchEvent:
         """Simplified default fetching handler for queuing a fetch task.
 
@@ -134,12 +340,22 @@ class FetchingEngine(BaseFetchingEngine):
             callback (Coroutine): a callback to call with the fetched result
             config (FetcherConfig, optional): Configuration to be used by the fetcher. Defaults to None.
             fetcher (str, optional): Which fetcher class to use. Defaults to "HttpFetchProvider".
+            priority (int, optional): priority of the fetch (see FetchPriority). Defaults to normal.
         Returns:
             the queued event (which will be mutated to at least have an Id)
 
         Raises:
             @see self.queue_fetch_event
         """
+        event = self._url_event(url, config, fetcher)
+        return await self.queue_fetch_event(event, callback, priority=priority)
+
+    def _url_event(
+        self,
+        url: str,
+        config: Union[FetcherConfig, dict, None] = None,
+        fetcher="HttpFetchProvider",
+    ) -> FetchEvent:
         # override default fetcher with (potential) override value from FetcherConfig
         if isinstance(config, dict) and config.get("fetcher", None) is not None:
             fetcher = config["fetcher"]
@@ -147,13 +363,17 @@ class FetchingEngine(BaseFetchingEngine):
             fetcher = config.fetcher
 
         # init a URL event
-        event = FetchEvent(
+        return FetchEvent(
             url=url, fetcher=fetcher, config=config, retry=self._retry_config
         )
-        return await self.queue_fetch_event(event, callback)
 
     async def queue_fetch_event(
-        self, event: FetchEvent, callback: Coroutine, enqueue_timeout=None
+        self,
+        event: FetchEvent,
+        callback: Coroutine,
+        enqueue_timeout=None,
+        priority: int = FetchPriority.normal,
+        deadline: Optional[float] = None,
     ) -> FetchEvent:
         """Basic handler to queue a fetch event for a fetcher class. Waits if
         the queue is full until enqueue_timeout seconds; if enqueue_timeout is
@@ -163,6 +383,10 @@ class FetchingEngine(BaseFetchingEngine):
             event (FetchEvent): the fetch event to queue as a task
             callback (Coroutine): a callback to call with the fetched result
             enqueue_timeout (float): timeout in seconds or None for no timeout, Defaults to self.DEFAULT_ENQUEUE_TIMEOUT
+            priority (int, optional): priority of the fetch (see FetchPriority), events with a
+                higher priority (lower value) are started first. Defaults to normal.
+            deadline (float, optional): time (as time.monotonic()) the fetch must be started by, it's
+                dropped (and reported as failed with asyncio.TimeoutError) otherwise. Defaults to None (no deadline).
 
         Returns:
             the queued event (which will be mutated to at least have an Id)
@@ -176,15 +400,41 @@ class FetchingEngine(BaseFetchingEngine):
         )
         # Assign a unique identifier for the event
         event.id = self.gen_uid()
+        queued = QueuedFetch(event, callback, priority=priority, deadline=deadline)
+        # the sequence number keeps events of the same priority in FIFO order
+        item = (priority, next(self._queue_seq), queued)
+        self._queued[event.id] = queued
         # add to the queue for handling
-        # if no timeout we return immediately or raise QueueFull
-        if enqueue_timeout is None:
-            await self._queue.put_nowait((event, callback))
-        # if timeout
-        else:
-            await asyncio.wait_for(self._queue.put((event, callback)), enqueue_timeout)
+        try:
+            # if no timeout we return immediately or raise QueueFull
+            if enqueue_timeout is None:
+                self._queue.put_nowait(item)
+            # if timeout
+            else:
+                await asyncio.wait_for(self._queue.put(item), enqueue_timeout)
+        except BaseException:
+            self._queued.pop(event.id, None)
+            raise
+        self._autoscale()
         return event
 
+    def cancel_fetch(self, event: FetchEvent) -> bool:
+        """Cancels a queued fetch event, so it's dropped instead of being
+        started (fetches already started aren't affected).
+
+        Returns:
+            True if the event was still queued, False otherwise.
+        """
+        queued = self._queued.pop(event.id, None) if event.id else None
+        if queued is None:
+            return False
+        queued.cancelled = True
+        return True
+
+    def _on_dequeued(self, queued: QueuedFetch):
+        """Called by a worker when it takes a fetch out of the queue."""
+        self._queued.pop(queued.event.id, None)
+
     def create_worker(self) -> asyncio.Task:
         """Create an asyncio worker to work the engine's queue Engine init
         starts several workers according to given configuration."""
@@ -192,6 +442,153 @@ class FetchingEngine(BaseFetchingEngine):
         self._tasks.append(task)
         return task
 
+    def _autoscale(self):
+        """Adds workers (up to max_worker_count) if the idle workers can't
+        drain the queued fetches within AUTOSCALE_DRAIN_TIME (judging by the
+        observed fetch latency)."""
+        if not self.autoscaling or self._queue is None:
+            return
+        backlog = self._queue.qsize() - (len(self._tasks) - self._busy_workers)
+        if backlog <= 0:
+            return
+        if self._avg_fetch_latency is not None:
+            # fast fetches are drained by fewer workers
+            backlog = math.ceil(
+                backlog
+                * min(self._avg_fetch_latency, self.AUTOSCALE_DRAIN_TIME)
+                / self.AUTOSCALE_DRAIN_TIME
+            )
+        added = min(backlog, self._max_worker_count - len(self._tasks))
+        for _ in range(added):
+            self.create_worker()
+        if added > 0:
+            logger.debug(f"Added {added} fetch workers (now {len(self._tasks)})")
+            metrics.gauge("fetching_engine.workers", len(self._tasks))
+
+    def _scale_down(self):
+        """Retires idle workers added by autoscaling, down to the most workers
+        that were busy at once within the last worker_idle_timeout (and at
+        least worker_count).
+
+        Idle workers retire on their own once idle for worker_idle_timeout
+        - but a trickle of fetches wakes the waiting workers in turn, so
+        none of them is idle for long.
+        """
+        if not self.autoscaling:
+            return
+        now = time.monotonic()
+        if now - self._scale_down_window_start < self._worker_idle_timeout:
+            return
+        needed = max(self._worker_count, self._peak_busy_workers)
+        self._peak_busy_workers = self._busy_workers
+        self._scale_down_window_start = now
+        excess = len(self._tasks) - needed
+        retired = list(self._idle_workers)[: max(0, excess)]
+        for task in retired:
+            self._idle_workers.discard(task)
+            self._tasks.remove(task)
+            task.cancel()
+        if retired:
+            logger.debug(
+                f"Retired {len(retired)} fetch workers (now {len(self._tasks)})"
+            )
+            metrics.gauge("fetching_engine.workers", len(self._tasks))
+
+    def _set_worker_idle(self, task: asyncio.Task, idle: bool):
+        """Called by a worker when it starts (and stops) waiting for a
+        fetch."""
+        if idle:
+            self._idle_workers.add(task)
+        else:
+            self._idle_workers.discard(task)
+
+    def _retire_worker(self, task: asyncio.Task) -> bool:
+        """Called by a worker that's been idle for worker_idle_timeout, returns
+        whether it should exit (the engine has more than worker_count
+        workers)."""
+        if len(self._tasks) <= self._worker_count or task not in self._tasks:
+            return False
+        self._tasks.remove(task)
+        metrics.gauge("fetching_engine.workers", len(self._tasks))
+        return True
+
+    def _take_origin_slot(self, item: tuple) -> bool:
+        """Called by a worker before it fetches the queue item's event, takes a
+        slot of the fetched origin (if limited, see max_fetches_per_origin).
+
+        If the origin has no free slot, the fetch waits for one outside
+        the queue (and is queued again once a fetch from the origin is
+        done), instead of holding the worker - which goes on to the
+        fetches of other origins.
+
+        Returns:
+            True if the slot was taken (and must be released by the fetch,
+            see _fetch_slot), False if the fetch waits for one.
+        """
+        if self._max_fetches_per_origin <= 0:
+            return True
+        queued: QueuedFetch = item[2]
+        origin = get_url_origin(queued.event.url)
+        in_flight = self._origin_fetches.get(origin, 0)
+        if in_flight >= self._max_fetches_per_origin:
+            self._origin_waiters.setdefault(origin, collections.deque()).append(item)
+            # the fetch can still be cancelled while it waits
+            self._queued[queued.event.id] = queued
+            metrics.increment("fetching_engine.origin_limited_fetches")
+            return False
+        self._origin_fetches[origin] = in_flight + 1
+        return True
+
+    def _release_origin_slot(self, queued: QueuedFetch):
+        if self._max_fetches_per_origin <= 0:
+            return
+        origin = get_url_origin(queued.event.url)
+        waiters = self._origin_waiters.get(origin)
+        if waiters:
+            # keeps its priority (and place among the fetches of the same priority)
+            item = waiters.popleft()
+            if self._queue is not None:
+                self._queue.put_nowait(item)
+            if not waiters:
+                del self._origin_waiters[origin]
+        in_flight = self._origin_fetches.pop(origin, 1) - 1
+        # origins with no fetches in flight are forgotten, so they don't pile up
+        if in_flight > 0:
+            self._origin_fetches[origin] = in_flight
+
+    @asynccontextmanager
+    async def _fetch_slot(self, queued: QueuedFetch):
+        """Held by a worker while it fetches an event (after taking a slot of
+        the fetched origin, see _take_origin_slot) - records the utilization
+        of the workers, the time the event waited in the queue and the fetch
+        latency."""
+        tags = {"source": metrics.source_tag(queued.event.url)}
+        queue_wait = time.monotonic() - queued.queued_at
+        self._avg_queue_wait = _moving_average(self._avg_queue_wait, queue_wait)
+        metrics.histogram("fetching_engine.queue_wait", queue_wait, tags)
+        self._busy_workers += 1
+        self._peak_busy_workers = max(self._peak_busy_workers, self._busy_workers)
+        self._report_utilization()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            latency = time.monotonic() - started
+            self._avg_fetch_latency = _moving_average(self._avg_fetch_latency, latency)
+            metrics.histogram("fetching_engine.fetch_latency", latency, tags)
+            self._release_origin_slot(queued)
+            self._busy_workers -= 1
+            self._report_utilization()
+            self._scale_down()
+
+    def _report_utilization(self):
+        workers = len(self._tasks)
+        metrics.gauge("fetching_engine.in_flight", self._busy_workers)
+        metrics.gauge(
+            "fetching_engine.utilization",
+            self._busy_workers / workers if workers else 0.0,
+        )
+
     def register_failure_handler(self, callback: OnFetchFailureCallback):
         """Register a callback to be called with exception and original event
         in case of failure.
@@ -218,4 +615,8 @@ class FetchingEngine(BaseFetchingEngine):
             error (Exception): thrown exception
             event (FetchEvent): event which was being handled
         """
+        # fail the waiter of the fetch (if awaited with handle_url) right away
+        waiter = self._url_waiters.pop(id(event), None)
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(error)
         await self._management_event_handler(self._failure_handlers, error, event)
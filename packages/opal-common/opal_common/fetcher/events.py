@@ -1,3 +1,4 @@
+from enum import IntEnum
 from typing import List, Optional
 
 from pydantic import BaseModel, Field
@@ -34,3 +35,12 @@ class FetchEvent(BaseModel):
     config: dict = None
     # Tenacity.retry - Override default retry configuration for this event
     retry: dict = None
+
+
+class FetchPriority(IntEnum):
+    """Priority of a queued fetch event - events with a higher priority
+    (lower value) are started by the engine's workers first."""
+
+    high = 0
+    normal = 10
+    low = 20
@@ -1,10 +1,25 @@
+from functools import partial
+from typing import Optional
+
+from opal_common.fetcher.circuit_breaker import FetchGuard
 from opal_common.fetcher.events import FetchEvent
 from opal_common.fetcher.logger import get_logger
 from tenacity import retry, stop, wait
+from tenacity.stop import stop_base
 
 logger = get_logger("opal.providers")
 
 
+class stop_unless_retry_allowed(stop_base):
+    """Stops retrying when the fetch guard doesn't allow another attempt."""
+
+    def __init__(self, guard: FetchGuard):
+        self._guard = guard
+
+    def __call__(self, retry_state) -> bool:
+        return not self._guard.allow_retry()
+
+
 class BaseFetchProvider:
     """Base class for data fetching providers.
 
@@ -13,6 +28,10 @@ class BaseFetchProvider:
     - override __aenter__ and __aexit__ for async context
     """
 
+    # whether the results of identical fetches may be shared (see FetchingEngine.handle_url),
+    # i.e. the result isn't consumed by reading it (e.g. it's not a stream of pages)
+    SHAREABLE_RESULTS = True
+
     DEFAULT_RETRY_CONFIG = {
         "wait": wait.wait_random_exponential(),
         "stop": stop.stop_after_attempt(200),
@@ -31,6 +50,7 @@ class BaseFetchProvider:
         self._retry_config = (
             retry_config if retry_config is not None else self.DEFAULT_RETRY_CONFIG
         )
+        self._fetch_guard: Optional[FetchGuard] = None
 
     def parse_event(self, event: FetchEvent) -> FetchEvent:
         """Parse the event (And config within it) into the right object type.
@@ -46,9 +66,21 @@ class BaseFetchProvider:
     async def fetch(self):
         """Fetch and return data.
 
-        Calls self._fetch_ with a retry mechanism
+        Calls self._fetch_ with a retry mechanism (guarded by the fetch
+        guard, if set)
         """
-        attempter = retry(**self._retry_config)(self._fetch_)
+        if self._fetch_guard is None:
+            attempter = retry(**self._retry_config)(self._fetch_)
+        else:
+            retry_config = dict(self._retry_config)
+            # the guard is only asked once the retry config would retry
+            retry_config["stop"] = stop.stop_any(
+                retry_config.get("stop", stop.stop_never),
+                stop_unless_retry_allowed(self._fetch_guard),
+            )
+            attempter = retry(**retry_config)(
+                partial(self._fetch_guard.attempt, self._fetch_)
+            )
         res = await attempter()
         return res
 
@@ -82,3 +114,12 @@ class BaseFetchProvider:
             retry_config (dict): Tenacity retry config
         """
         self._retry_config = retry_config
+
+    def set_fetch_guard(self, guard: Optional[FetchGuard]):
+        """Set a guard (circuit breaker and retry budget) for the attempts of
+        the fetch.
+
+        Args:
+            guard (FetchGuard): the guard, or None to attempt (and retry) unguarded
+        """
+        self._fetch_guard = guard
@@ -53,6 +53,10 @@ class FetcherRegister:
     def register_fetcher(self, name: str, fetcher_class: Type[BaseFetchProvider]):
         self._config[name] = fetcher_class
 
+    def get_fetcher_class(self, name: str) -> Optional[Type[BaseFetchProvider]]:
+        """Returns the fetcher class registered under the name, or None."""
+        return self._config.get(name, None)
+
     def get_fetcher(self, name: str, event: FetchEvent) -> BaseFetchProvider:
         """Init a fetcher instance from a registered fetcher class name.
 
@@ -63,7 +67,7 @@ class FetcherRegister:
         Returns:
             BaseFetchProvider: A fetcher instance
         """
-        provider_class = self._config.get(name, None)
+        provider_class = self.get_fetcher_class(name)
         if provider_class is None:
             raise NoMatchingFetchProviderException(
                 f"Couldn't find a match for - {name} , {event}"
@@ -1,17 +1,28 @@
 """Simple HTTP get data fetcher using requests supports."""
 
+import time
 from enum import Enum
-from typing import Any, Union, cast
+from typing import Any, Dict, Optional, Union, cast
 
 import httpx
 from aiohttp import ClientResponse, ClientSession, ClientTimeout
 from opal_common.config import opal_common_config
+from opal_common.fetcher.compression import (
+    Compression,
+    Decompressor,
+    compression_from_url,
+    get_decompressor,
+    http_accept_encoding,
+)
+from opal_common.fetcher.data_stream import SpooledDataStream
 from opal_common.fetcher.events import FetcherConfig, FetchEvent
 from opal_common.fetcher.fetch_provider import BaseFetchProvider
 from opal_common.fetcher.logger import get_logger
+from opal_common.fetcher.providers.http_session_pool import HttpSessionPool
 from opal_common.http_utils import is_http_error_response
+from opal_common.monitoring import metrics
 from opal_common.security.sslcontext import get_custom_ssl_context
-from pydantic import validator
+from pydantic import BaseModel, validator
 
 logger = get_logger("http_fetch_provider")
 
@@ -25,6 +36,31 @@ class HttpMethods(Enum):
     DELETE = "delete"
 
 
+class HttpCacheValidators(BaseModel):
+    """The cache validators (ETag / Last-Modified) of a fetched HTTP resource,
+    used to issue a conditional request for the same resource later on."""
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @classmethod
+    def from_response(
+        cls, res: Union[ClientResponse, httpx.Response]
+    ) -> "HttpCacheValidators":
+        return cls(
+            etag=res.headers.get("ETag"),
+            last_modified=res.headers.get("Last-Modified"),
+        )
+
+    def to_request_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
 class HttpFetcherConfig(FetcherConfig):
     """Config for HttpFetchProvider's Adding HTTP headers."""
 
@@ -33,6 +69,17 @@ class HttpFetcherConfig(FetcherConfig):
     process_data: bool = True
     method: HttpMethods = HttpMethods.GET
     data: Any = None
+    # If set, the fetched data is returned wrapped in a HttpConditionalFetchResult
+    conditional: bool = False
+    # Validators of a previous fetch, if given the request is made conditional
+    validators: Optional[HttpCacheValidators] = None
+    # If set, the response body isn't parsed, but streamed (in chunks) into a SpooledDataStream
+    # (written to the policy store as is - unlike parsed data, with its null fields kept,
+    # see exclude_none_fields)
+    streaming: bool = False
+    # If set, the response body is a compressed file (e.g. a .json.gz export), decompressed
+    # while it's streamed in (auto: by the extension of the url, if any)
+    compression: Optional[Compression] = None
 
     @validator("method")
     def force_enum(cls, v):
@@ -46,6 +93,18 @@ class HttpFetcherConfig(FetcherConfig):
         use_enum_values = True
 
 
+class HttpConditionalFetchResult(BaseModel):
+    """The result of a conditional fetch (see HttpFetcherConfig.conditional)
+
+    If the resource didn't change since the validators sent with the
+    request were obtained, `not_modified` is set and `data` is None.
+    """
+
+    data: Any = None
+    not_modified: bool = False
+    validators: HttpCacheValidators = HttpCacheValidators()
+
+
 class HttpFetchEvent(FetchEvent):
     fetcher: str = "HttpFetchProvider"
     config: HttpFetcherConfig = None
@@ -58,6 +117,9 @@ class HttpFetchProvider(BaseFetchProvider):
             event.config = HttpFetcherConfig()
         super().__init__(event)
         self._session = None
+        self._headers = {}
+        self._session_pool: Optional[HttpSessionPool] = None
+        self._owns_session = False
         self._custom_ssl_context = get_custom_ssl_context()
         self._ssl_context_kwargs = (
             {"ssl": self._custom_ssl_context}
@@ -68,11 +130,39 @@ class HttpFetchProvider(BaseFetchProvider):
     def parse_event(self, event: FetchEvent) -> HttpFetchEvent:
         return HttpFetchEvent(**event.dict(exclude={"config"}), config=event.config)
 
+    def set_session_pool(self, session_pool: Optional[HttpSessionPool]):
+        """Fetch with a session from the given pool (see HttpSessionPool),
+        instead of opening a new session for the fetch.
+
+        Ignored if HTTP_FETCHER_POOL_CONNECTIONS is not set.
+        """
+        if opal_common_config.HTTP_FETCHER_POOL_CONNECTIONS:
+            self._session_pool = session_pool
+
     async def __aenter__(self):
         headers = {}
         timeout = opal_common_config.HTTP_FETCHER_TIMEOUT
         if self._event.config.headers is not None:
             headers = self._event.config.headers
+        if not any(header.lower() == "accept-encoding" for header in headers):
+            headers = {
+                "Accept-Encoding": http_accept_encoding(
+                    opal_common_config.HTTP_FETCHER_PROVIDER_CLIENT
+                ),
+                **headers,
+            }
+        if self._event.config.validators is not None:
+            headers = {
+                **headers,
+                **self._event.config.validators.to_request_headers(),
+            }
+        if self._session_pool is not None:
+            # the pooled session is shared, send the headers with the request
+            self._headers = headers
+            self._session = self._session_pool.get(self._url)
+            return self
+
+        self._owns_session = True
         if opal_common_config.HTTP_FETCHER_PROVIDER_CLIENT == "httpx":
             self._session = httpx.AsyncClient(
                 headers=headers, timeout=timeout, trust_env=True
@@ -88,22 +178,63 @@ class HttpFetchProvider(BaseFetchProvider):
         return self
 
     async def __aexit__(self, exc_type=None, exc_val=None, tb=None):
-        await self._session.__aexit__(exc_type, exc_val, tb)
+        if self._owns_session:
+            await self._session.__aexit__(exc_type, exc_val, tb)
 
     async def _fetch_(self):
-        logger.debug(f"{self.__class__.__name__} fetching from {self._url}")
+        return await self._request(self._url)
+
+    async def _request(self, url: str) -> Union[ClientResponse, httpx.Response]:
+        logger.debug(f"{self.__class__.__name__} fetching from {url}")
         http_method = self.match_http_method_from_type(
             self._session, self._event.config.method
         )
+        kwargs = dict(self._ssl_context_kwargs)
+        if self._session_pool is not None and isinstance(
+            self._session, httpx.AsyncClient
+        ):
+            # the pool configures httpx clients with the custom ssl context
+            kwargs = {}
+        if self._headers:
+            kwargs["headers"] = self._headers
         if self._event.config.data is not None:
-            result: Union[ClientResponse, httpx.Response] = await http_method(
-                self._url, data=self._event.config.data, **self._ssl_context_kwargs
-            )
-        else:
-            result = await http_method(self._url, **self._ssl_context_kwargs)
-        result.raise_for_status()
+            kwargs["data"] = self._event.config.data
+        with metrics.timer("http_fetcher.request_duration", self._metric_tags):
+            if self._event.config.streaming and isinstance(
+                self._session, httpx.AsyncClient
+            ):
+                # unlike aiohttp, httpx reads the whole response body unless asked not to
+                request = self._session.build_request(
+                    self._event.config.method.value.upper(), url, **kwargs
+                )
+                result: Union[
+                    ClientResponse, httpx.Response
+                ] = await self._session.send(request, stream=True)
+            else:
+                result = await http_method(url, **kwargs)
+        # httpx considers any non 2xx status (including 304) as an error
+        if not self._is_not_modified(result):
+            try:
+                result.raise_for_status()
+            except:
+                await self._close_response(result)
+                raise
         return result
 
+    @staticmethod
+    async def _close_response(res: Union[ClientResponse, httpx.Response]):
+        """Releases the connection of a response whose body isn't read (e.g. a
+        streamed httpx response holds it until it's closed)."""
+        if isinstance(res, httpx.Response):
+            await res.aclose()
+        else:
+            res.release()
+
+    @staticmethod
+    def _is_not_modified(res: Union[ClientResponse, httpx.Response]) -> bool:
+        status = res.status if isinstance(res, ClientResponse) else res.status_code
+        return status == 304
+
     @staticmethod
     def match_http_method_from_type(
         session: Union[ClientSession, httpx.AsyncClient], method_type: HttpMethods
@@ -125,10 +256,126 @@ class HttpFetchProvider(BaseFetchProvider):
         if is_http_error_response(res):
             return res
 
+        if self._event.config.conditional:
+            validators = HttpCacheValidators.from_response(res)
+            if self._is_not_modified(res):
+                await self._close_response(res)
+                return HttpConditionalFetchResult(
+                    not_modified=True, validators=validators
+                )
+            return HttpConditionalFetchResult(
+                data=await self._process_data(res), validators=validators
+            )
+
+        return await self._process_data(res)
+
+    @staticmethod
+    async def _response_to_stream(
+        res: Union[ClientResponse, httpx.Response],
+        decompressor: Optional[Decompressor] = None,
+    ) -> SpooledDataStream:
+        stream = SpooledDataStream()
+
+        async def write(chunk: bytes):
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            await stream.write(chunk)
+
+        try:
+            if isinstance(res, httpx.Response):
+                try:
+                    async for chunk in res.aiter_bytes():
+                        await write(chunk)
+                finally:
+                    await res.aclose()
+            else:
+                res = cast(ClientResponse, res)
+                async for chunk in res.content.iter_any():
+                    await write(chunk)
+            if decompressor is not None:
+                await stream.write(decompressor.flush())
+        except:
+            stream.close()
+            raise
+        return stream
+
+    def _get_decompressor(
+        self, res: Union[ClientResponse, httpx.Response]
+    ) -> Optional[Decompressor]:
+        compression = self._event.config.compression
+        if compression == Compression.auto:
+            if res.headers.get("Content-Encoding", "identity") != "identity":
+                # the compressed file was served content-encoded, and was already decoded
+                return None
+            compression = compression_from_url(self._url)
+        if compression is None:
+            return None
+        return get_decompressor(
+            compression, opal_common_config.HTTP_FETCHER_MAX_DECOMPRESSED_SIZE
+        )
+
+    async def _decompress_response(
+        self, res: Union[ClientResponse, httpx.Response], decompressor: Decompressor
+    ) -> Any:
+        """Decompresses the response body while it's streamed in (into a
+        spooled temporary file, so neither the compressed nor the decompressed
+        data is held in memory in whole), and parses it unless streaming."""
+        tags = self._metric_tags
+        with metrics.timer("http_fetcher.read_duration", tags):
+            stream = await self._response_to_stream(res, decompressor)
+        metrics.histogram(
+            "http_fetcher.decompressed_bytes", stream.size, tags, metrics.SIZE_BUCKETS
+        )
+        if self._event.config.streaming:
+            return stream
+        try:
+            with metrics.timer("http_fetcher.decode_duration", tags):
+                if self._event.config.is_json:
+                    return await stream.read_json()
+                chunks = [chunk async for chunk in stream.iter_chunks()]
+                return b"".join(chunks).decode("utf-8")
+        finally:
+            stream.close()
+
+    @property
+    def _metric_tags(self) -> Dict[str, str]:
+        return {"source": metrics.source_tag(self._url)}
+
+    async def _process_data(self, res: Union[ClientResponse, httpx.Response]):
+        tags = self._metric_tags
+        if self._event.config.streaming or self._event.config.process_data:
+            decompressor = self._get_decompressor(res)
+            if decompressor is not None:
+                return await self._decompress_response(res, decompressor)
+        if self._event.config.streaming:
+            with metrics.timer("http_fetcher.read_duration", tags):
+                stream = await self._response_to_stream(res)
+            metrics.histogram(
+                "http_fetcher.response_bytes", stream.size, tags, metrics.SIZE_BUCKETS
+            )
+            return stream
         # if we are asked to process the data before we return it
         if self._event.config.process_data:
-            data = await self._response_to_data(res, is_json=self._event.config.is_json)
+            # read the body first, so decoding it is measured on its own
+            # (httpx already read it, unless streaming)
+            if isinstance(res, ClientResponse):
+                with metrics.timer("http_fetcher.read_duration", tags):
+                    body = await res.read()
+            else:
+                body = res.content
+            metrics.histogram(
+                "http_fetcher.response_bytes", len(body), tags, metrics.SIZE_BUCKETS
+            )
+            with metrics.timer("http_fetcher.decode_duration", tags):
+                data = await self._response_to_data(
+                    res, is_json=self._event.config.is_json
+                )
             return data
         # return raw result
         else:
+            if self._session_pool is not None and isinstance(res, ClientResponse):
+                # the pooled session outlives the fetch, so read the body (the
+                # response can still be used) and release the connection now
+                await res.read()
+                res.release()
             return res
@@ -0,0 +1,102 @@
+from typing import Dict, Tuple, Union
+
+import httpx
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from opal_common.config import opal_common_config
+from opal_common.fetcher.logger import get_logger
+from opal_common.http_utils import get_url_origin
+from opal_common.security.sslcontext import get_custom_ssl_context
+
+logger = get_logger("http_session_pool")
+
+HttpSession = Union[ClientSession, httpx.AsyncClient]
+
+
+class HttpSessionPool:
+    """Long-lived HTTP sessions kept by a fetching engine, one per origin.
+
+    A session (aiohttp or httpx, see HTTP_FETCHER_PROVIDER_CLIENT) is kept
+    per origin (scheme, host and port) - so fetches from the same data
+    source reuse its keep-alive connections, instead of paying a TCP (and
+    TLS) handshake per fetch.
+
+    The sessions carry no default headers, the headers of each fetch are
+    sent with its request. Responses must be released once read, as the
+    sessions outlive the fetches (see HttpFetchProvider).
+    """
+
+    def __init__(self):
+        self._sessions: Dict[Tuple[str, str], HttpSession] = {}
+        self._http2 = opal_common_config.HTTP_FETCHER_HTTP2
+
+    def get(self, url: str) -> HttpSession:
+        """Returns the session for the origin of the url (creating it on first
+        use)."""
+        client = opal_common_config.HTTP_FETCHER_PROVIDER_CLIENT
+        if client != "httpx":
+            client = "aiohttp"
+        key = (client, get_url_origin(url))
+        session = self._sessions.get(key)
+        if session is None or self._is_closed(session):
+            session = self._sessions[key] = self._create_session(client)
+        return session
+
+    @staticmethod
+    def _is_closed(session: HttpSession) -> bool:
+        if isinstance(session, httpx.AsyncClient):
+            return session.is_closed
+        return session.closed
+
+    def _create_session(self, client: str) -> HttpSession:
+        timeout = opal_common_config.HTTP_FETCHER_TIMEOUT
+        limit = opal_common_config.HTTP_FETCHER_CONN_LIMIT_PER_HOST
+        keepalive = opal_common_config.HTTP_FETCHER_CONN_KEEPALIVE_TIMEOUT
+        if client == "aiohttp":
+            return ClientSession(
+                connector=TCPConnector(
+                    limit=limit,
+                    limit_per_host=limit,
+                    keepalive_timeout=keepalive,
+                    enable_cleanup_closed=True,
+                ),
+                raise_for_status=True,
+                timeout=ClientTimeout(total=timeout),
+                trust_env=True,
+            )
+
+        limits = httpx.Limits(
+            max_connections=limit or None,
+            max_keepalive_connections=limit or None,
+            keepalive_expiry=keepalive,
+        )
+        custom_ssl_context = get_custom_ssl_context()
+        kwargs = {"verify": custom_ssl_context} if custom_ssl_context else {}
+        if self._http2:
+            try:
+                return httpx.AsyncClient(
+                    timeout=timeout, limits=limits, http2=True, trust_env=True, **kwargs
+                )
+            except ImportError:
+                logger.warning(
+                    "HTTP/2 requires the 'h2' package (pip install httpx[http2]), "
+                    "falling back to HTTP/1.1"
+                )
+                self._http2 = False
+        return httpx.AsyncClient(
+            timeout=timeout, limits=limits, trust_env=True, **kwargs
+        )
+
+    async def close(self):
+        """Closes all the sessions (and their connections).
+
+        Sessions are recreated if the pool is used again.
+        """
+        sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            try:
+                if isinstance(session, httpx.AsyncClient):
+                    await session.aclose()
+                else:
+                    await session.close()
+            except Exception:
+                logger.exception("Failed to close pooled HTTP session")
@@ -0,0 +1,229 @@
+"""HTTP fetcher of data sources served in pages (following next links or cursor
+tokens)."""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Optional, Tuple, Union
+from urllib.parse import urljoin
+
+import httpx
+from aiohttp import ClientResponse
+from opal_common.fetcher.events import FetchEvent
+from opal_common.fetcher.providers.http_fetch_provider import (
+    HttpFetcherConfig,
+    HttpFetchProvider,
+)
+from opal_common.monitoring import metrics
+from opal_common.urls import set_url_query_param
+from pydantic import Field
+
+
+class PaginatedFetcherConfig(HttpFetcherConfig):
+    """Config for PaginatedFetchProvider (on top of HttpFetcherConfig's)."""
+
+    fetcher: str = "PaginatedFetchProvider"
+    items_path: Optional[str] = Field(
+        None,
+        description="Path ('.' separated keys) of the items in each page, "
+        "if not set - the page itself is the items (an array, or an object)",
+    )
+    next_path: Optional[str] = Field(
+        None,
+        description="Path ('.' separated keys) of the link to the next page (or of its "
+        "cursor, see cursor_param) in each page, if not set - the next page is "
+        "linked by the Link header of the response (rel=next). The last page has none.",
+    )
+    cursor_param: Optional[str] = Field(
+        None,
+        description="If set, next_path holds a cursor token, sent as this query "
+        "parameter of the data source url to fetch the next page",
+    )
+    prefetch: int = Field(
+        2,
+        description="Max number of pages fetched ahead of their consumer "
+        "(e.g. while earlier pages are written to the policy store)",
+    )
+    max_pages: int = Field(0, description="Max number of pages to fetch, 0 for all")
+
+
+class PaginatedFetchEvent(FetchEvent):
+    fetcher: str = "PaginatedFetchProvider"
+    config: PaginatedFetcherConfig = None
+
+
+class _Done:
+    pass
+
+
+class PaginatedFetchResult:
+    """The pages of a paginated data source.
+
+    The first page is fetched by the fetching engine, the following
+    pages are fetched while iterating over the result - up to `prefetch`
+    pages ahead of the iteration, so only a few pages are held in memory
+    at once, however large the data source is. Each cursor depends on the
+    previous page, so pages are fetched one after the other.
+
+    Yields the items of each page (an array, or an object). Can only be
+    iterated once, and must be closed (see aclose) once no longer needed.
+    """
+
+    def __init__(
+        self,
+        provider: "PaginatedFetchProvider",
+        items: Any,
+        next_url: Optional[str],
+    ):
+        config: PaginatedFetcherConfig = provider._event.config
+        self.url = provider._url
+        self._provider = provider
+        self._next_url = next_url
+        self._max_pages = config.max_pages
+        self._pages: asyncio.Queue = asyncio.Queue(maxsize=max(1, config.prefetch))
+        self._pages.put_nowait(items)
+        self._producer: Optional[asyncio.Task] = None
+        self._sha256 = hashlib.sha256()
+        self._iterated = False
+        self._closed = False
+        self.pages = 0
+        self.items = 0
+
+    @property
+    def hash(self) -> str:
+        """The hexadecimal SHA-256 of the pages iterated so far."""
+        return self._sha256.hexdigest()
+
+    async def _produce(self):
+        url, pages = self._next_url, 1
+        try:
+            while url is not None and (not self._max_pages or pages < self._max_pages):
+                items, url = await self._provider._fetch_next_page(url)
+                pages += 1
+                await self._pages.put(items)
+            await self._pages.put(_Done)
+        except Exception as e:
+            await self._pages.put(e)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        if self._iterated:
+            raise RuntimeError(f"Pages of {self.url} were already iterated")
+        self._iterated = True
+        self._producer = asyncio.create_task(self._produce())
+        while True:
+            items = await self._pages.get()
+            if items is _Done:
+                return
+            if isinstance(items, Exception):
+                raise items
+            self._sha256.update(json.dumps(items).encode("utf-8"))
+            self.pages += 1
+            self.items += len(items)
+            yield items
+
+    async def aclose(self):
+        """Stops fetching pages, and closes the connection to the data
+        source."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._producer is not None:
+            self._producer.cancel()
+            try:
+                await self._producer
+            except asyncio.CancelledError:
+                pass
+        await self._provider._close_session()
+        metrics.histogram(
+            "paginated_fetcher.pages",
+            self.pages,
+            {"source": metrics.source_tag(self.url)},
+            metrics.COUNT_BUCKETS,
+        )
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} url={self.url} pages={self.pages}>"
+
+
+class PaginatedFetchProvider(HttpFetchProvider):
+    """Fetches a data source served in pages, as a PaginatedFetchResult.
+
+    The next page is either linked by each page (next_path, or the Link
+    header), or identified by a cursor token in each page (next_path and
+    cursor_param). Each page is a JSON document, its items are at
+    items_path.
+    """
+
+    SHAREABLE_RESULTS = False
+
+    def __init__(self, event: PaginatedFetchEvent) -> None:
+        if event.config is None:
+            event.config = PaginatedFetcherConfig()
+        super().__init__(event)
+        self._event: PaginatedFetchEvent
+        self._page_url = self._url
+        self._result: Optional[PaginatedFetchResult] = None
+
+    def parse_event(self, event: FetchEvent) -> PaginatedFetchEvent:
+        return PaginatedFetchEvent(
+            **event.dict(exclude={"config"}), config=event.config
+        )
+
+    async def __aexit__(self, exc_type=None, exc_val=None, tb=None):
+        if self._result is None:
+            await self._close_session(exc_type, exc_val, tb)
+        # otherwise the session is needed for the following pages, and is
+        # closed with the result (see PaginatedFetchResult.aclose)
+
+    async def _close_session(self, exc_type=None, exc_val=None, tb=None):
+        await super().__aexit__(exc_type, exc_val, tb)
+
+    async def _fetch_(self) -> Tuple[Any, Optional[str]]:
+        res = await self._request(self._page_url)
+        page = await self._response_to_data(res, is_json=True)
+        return self._get_items(page), self._get_next_url(page, res)
+
+    async def _fetch_next_page(self, url: str) -> Tuple[Any, Optional[str]]:
+        """Fetches the page at the url (with retries), returns its items and
+        the url of the next page (None if it's the last page)."""
+        self._page_url = url
+        return await self.fetch()
+
+    async def _process_(self, page: Tuple[Any, Optional[str]]) -> PaginatedFetchResult:
+        items, next_url = page
+        self._result = PaginatedFetchResult(self, items, next_url)
+        return self._result
+
+    @staticmethod
+    def _get_path(page: Any, path: str) -> Any:
+        for key in path.split("."):
+            if not isinstance(page, dict):
+                return None
+            page = page.get(key)
+        return page
+
+    def _get_items(self, page: Any) -> Any:
+        items_path = self._event.config.items_path
+        items = self._get_path(page, items_path) if items_path else page
+        if items is None:
+            return []
+        if not isinstance(items, (list, dict)):
+            raise ValueError(
+                f"Page of {self._page_url} has no array or object of items "
+                f"(at '{items_path or ''}')"
+            )
+        return items
+
+    def _get_next_url(
+        self, page: Any, res: Union[ClientResponse, httpx.Response]
+    ) -> Optional[str]:
+        config: PaginatedFetcherConfig = self._event.config
+        if config.next_path is None:
+            link = res.links.get("next")
+            return urljoin(self._page_url, str(link["url"])) if link else None
+        next_ref = self._get_path(page, config.next_path)
+        if next_ref is None or next_ref == "":
+            return None
+        if config.cursor_param is not None:
+            return set_url_query_param(self._url, config.cursor_param, str(next_ref))
+        return urljoin(self._page_url, str(next_ref))
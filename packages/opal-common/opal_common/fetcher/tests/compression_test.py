@@ -0,0 +1,71 @@
+import os
+import sys
+
+# Add parent path to use local src as package for tests
+root_dir = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__), os.path.pardir, os.path.pardir, os.path.pardir
+    )
+)
+sys.path.append(root_dir)
+
+import gzip
+import zlib
+
+import pytest
+from opal_common.fetcher.compression import (
+    Compression,
+    DecompressedSizeExceeded,
+    get_decompressor,
+    http_accept_encoding,
+)
+
+DATA = b'{"items": [' + b", ".join(b"%d" % i for i in range(10000)) + b"]}"
+
+
+def raw_deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(compression: Compression, body: bytes, chunk_size: int, **kwargs):
+    decompressor = get_decompressor(compression, **kwargs)
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+    return b"".join(decompressor.decompress(chunk) for chunk in chunks) + (
+        decompressor.flush()
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1000, 1000000])
+@pytest.mark.parametrize(
+    "compression, body",
+    [
+        (Compression.gzip, gzip.compress(DATA)),
+        (Compression.deflate, zlib.compress(DATA)),
+        (Compression.deflate, raw_deflate(DATA)),
+    ],
+)
+def test_decompress(compression, body, chunk_size):
+    """Test gzip, zlib wrapped and raw deflate data is decompressed, however
+    it's chunked."""
+    assert decompress(compression, body, chunk_size) == DATA
+
+
+@pytest.mark.parametrize("compression", [Compression.gzip, Compression.deflate])
+def test_decompressed_size_is_capped(compression):
+    compress = gzip.compress if compression == Compression.gzip else zlib.compress
+    bomb = compress(b"0" * 10_000_000)
+    assert len(bomb) < 20_000
+    with pytest.raises(DecompressedSizeExceeded):
+        decompress(compression, bomb, 1000, max_size=1_000_000)
+    assert decompress(compression, compress(DATA), 1000, max_size=len(DATA)) == DATA
+
+
+def test_truncated_data_fails():
+    with pytest.raises(ValueError):
+        decompress(Compression.gzip, gzip.compress(DATA)[:-10], 1000)
+
+
+@pytest.mark.parametrize("client", ["aiohttp", "httpx"])
+def test_accept_encoding(client):
+    assert http_accept_encoding(client).startswith("gzip, deflate")
@@ -13,10 +13,20 @@ print(root_dir)
 sys.path.append(root_dir)
 
 import asyncio
+from functools import partial
 
+import httpx
 import pytest
 import tenacity
 from opal_common.fetcher import FetchEvent, FetchingEngine
+from opal_common.fetcher.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpenError,
+    CircuitState,
+    FetchGuard,
+    RetryBudget,
+)
 from opal_common.fetcher.providers.http_fetch_provider import (
     HttpFetchEvent,
     HttpFetchProvider,
@@ -61,3 +71,92 @@ async def test_retry_failure():
         await asyncio.wait_for(got_error.wait(), 25)
         assert not got_data_event.is_set()
         assert got_error.is_set()
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast():
+    """Test the circuit of a failing origin opens (stopping the retries of the
+    fetch), and that fetches from it then fail fast."""
+    retry_config = HttpFetchProvider.DEFAULT_RETRY_CONFIG.copy()
+    retry_config["wait"] = tenacity.wait.wait_none()
+    retry_config["stop"] = tenacity.stop.stop_after_attempt(10)
+    breakers = CircuitBreakers(
+        failure_threshold=3,
+        reset_timeout=60,
+        retry_budget_ratio=0,
+        retry_budget_min_per_second=0,
+    )
+    async with FetchingEngine(
+        retry_config=retry_config, circuit_breakers=breakers
+    ) as engine:
+        # the failure is raised to the waiter right away (not after a timeout)
+        with pytest.raises(aiohttp.client_exceptions.ClientConnectorError):
+            await engine.handle_url("http://localhost:25/data", timeout=25)
+        [state] = breakers.states
+        assert state.origin == "http://localhost:25"
+        assert state.state == CircuitState.open
+        assert state.consecutive_failures == 3
+
+        with pytest.raises(CircuitOpenError):
+            await engine.handle_url("http://localhost:25/other", timeout=1)
+        assert breakers.states[0].consecutive_failures == 3
+
+
+def test_circuit_breaker_half_open_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitState.closed and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.open
+
+    # a single probe is let through once the reset timeout passed
+    assert breaker.allow()
+    assert breaker.state == CircuitState.half_open
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.open
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitState.closed
+    assert breaker.consecutive_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_counts_only_origin_failures():
+    """Test client errors (4xx) don't count as failures of the origin, while
+    server errors (5xx) do."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    guard = FetchGuard("http://origin:80", breaker, RetryBudget(0, 0))
+    request = httpx.Request("GET", "http://origin/data")
+
+    async def fail(exc: Exception):
+        raise exc
+
+    def http_error(status: int) -> httpx.HTTPStatusError:
+        response = httpx.Response(status, request=request)
+        return httpx.HTTPStatusError("error", request=request, response=response)
+
+    for exc in (
+        http_error(404),
+        aiohttp.ClientResponseError(None, (), status=403),
+        ValueError("not an origin failure"),
+    ):
+        with pytest.raises(type(exc)):
+            await guard.attempt(partial(fail, exc))
+        assert breaker.state == CircuitState.closed
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await guard.attempt(partial(fail, http_error(503)))
+    assert breaker.state == CircuitState.open
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, capacity=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    # each fetch earns half a retry
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
@@ -0,0 +1,188 @@
+import os
+import sys
+
+# Add parent path to use local src as package for tests
+root_dir = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__), os.path.pardir, os.path.pardir, os.path.pardir
+    )
+)
+sys.path.append(root_dir)
+
+import asyncio
+import time
+
+import pytest
+from opal_common.fetcher import FetchEvent, FetchingEngine, FetchPriority
+from opal_common.fetcher.fetch_provider import BaseFetchProvider
+
+FETCHER = "RecordingFetchProvider"
+
+
+class RecordingFetchProvider(BaseFetchProvider):
+    """Records the fetched urls, fetching 'blocker' waits until released, and
+    fetching http urls takes a while."""
+
+    fetched = []
+    release = None
+    in_flight = 0
+    max_in_flight = 0
+
+    async def _fetch_(self):
+        self.fetched.append(self._url)
+        if self._url == "blocker":
+            await self.release.wait()
+        elif self._url.startswith("http"):
+            cls = RecordingFetchProvider
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            await asyncio.sleep(0.1)
+            cls.in_flight -= 1
+        return self._url
+
+
+@pytest.fixture
+def recorder():
+    RecordingFetchProvider.fetched = []
+    RecordingFetchProvider.release = asyncio.Event()
+    RecordingFetchProvider.in_flight = RecordingFetchProvider.max_in_flight = 0
+    return RecordingFetchProvider
+
+
+def make_engine(**kwargs) -> FetchingEngine:
+    return FetchingEngine(
+        register_config={FETCHER: RecordingFetchProvider},
+        **{"worker_count": 1, **kwargs},
+    )
+
+
+async def noop(data):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_queued_fetches_start_by_priority(recorder):
+    """Test queued events are started by priority (FIFO within a priority), and
+    that cancelled and expired events are dropped."""
+    failures = []
+    async with make_engine() as engine:
+
+        async def on_failure(error: Exception, event: FetchEvent):
+            failures.append((event.url, error))
+
+        engine.register_failure_handler(on_failure)
+        # keep the worker busy, so the following events wait in the queue
+        await engine.queue_url("blocker", noop, fetcher=FETCHER)
+        await asyncio.sleep(0.1)
+
+        await engine.queue_url("low", noop, fetcher=FETCHER, priority=FetchPriority.low)
+        await engine.queue_url("normal-1", noop, fetcher=FETCHER)
+        cancelled = await engine.queue_url("cancelled", noop, fetcher=FETCHER)
+        await engine.queue_url("normal-2", noop, fetcher=FETCHER)
+        await engine.queue_fetch_event(
+            FetchEvent(url="expired", fetcher=FETCHER),
+            noop,
+            priority=FetchPriority.high,
+            deadline=time.monotonic() + 0.05,
+        )
+        await engine.queue_url(
+            "high", noop, fetcher=FETCHER, priority=FetchPriority.high
+        )
+        assert engine.cancel_fetch(cancelled)
+        await asyncio.sleep(0.1)
+
+        recorder.release.set()
+        await engine._queue.join()
+        assert recorder.fetched == [
+            "blocker",
+            "high",
+            "normal-1",
+            "normal-2",
+            "low",
+        ]
+        assert not engine.cancel_fetch(cancelled)
+        assert [url for url, _ in failures] == ["expired"]
+        assert isinstance(failures[0][1], asyncio.TimeoutError)
+
+
+@pytest.mark.asyncio
+async def test_timed_out_fetch_is_dropped(recorder):
+    """Test a fetch whose waiter timed out isn't started later."""
+    async with make_engine() as engine:
+        await engine.queue_url("blocker", noop, fetcher=FETCHER)
+        await asyncio.sleep(0.1)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await engine.handle_url("timed-out", timeout=0.1, fetcher=FETCHER)
+
+        recorder.release.set()
+        await engine._queue.join()
+        assert "timed-out" not in recorder.fetched
+
+
+@pytest.mark.asyncio
+async def test_workers_autoscale(recorder):
+    """Test workers are added when fetches back up in the queue, and retire
+    once idle."""
+    async with make_engine(max_worker_count=4, worker_idle_timeout=0.2) as engine:
+        for i in range(8):
+            await engine.queue_url(f"http://origin-{i}/data", noop, fetcher=FETCHER)
+        stats = engine.stats
+        assert stats.workers == 4
+        assert stats.queued + stats.busy_workers == 8
+        await engine._queue.join()
+        assert recorder.max_in_flight == 4
+        assert engine.stats.avg_fetch_latency >= 0.1
+
+        await asyncio.sleep(0.5)
+        stats = engine.stats
+        assert stats.workers == 1
+        assert stats.busy_workers == 0
+
+
+@pytest.mark.asyncio
+async def test_fetches_per_origin_are_capped(recorder):
+    async with make_engine(worker_count=4, max_fetches_per_origin=2) as engine:
+        for i in range(4):
+            await engine.queue_url(f"http://origin/data-{i}", noop, fetcher=FETCHER)
+        await engine._queue.join()
+        assert len(recorder.fetched) == 4
+        assert recorder.max_in_flight == 2
+        # origins with no fetches in flight are forgotten
+        assert not engine._origin_fetches
+        assert not engine._origin_waiters
+
+
+@pytest.mark.asyncio
+async def test_capped_origin_does_not_block_workers(recorder):
+    """Test fetches waiting for a slot of their origin don't hold a worker
+    (blocking the fetches of other origins)."""
+    async with make_engine(worker_count=2, max_fetches_per_origin=1) as engine:
+        await engine.queue_url("blocker", noop, fetcher=FETCHER)
+        await engine.queue_url("blocker", noop, fetcher=FETCHER)
+        await engine.queue_url("http://other/data", noop, fetcher=FETCHER)
+        await asyncio.sleep(0.3)
+        assert recorder.fetched == ["blocker", "http://other/data"]
+        assert engine.stats.busy_workers == 1
+
+        recorder.release.set()
+        await engine._queue.join()
+        assert recorder.fetched.count("blocker") == 2
+        assert not engine._origin_fetches
+        assert not engine._origin_waiters
+
+
+@pytest.mark.asyncio
+async def test_workers_scale_down_under_trickle(recorder):
+    """Test workers added for a burst retire once fewer are needed, even if a
+    trickle of fetches keeps waking them (so none is idle for long)."""
+    async with make_engine(max_worker_count=4, worker_idle_timeout=0.2) as engine:
+        for i in range(8):
+            await engine.queue_url(f"http://origin-{i}/data", noop, fetcher=FETCHER)
+        await engine._queue.join()
+        assert engine.stats.workers == 4
+
+        for i in range(20):
+            await engine.queue_url(f"trickle-{i}", noop, fetcher=FETCHER)
+            await asyncio.sleep(0.04)
+        assert engine.stats.workers == 1
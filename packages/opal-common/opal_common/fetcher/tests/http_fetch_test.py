@@ -10,19 +10,44 @@ root_dir = os.path.abspath(
 sys.path.append(root_dir)
 
 import asyncio
+import gzip
+import hashlib
+import json
 from multiprocessing import Process
 
+import httpx
 import pytest
 import uvicorn
-from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
+from opal_common.config import opal_common_config
 from opal_common.fetcher import FetchingEngine
-from opal_common.fetcher.providers.http_fetch_provider import HttpFetcherConfig
+from opal_common.fetcher.data_stream import SpooledDataStream
+from opal_common.fetcher.providers.http_fetch_provider import (
+    HttpCacheValidators,
+    HttpConditionalFetchResult,
+    HttpFetcherConfig,
+    HttpFetchEvent,
+    HttpFetchProvider,
+)
+from opal_common.fetcher.providers.http_session_pool import HttpSessionPool
+from opal_common.fetcher.providers.paginated_fetch_provider import (
+    PaginatedFetcherConfig,
+    PaginatedFetchResult,
+)
+from tenacity import stop_after_attempt
 
 # Configurable
 PORT = int(os.environ.get("PORT") or "9110")
 BASE_URL = f"http://localhost:{PORT}"
 DATA_ROUTE = f"/data"
 AUTHORIZED_DATA_ROUTE = f"/data_authz"
+CONDITIONAL_DATA_ROUTE = f"/data_conditional"
+PEER_DATA_ROUTE = f"/data_peer"
+COUNTED_DATA_ROUTE = f"/data_counted"
+COMPRESSED_DATA_ROUTE = f"/export.json.gz"
+HEADERS_ROUTE = f"/headers"
+PAGED_DATA_ROUTE = f"/data_paged"
+DATA_ETAG = '"data-v1"'
 SECRET_TOKEN = "fake-super-secret-token"
 DATA_KEY = "Hello"
 DATA_VALUE = "World"
@@ -46,6 +71,49 @@ def setup_server():
     def get_authorized_data(token=Depends(check_token_header)):
         return {DATA_KEY: DATA_SECRET_VALUE}
 
+    @app.get(CONDITIONAL_DATA_ROUTE)
+    def get_conditional_data(response: Response, if_none_match: str = Header(None)):
+        if if_none_match == DATA_ETAG:
+            return Response(status_code=304, headers={"ETag": DATA_ETAG})
+        response.headers["ETag"] = DATA_ETAG
+        return {DATA_KEY: DATA_VALUE}
+
+    @app.get(PEER_DATA_ROUTE)
+    def get_peer_data(request: Request, x_token: str = Header(None)):
+        # the client port identifies the connection the request was sent over
+        return {"port": request.client.port, "token": x_token}
+
+    @app.get(COMPRESSED_DATA_ROUTE)
+    def get_compressed_data():
+        # a file of 2 gzip members, like concatenated exports
+        data = json.dumps({DATA_KEY: DATA_VALUE, "items": list(range(1000))})
+        half = len(data) // 2
+        body = gzip.compress(data[:half].encode()) + gzip.compress(data[half:].encode())
+        return Response(content=body, media_type="application/gzip")
+
+    @app.get(HEADERS_ROUTE)
+    def get_headers(request: Request):
+        return dict(request.headers)
+
+    @app.get(PAGED_DATA_ROUTE)
+    def get_paged_data(response: Response, page: int = 0):
+        # 4 pages of 2 items, the next page is linked by the Link header
+        if page < 3:
+            response.headers[
+                "Link"
+            ] = f'<{PAGED_DATA_ROUTE}?page={page + 1}>; rel="next"'
+        return [page * 2, page * 2 + 1]
+
+    requests_count = 0
+
+    @app.get(COUNTED_DATA_ROUTE)
+    async def get_counted_data(key: str):
+        nonlocal requests_count
+        requests_count += 1
+        count = requests_count
+        await asyncio.sleep(0.2)
+        return {"key": key, "count": count}
+
     uvicorn.run(app, port=PORT)
 
 
@@ -123,6 +191,238 @@ async def test_authorized_http_get_from_dict(server):
         assert got_data_event.is_set()
 
 
+@pytest.mark.asyncio
+async def test_conditional_http_get(server):
+    """Test a conditional fetch returns the cache validators of the data, and
+    that sending them back results in a 'not modified' result."""
+    async with FetchingEngine() as engine:
+        url = f"{BASE_URL}{CONDITIONAL_DATA_ROUTE}"
+        result = await engine.handle_url(
+            url, config=HttpFetcherConfig(conditional=True)
+        )
+        assert isinstance(result, HttpConditionalFetchResult)
+        assert not result.not_modified
+        assert result.data[DATA_KEY] == DATA_VALUE
+        assert result.validators.etag == DATA_ETAG
+
+        result = await engine.handle_url(
+            url,
+            config=HttpFetcherConfig(conditional=True, validators=result.validators),
+        )
+        assert result.not_modified
+        assert result.data is None
+
+        # stale validators get the full data again
+        result = await engine.handle_url(
+            url,
+            config=HttpFetcherConfig(
+                conditional=True, validators=HttpCacheValidators(etag='"old"')
+            ),
+        )
+        assert not result.not_modified
+        assert result.data[DATA_KEY] == DATA_VALUE
+
+
+@pytest.mark.asyncio
+async def test_streaming_http_get(server):
+    """Test fetching data in streaming mode returns the raw (unparsed) data."""
+    async with FetchingEngine() as engine:
+        stream = await engine.handle_url(
+            f"{BASE_URL}{DATA_ROUTE}",
+            config=HttpFetcherConfig(streaming=True),
+        )
+        try:
+            assert isinstance(stream, SpooledDataStream)
+            raw = b"".join([chunk async for chunk in stream.iter_chunks(4)])
+            assert (
+                raw
+                == json.dumps({DATA_KEY: DATA_VALUE}, separators=(",", ":")).encode()
+            )
+            assert stream.size == len(raw)
+            assert stream.hash == hashlib.sha256(raw).hexdigest()
+            assert await stream.read_json() == {DATA_KEY: DATA_VALUE}
+        finally:
+            stream.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("client", ["aiohttp", "httpx"])
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_compressed_http_get(server, monkeypatch, client, streaming):
+    """Test fetching a compressed file decompresses it while it's streamed
+    in."""
+    monkeypatch.setattr(opal_common_config, "HTTP_FETCHER_PROVIDER_CLIENT", client)
+    expected = {DATA_KEY: DATA_VALUE, "items": list(range(1000))}
+    async with FetchingEngine() as engine:
+        result = await engine.handle_url(
+            f"{BASE_URL}{COMPRESSED_DATA_ROUTE}",
+            config=HttpFetcherConfig(compression="auto", streaming=streaming),
+        )
+        if streaming:
+            try:
+                assert isinstance(result, SpooledDataStream)
+                assert await result.read_json() == expected
+            finally:
+                result.close()
+        else:
+            assert result == expected
+
+        # the negotiated content encodings are sent, unless given in the headers
+        headers = await engine.handle_url(f"{BASE_URL}{HEADERS_ROUTE}")
+        assert headers["accept-encoding"].startswith("gzip, deflate")
+        headers = await engine.handle_url(
+            f"{BASE_URL}{HEADERS_ROUTE}",
+            config=HttpFetcherConfig(headers={"accept-encoding": "identity"}),
+        )
+        assert headers["accept-encoding"] == "identity"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("client", ["aiohttp", "httpx"])
+async def test_paginated_http_get(server, monkeypatch, client):
+    """Test fetching a paginated data source follows the next page links while
+    its pages are iterated."""
+    monkeypatch.setattr(opal_common_config, "HTTP_FETCHER_PROVIDER_CLIENT", client)
+    async with FetchingEngine() as engine:
+        pages = await engine.handle_url(
+            f"{BASE_URL}{PAGED_DATA_ROUTE}", config=PaginatedFetcherConfig(prefetch=1)
+        )
+        try:
+            assert isinstance(pages, PaginatedFetchResult)
+            assert [items async for items in pages] == [[0, 1], [2, 3], [4, 5], [6, 7]]
+            assert pages.items == 8
+        finally:
+            await pages.aclose()
+
+        # the pages can only be consumed once, so identical fetches aren't shared
+        config = PaginatedFetcherConfig(max_pages=2)
+        results = await asyncio.gather(
+            engine.handle_url(f"{BASE_URL}{PAGED_DATA_ROUTE}", config=config),
+            engine.handle_url(f"{BASE_URL}{PAGED_DATA_ROUTE}", config=config),
+        )
+        assert results[0] is not results[1]
+        for pages in results:
+            try:
+                assert [items async for items in pages] == [[0, 1], [2, 3]]
+            finally:
+                await pages.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("client", ["aiohttp", "httpx"])
+async def test_pooled_http_get_reuses_connections(server, monkeypatch, client):
+    """Test fetches from the same origin reuse a pooled connection, while still
+    sending the headers of each fetch."""
+    monkeypatch.setattr(opal_common_config, "HTTP_FETCHER_PROVIDER_CLIENT", client)
+    async with FetchingEngine(worker_count=1) as engine:
+        results = [
+            await engine.handle_url(
+                f"{BASE_URL}{PEER_DATA_ROUTE}",
+                config=HttpFetcherConfig(headers={"X-TOKEN": f"token-{i}"}),
+            )
+            for i in range(3)
+        ]
+    assert [result["token"] for result in results] == [
+        "token-0",
+        "token-1",
+        "token-2",
+    ]
+    assert len({result["port"] for result in results}) == 1
+
+
+@pytest.mark.asyncio
+async def test_pooled_raw_responses_are_released(server, monkeypatch):
+    """Test raw (unprocessed) responses of a pooled session release their
+    connection, while their body can still be read."""
+    monkeypatch.setattr(opal_common_config, "HTTP_FETCHER_PROVIDER_CLIENT", "aiohttp")
+    async with FetchingEngine(worker_count=1) as engine:
+        responses = [
+            await engine.handle_url(
+                f"{BASE_URL}{PEER_DATA_ROUTE}",
+                config=HttpFetcherConfig(process_data=False),
+            )
+            for _ in range(2)
+        ]
+        for response in responses:
+            assert response.connection is None
+        ports = [(await response.json())["port"] for response in responses]
+    # the connection of the first response was reused by the second one
+    assert ports[0] == ports[1]
+
+
+@pytest.mark.asyncio
+async def test_streamed_responses_are_closed_unless_read(server, monkeypatch):
+    """Test streamed httpx responses whose body isn't read (error statuses, and
+    conditional fetches that weren't modified) are closed, releasing their
+    pooled connection."""
+    monkeypatch.setattr(opal_common_config, "HTTP_FETCHER_PROVIDER_CLIENT", "httpx")
+    monkeypatch.setattr(opal_common_config, "HTTP_FETCHER_POOL_CONNECTIONS", True)
+    responses = []
+    send = httpx.AsyncClient.send
+
+    async def recording_send(self, request, **kwargs):
+        response = await send(self, request, **kwargs)
+        responses.append(response)
+        return response
+
+    monkeypatch.setattr(httpx.AsyncClient, "send", recording_send)
+
+    async def fetch(url: str, config: HttpFetcherConfig):
+        provider = HttpFetchProvider(HttpFetchEvent(url=url, config=config))
+        provider.set_session_pool(session_pool)
+        provider.set_retry_config({"stop": stop_after_attempt(1), "reraise": True})
+        async with provider:
+            return await provider.process(await provider.fetch())
+
+    session_pool = HttpSessionPool()
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await fetch(
+                f"{BASE_URL}{AUTHORIZED_DATA_ROUTE}", HttpFetcherConfig(streaming=True)
+            )
+        result = await fetch(
+            f"{BASE_URL}{CONDITIONAL_DATA_ROUTE}",
+            HttpFetcherConfig(
+                streaming=True,
+                conditional=True,
+                validators=HttpCacheValidators(etag=DATA_ETAG),
+            ),
+        )
+        assert result.not_modified
+    finally:
+        await session_pool.close()
+    assert len(responses) == 2
+    assert all(response.is_closed for response in responses)
+
+
+@pytest.mark.asyncio
+async def test_identical_fetches_in_flight_are_collapsed(server):
+    """Test identical fetches requested while one is in flight share its
+    result, and that the result is reused for a while if a cache ttl is set."""
+    url = f"{BASE_URL}{COUNTED_DATA_ROUTE}"
+    async with FetchingEngine() as engine:
+        results = await asyncio.gather(
+            engine.handle_url(f"{url}?key=a"),
+            engine.handle_url(f"{url}?key=a"),
+            engine.handle_url(f"{url}?key=b"),
+        )
+        assert results[0] == results[1]
+        assert results[2]["count"] != results[0]["count"]
+
+        # the fetch is done, a new one is made
+        result = await engine.handle_url(f"{url}?key=a")
+        assert result["count"] > max(r["count"] for r in results)
+
+    async with FetchingEngine(result_cache_ttl=60) as engine:
+        first = await engine.handle_url(f"{url}?key=c")
+        assert await engine.handle_url(f"{url}?key=c") == first
+        # a different config is a different fetch
+        other = await engine.handle_url(
+            f"{url}?key=c", config=HttpFetcherConfig(headers={"X-TOKEN": "other"})
+        )
+        assert other["count"] > first["count"]
+
+
 @pytest.mark.flaky(reruns=1)
 @pytest.mark.asyncio
 async def test_external_http_get():
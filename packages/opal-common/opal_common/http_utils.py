@@ -1,4 +1,5 @@
 from typing import Union
+from urllib.parse import urlsplit
 
 import aiohttp
 import httpx
@@ -15,3 +16,15 @@ def is_http_error_response(
     )
 
     return status >= 400
+
+
+def get_url_origin(url: str) -> str:
+    """Returns the origin (scheme, host and port) of a url, e.g.
+    "https://example.com:443" (or the url itself, if it has no host)."""
+    parts = urlsplit(url)
+    if not parts.hostname:
+        return url
+    scheme = parts.scheme.lower()
+    port = parts.port or {"https": 443, "http": 80}.get(scheme)
+    origin = f"{scheme}://{parts.hostname.lower()}"
+    return f"{origin}:{port}" if port else origin
@@ -1,13 +1,48 @@
 import os
-from typing import Optional
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
 
 import datadog
 from loguru import logger
 
+# histogram buckets (upper bounds) of the stages of the data update pipeline
+DURATION_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+SIZE_BUCKETS = tuple(float(4**i * 1024) for i in range(10))  # 1KiB - 256MiB
+COUNT_BUCKETS = (1.0, 10.0, 100.0, 1000.0, 10000.0, 100000.0, 1000000.0)
+# max number of series (sets of tags) of an in-process histogram - observations
+# with further sets of tags are recorded in a single series, tagged "other"
+# (tags like the data source may have a value per tenant, or per fetched url)
+MAX_HISTOGRAM_SERIES = 100
+OTHER_TAG_VALUE = "other"
+
+# whether histograms are recorded in-process (see configure_metrics)
+_record_histograms = False
+
 
 def configure_metrics(
     enable_metrics: bool, statsd_host: str, statsd_port: int, namespace: str = ""
 ):
+    global _record_histograms
+    _record_histograms = enable_metrics
     if not enable_metrics:
         logger.info("DogStatsD metrics disabled")
         return
@@ -48,5 +83,127 @@ def gauge(metric: str, value: float, tags: Optional[dict[str, str]] = None):
     datadog.statsd.gauge(metric, value, tags=_format_tags(tags))
 
 
+class _Histogram:
+    """Cumulative observations of a histogram (with a given set of tags),
+    rendered by render_prometheus()."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+_TagsKey = Tuple[Tuple[str, str], ...]
+_histograms: Dict[str, Dict[_TagsKey, _Histogram]] = {}
+
+
+def histogram(
+    metric: str,
+    value: float,
+    tags: Optional[dict[str, str]] = None,
+    buckets: Sequence[float] = DURATION_BUCKETS,
+):
+    """Reports the value to statsd, and (if metrics are enabled) records it in
+    the in-process histogram of the metric (see render_prometheus).
+
+    A histogram holds up to MAX_HISTOGRAM_SERIES sets of tags, further
+    ones are recorded with all of their tag values replaced by
+    OTHER_TAG_VALUE.
+    """
+    datadog.statsd.histogram(metric, value, tags=_format_tags(tags))
+    if not _record_histograms:
+        return
+    by_tags = _histograms.setdefault(metric, {})
+    key = tuple(sorted((tags or {}).items()))
+    hist = by_tags.get(key)
+    if hist is None:
+        if len(by_tags) >= MAX_HISTOGRAM_SERIES:
+            key = tuple((name, OTHER_TAG_VALUE) for name, _ in key)
+            hist = by_tags.get(key)
+        if hist is None:
+            hist = by_tags[key] = _Histogram(buckets)
+    hist.observe(value)
+
+
+@contextmanager
+def timer(metric: str, tags: Optional[dict[str, str]] = None) -> Iterator[None]:
+    """Records the duration (in seconds) of the block as a histogram."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        histogram(metric, time.monotonic() - started, tags)
+
+
+def source_tag(url: Optional[str]) -> str:
+    """Returns the data source of a url as a tag value - without credentials,
+    query and fragment (which may hold secrets, or vary between
+    fetches)."""
+    if not url:
+        return "inline"
+    parts = urlsplit(url)
+    if not parts.hostname:
+        return url.split("?", 1)[0]
+    host = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+    return f"{parts.scheme}://{host}{parts.path}"
+
+
+def reset_histograms():
+    """Forgets the observations of all the in-process histograms."""
+    _histograms.clear()
+
+
+def _prometheus_name(metric: str) -> str:
+    return "opal_" + re.sub(r"[^a-zA-Z0-9_]", "_", metric)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            f'{re.sub(r"[^a-zA-Z0-9_]", "_", k)}="{_escape_label_value(str(v))}"'
+            for k, v in labels
+        )
+        + "}"
+    )
+
+
+def render_prometheus() -> str:
+    """Renders the in-process histograms in the Prometheus text exposition
+    format (version 0.0.4)."""
+    lines = []
+    for metric, by_tags in sorted(_histograms.items()):
+        name = _prometheus_name(metric)
+        lines.append(f"# TYPE {name} histogram")
+        for key, hist in sorted(by_tags.items()):
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                labels = _prometheus_labels([*key, ("le", repr(bound))])
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _prometheus_labels([*key, ("le", "+Inf")])
+            lines.append(f"{name}_bucket{labels} {hist.count}")
+            lines.append(f"{name}_sum{_prometheus_labels(list(key))} {hist.sum!r}")
+            lines.append(f"{name}_count{_prometheus_labels(list(key))} {hist.count}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
 def event(title: str, message: str, tags: Optional[dict[str, str]] = None):
     datadog.statsd.event(title=title, message=message, tags=_format_tags(tags))
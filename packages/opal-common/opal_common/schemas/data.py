@@ -53,6 +53,12 @@ class DataSourceEntry(BaseModel):
         description="Data payload to embed within the data update (instead of having "
         "the client fetch it from the url).",
     )
+    blob: Optional[str] = Field(
+        None,
+        description="Hash (hex SHA-256) of the data payload, if it's kept by the "
+        "server as a data blob (instead of being embedded within the data update) - "
+        "the client fetches it from the server at the url",
+    )
 
 
 class DataSourceEntryWithPollingInterval(DataSourceEntry):
@@ -171,6 +177,10 @@ class DataEntryReport(BaseModel):
     saved: Optional[bool] = False
     # Hash of the returned data
     hash: Optional[str] = None
+    # Id of the update the entry was coalesced into (merged into one of its entries)
+    coalesced_into: Optional[str] = None
+    # Root keys that failed to be saved (when splitting data written to the root path)
+    failed_keys: Optional[List[str]] = None
 
 
 class DataUpdateReport(BaseModel):
@@ -54,9 +54,11 @@ class JSONPatchAction(BaseModel):
         None, description="source location in json", alias="from"
     )
 
-    @root_validator
+    @root_validator(pre=True)
     def value_must_be_present(cls, values):
-        if values.get("op") in ["add", "replace"] and values.get("value") is None:
+        # the value may be null (e.g. adding a null item to an array), but must be given
+        op = values.get("op", cls.__fields__["op"].default)
+        if op in ["add", "replace"] and "value" not in values:
             raise TypeError("'value' must be present when op is either add or replace")
         return values
 
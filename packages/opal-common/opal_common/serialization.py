@@ -0,0 +1,112 @@
+"""JSON serialization of (potentially large) documents on OPAL's hot paths,
+e.g. data written to the policy store, backups and data update payloads.
+
+Uses orjson if it's installed (pip install orjson) - which is several times
+faster than the standard library's json module, and falls back to the
+standard library otherwise (see JSON_SERIALIZER).
+
+The output is compact JSON (no whitespace, non-ASCII characters are kept as
+UTF-8), and is not meant to be compared byte by byte with json.dumps() output:
+code hashing serialized data (e.g. DataUpdater.calc_hash) must keep using
+json.dumps() so its hashes don't change.
+
+NaN and (+/-) Infinity floats aren't valid JSON, and are serialized
+differently: orjson writes them as null, while the standard library writes
+them as NaN / Infinity literals (which JSON parsers, e.g. OPA's, reject).
+"""
+
+import json
+from typing import Any, Callable, Optional, Union
+
+from opal_common.config import opal_common_config
+from opal_common.logger import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _stdlib_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    return json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False)
+
+
+class JsonSerializer:
+    """Serializes with the standard library's json module."""
+
+    name = "json"
+
+    def dumps(self, obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+        return _stdlib_dumps(obj, default=default)
+
+    def dumps_bytes(
+        self, obj: Any, default: Optional[Callable[[Any], Any]] = None
+    ) -> bytes:
+        return _stdlib_dumps(obj, default=default).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer(JsonSerializer):
+    """Serializes with orjson, falling back to the standard library for objects
+    orjson can't serialize (e.g. integers larger than 64 bits).
+
+    Unlike the standard library, writes NaN and Infinity as null.
+    """
+
+    name = "orjson"
+
+    def dumps(self, obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+        return self.dumps_bytes(obj, default=default).decode("utf-8")
+
+    def dumps_bytes(
+        self, obj: Any, default: Optional[Callable[[Any], Any]] = None
+    ) -> bytes:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return _stdlib_dumps(obj, default=default).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        return orjson.loads(data)
+
+
+_serializer: Optional[JsonSerializer] = None
+
+
+def get_serializer() -> JsonSerializer:
+    """Returns the serializer selected by JSON_SERIALIZER."""
+    global _serializer
+    if _serializer is None:
+        choice = opal_common_config.JSON_SERIALIZER
+        if choice == "orjson" and orjson is None:
+            logger.warning(
+                "JSON_SERIALIZER is orjson, but orjson is not installed, "
+                "using the standard library's json module"
+            )
+        if choice in ("auto", "orjson") and orjson is not None:
+            _serializer = OrjsonSerializer()
+        else:
+            _serializer = JsonSerializer()
+    return _serializer
+
+
+def set_serializer(serializer: Optional[JsonSerializer]):
+    """Overrides the serializer (None resets to the one selected by
+    JSON_SERIALIZER)."""
+    global _serializer
+    _serializer = serializer
+
+
+def json_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    return get_serializer().dumps(obj, default=default)
+
+
+def json_dumps_bytes(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    return get_serializer().dumps_bytes(obj, default=default)
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    return get_serializer().loads(data)
@@ -1,32 +1,233 @@
 import asyncio
+import heapq
+import itertools
+import math
+import re
+from collections import deque
 from contextlib import asynccontextmanager
-from typing import Set
+from typing import Deque, Dict, List, Optional, Set, Tuple
 
 from loguru import logger
 
 
+class _Node:
+    __slots__ = (
+        "segment",
+        "parent",
+        "children",
+        "holder",
+        "held_in_subtree",
+        "waiters",
+        "waiting_in_subtree",
+        "waiting_children",
+        "subtree_seqs",
+    )
+
+    def __init__(self, segment: str = "", parent: Optional["_Node"] = None):
+        self.segment = segment
+        self.parent = parent
+        self.children: Dict[str, "_Node"] = {}
+        # the task holding the lock on exactly this path (if any)
+        self.holder: Optional[asyncio.Task] = None
+        # number of held paths in the subtree (including this node)
+        self.held_in_subtree = 0
+        # tasks waiting to lock exactly this path, in FIFO order
+        self.waiters: Deque["_Waiter"] = deque()
+        # number of waiters in the subtree (including this node)
+        self.waiting_in_subtree = 0
+        # the children with waiters in their subtree
+        self.waiting_children: Set["_Node"] = set()
+        # heap of the waiters in the subtree (lazily cleaned of dequeued waiters)
+        self.subtree_seqs: List[Tuple[int, "_Waiter"]] = []
+
+    def earliest_waiting_seq(self) -> float:
+        """The seq of the earliest waiter in the subtree (inf if none)."""
+        while self.subtree_seqs and not self.subtree_seqs[0][1].waiting:
+            heapq.heappop(self.subtree_seqs)
+        return self.subtree_seqs[0][0] if self.subtree_seqs else math.inf
+
+    def ancestors(self) -> List["_Node"]:
+        """This node and its ancestors, from this node up to the root."""
+        nodes = []
+        node = self
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        return nodes
+
+
+class _Waiter:
+    __slots__ = ("seq", "task", "path", "node", "future", "waiting")
+
+    def __init__(self, seq: int, task: asyncio.Task, path: str, node: _Node):
+        self.seq = seq
+        self.task = task
+        self.path = path
+        self.node = node
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.waiting = False
+
+
 class HierarchicalLock:
     """A hierarchical lock for asyncio.
 
     - If a path is locked, no ancestor or descendant path can be locked.
     - Conversely, if a child path is locked, the parent path cannot be locked
       until all child paths are released.
+
+    Paths are split to segments (by '/' and '.', so that both "a/b" and "a.b"
+    are children of "a" - but "a2" is not; note that "a.b" and "a/b" are
+    thus the same path) and kept in a trie, in which each
+    node counts the locks held (and tasks waiting) in its subtree. Checking
+    whether a path can be locked is thus O(depth of path), regardless of the
+    number of held locks.
+
+    Tasks waiting for a path are queued on the path's node, and a path
+    can't be locked while an earlier waiter for a conflicting path is still
+    waiting - so parents aren't starved by a stream of children (and vice
+    versa). A release only wakes the waiters that can proceed.
     """
 
-    def __init__(self):
-        # locked_paths: set of currently locked string paths
-        self._locked_paths: Set[str] = set()
-        # Map of tasks to their acquired locks for re-entrant protection
-        self._task_locks: dict[asyncio.Task, Set[str]] = {}
-        # Internal lock for synchronizing access to locked_paths
-        self._lock = asyncio.Lock()
-        # Condition to wake up tasks when a path is released
-        self._cond = asyncio.Condition(self._lock)
+    def __init__(self, separators: str = "/."):
+        self._separators = re.compile(f"[{re.escape(separators)}]")
+        self._root = _Node()
+        self._seq = itertools.count()
+        # Map of tasks to their acquired locks (as path segments, so different
+        # spellings of a path match) for re-entrant protection
+        self._task_locks: Dict[asyncio.Task, Set[Tuple[str, ...]]] = {}
+
+    def _split(self, path: str) -> List[str]:
+        return [segment for segment in self._separators.split(path) if segment]
+
+    def _key(self, path: str) -> Tuple[str, ...]:
+        return tuple(self._split(path))
+
+    def _find_node(self, path: str) -> Optional[_Node]:
+        node = self._root
+        for segment in self._split(path):
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def _get_node(self, path: str) -> _Node:
+        node = self._root
+        for segment in self._split(path):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _Node(segment, node)
+            node = child
+        return node
 
     @staticmethod
-    def _is_conflicting(p1: str, p2: str) -> bool:
-        """Check if two paths conflict with each other."""
-        return p1 == p2 or p1.startswith(p2) or p2.startswith(p1)
+    def _prune(node: _Node):
+        """Removes the node (and its ancestors) from the trie if unused."""
+        while (
+            node.parent is not None
+            and node.held_in_subtree == 0
+            and node.waiting_in_subtree == 0
+            and not node.children
+        ):
+            del node.parent.children[node.segment]
+            node = node.parent
+
+    @staticmethod
+    def _can_lock(node: _Node, seq: Optional[int] = None) -> bool:
+        """Checks the path of the node is not held (nor any of its ancestors or
+        descendants), and that no earlier waiter is waiting for the path or one
+        of its ancestors.
+
+        (an earlier waiter still waiting for a descendant, must be
+        blocked by a held path which also conflicts with this one)
+        """
+        if node.held_in_subtree:
+            return False
+        for ancestor in node.ancestors():
+            if ancestor.holder is not None:
+                return False
+            if ancestor.waiters and (seq is None or ancestor.waiters[0].seq < seq):
+                return False
+        return True
+
+    @staticmethod
+    def _hold(node: _Node, task: asyncio.Task):
+        node.holder = task
+        for ancestor in node.ancestors():
+            ancestor.held_in_subtree += 1
+
+    @staticmethod
+    def _enqueue(node: _Node, waiter: _Waiter):
+        waiter.waiting = True
+        node.waiters.append(waiter)
+        for ancestor in node.ancestors():
+            ancestor.waiting_in_subtree += 1
+            heapq.heappush(ancestor.subtree_seqs, (waiter.seq, waiter))
+            if ancestor.waiting_in_subtree == 1 and ancestor.parent is not None:
+                ancestor.parent.waiting_children.add(ancestor)
+
+    @staticmethod
+    def _dequeue(node: _Node, waiter: _Waiter):
+        waiter.waiting = False
+        node.waiters.remove(waiter)
+        for ancestor in node.ancestors():
+            ancestor.waiting_in_subtree -= 1
+            if ancestor.waiting_in_subtree == 0:
+                # drops the stale heap entries that were never popped
+                ancestor.subtree_seqs.clear()
+                if ancestor.parent is not None:
+                    ancestor.parent.waiting_children.discard(ancestor)
+
+    def _wake_waiters(self, node: _Node):
+        """Grants the lock (in FIFO order) to the waiters that can proceed.
+
+        Only waiters that may have been blocked by the node's path are
+        considered, i.e: waiting for the path, its ancestors or its
+        descendants.
+        """
+        # Only the first waiter of each node may proceed, and only if no earlier
+        # waiter waits for an ancestor - so subtrees in which all waiters came
+        # after such a waiter aren't even visited.
+        candidates: List[_Waiter] = []
+        limit = math.inf
+        for ancestor in reversed(node.ancestors()[1:]):
+            if ancestor.waiters and ancestor.waiters[0].seq < limit:
+                candidates.append(ancestor.waiters[0])
+                limit = ancestor.waiters[0].seq
+
+        stack = [(node, limit)]
+        while stack:
+            descendant, limit = stack.pop()
+            if descendant.earliest_waiting_seq() >= limit:
+                continue
+            if descendant.waiters and descendant.waiters[0].seq < limit:
+                candidates.append(descendant.waiters[0])
+                limit = descendant.waiters[0].seq
+            stack.extend((child, limit) for child in descendant.waiting_children)
+
+        for waiter in sorted(candidates, key=lambda waiter: waiter.seq):
+            if waiter.future.done():
+                # a cancelled waiter dequeues itself once its task resumes
+                continue
+            if not self._can_lock(waiter.node, waiter.seq):
+                continue
+            self._dequeue(waiter.node, waiter)
+            self._hold(waiter.node, waiter.task)
+            self._task_locks.setdefault(waiter.task, set()).add(self._key(waiter.path))
+            waiter.future.set_result(None)
+            logger.debug("Acquired lock for path: {}", waiter.path)
+
+    def _release(self, path: str, task: asyncio.Task):
+        node = self._find_node(path)
+        node.holder = None
+        for ancestor in node.ancestors():
+            ancestor.held_in_subtree -= 1
+        self._task_locks[task].remove(self._key(path))
+        if not self._task_locks[task]:
+            del self._task_locks[task]
+
+        self._wake_waiters(node)
+        self._prune(node)
+        logger.debug("Released lock for path: {}", path)
 
     async def acquire(self, path: str):
         """Acquire the lock for the given hierarchical path.
@@ -38,25 +239,32 @@ class HierarchicalLock:
         if task is None:
             raise RuntimeError("acquire() must be called from within a task.")
 
-        async with self._lock:
-            # Prevent re-entrant locking by the same task
-            if path in self._task_locks.get(task, set()):
-                raise RuntimeError(f"Task {task} cannot re-acquire lock on '{path}'.")
-
-            # Wait until there is no conflict with existing locked paths
-            while any(self._is_conflicting(path, lp) for lp in self._locked_paths):
-                logger.debug(
-                    f"Found conflicting path with {path!r}, waiting for release to check again..."
-                )
-                # Condition.wait() releases the lock and waits for notify_all()
-                await self._cond.wait()
-
-            # Acquire the path
-            self._locked_paths.add(path)
-            if task not in self._task_locks:
-                self._task_locks[task] = set()
-            self._task_locks[task].add(path)
+        # Prevent re-entrant locking by the same task
+        if self._key(path) in self._task_locks.get(task, set()):
+            raise RuntimeError(f"Task {task} cannot re-acquire lock on '{path}'.")
+
+        node = self._get_node(path)
+        if self._can_lock(node):
+            self._hold(node, task)
+            self._task_locks.setdefault(task, set()).add(self._key(path))
             logger.debug("Acquired lock for path: {}", path)
+            return
+
+        logger.debug(f"Found conflicting path with {path!r}, waiting for release...")
+        waiter = _Waiter(next(self._seq), task, path, node)
+        self._enqueue(node, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # the lock was granted right before we were cancelled
+                self._release(path, task)
+            else:
+                self._dequeue(node, waiter)
+                # waiters queued behind us might be able to proceed now
+                self._wake_waiters(node)
+                self._prune(node)
+            raise
 
     async def release(self, path: str):
         """Release the lock for the given path and notify waiting tasks."""
@@ -64,24 +272,16 @@ class HierarchicalLock:
         if task is None:
             raise RuntimeError("release() must be called from within a task.")
 
-        async with self._lock:
-            if path not in self._locked_paths:
-                raise RuntimeError(f"Cannot release path '{path}' that is not locked.")
-
-            if path not in self._task_locks.get(task, set()):
-                raise RuntimeError(
-                    f"Task {task} cannot release lock on '{path}' it does not hold."
-                )
+        node = self._find_node(path)
+        if node is None or node.holder is None:
+            raise RuntimeError(f"Cannot release path '{path}' that is not locked.")
 
-            # Remove the path from locked paths and task locks
-            self._locked_paths.remove(path)
-            self._task_locks[task].remove(path)
-            if not self._task_locks[task]:
-                del self._task_locks[task]
+        if self._key(path) not in self._task_locks.get(task, set()):
+            raise RuntimeError(
+                f"Task {task} cannot release lock on '{path}' it does not hold."
+            )
 
-            # Notify all tasks that something was released
-            self._cond.notify_all()
-            logger.debug("Released lock for path: {}", path)
+        self._release(path, task)
 
     @asynccontextmanager
     async def lock(self, path: str) -> "HierarchicalLock":
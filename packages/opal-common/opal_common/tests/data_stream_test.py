@@ -0,0 +1,37 @@
+import hashlib
+import os
+import sys
+
+import pytest
+
+# Add parent path to use local src as package for tests
+root_dir = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir)
+)
+sys.path.append(root_dir)
+
+from opal_common.fetcher.data_stream import SpooledDataStream
+
+
+@pytest.mark.asyncio
+async def test_spooled_data_stream_rolls_over_to_disk():
+    payload = b'{"users": [' + b",".join([b'"user"'] * 1000) + b"]}"
+    stream = SpooledDataStream(max_memory_size=1024)
+    try:
+        for i in range(0, len(payload), 100):
+            await stream.write(payload[i : i + 100])
+        assert stream.size == len(payload)
+        assert stream.hash == hashlib.sha256(payload).hexdigest()
+        # larger than max_memory_size, so kept in a file on disk
+        assert stream._file._rolled
+
+        # can be read more than once (e.g. when a request is retried)
+        for _ in range(2):
+            chunks = [chunk async for chunk in stream.iter_chunks(512)]
+            assert max(len(chunk) for chunk in chunks) == 512
+            assert b"".join(chunks) == payload
+        assert await stream.read() == payload
+        assert (await stream.read_json())["users"] == ["user"] * 1000
+    finally:
+        stream.close()
+    assert stream.closed
@@ -233,3 +233,132 @@ async def test_same_task_reacquire_same_key_deadlock():
         same_task(),
         timeout=10,
     )
+
+
+@pytest.mark.asyncio
+async def test_same_task_reacquire_differently_spelled_path():
+    """'a.b' and 'a/b' are the same path, so re-acquiring it raises too (rather
+    than deadlocking)."""
+    lock = HierarchicalLock()
+
+    async def same_task():
+        await lock.acquire("a.b")
+        with pytest.raises(RuntimeError):
+            await lock.acquire("a/b")
+        await lock.release("a/b")
+        assert not lock._task_locks
+
+    await asyncio.wait_for(same_task(), timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_sibling_prefixes_do_not_block():
+    lock = HierarchicalLock()
+
+    async def lock_sibling_prefix():
+        async with lock.lock("/users2"):
+            pass
+
+    async with lock.lock("/users"):
+        # "/users2" shares a prefix with "/users", but isn't its descendant
+        await asyncio.wait_for(lock_sibling_prefix(), timeout=1)
+
+        acquire_child = asyncio.create_task(lock.acquire("/users/alice"))
+        await asyncio.sleep(0.05)
+        assert not acquire_child.done(), "Child should be blocked by parent"
+    await asyncio.wait_for(acquire_child, timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_dotted_paths_are_split_to_segments():
+    lock = HierarchicalLock()
+
+    async def lock_and_release(path: str):
+        async with lock.lock(path):
+            pass
+
+    async def is_blocked(path: str) -> bool:
+        locker = asyncio.create_task(lock_and_release(path))
+        await asyncio.sleep(0.05)
+        if locker.done():
+            return False
+        locker.cancel()
+        await asyncio.gather(locker, return_exceptions=True)
+        return True
+
+    async with lock.lock("a.b"):
+        # "." separates segments like "/" does - so "a.b" is a child of "a",
+        # and the same path as "a/b" (the two are never mixed in practice)
+        assert await is_blocked("a")
+        assert await is_blocked("a/b")
+        assert await is_blocked("a.b.c")
+        assert not await is_blocked("a2")
+        assert not await is_blocked("a.b2")
+
+
+@pytest.mark.asyncio
+async def test_waiters_acquire_in_fifo_order():
+    lock = HierarchicalLock()
+    order = []
+
+    async def locker(path: str, hold: float = 0.05):
+        async with lock.lock(path):
+            order.append(path)
+            await asyncio.sleep(hold)
+
+    first_child = asyncio.create_task(locker("alice/age"))
+    await asyncio.sleep(0.01)
+    parent = asyncio.create_task(locker("alice"))
+    await asyncio.sleep(0.01)
+    # not blocked by the held child, but by the parent waiting before it
+    late_child = asyncio.create_task(locker("alice/name"))
+    unrelated = asyncio.create_task(locker("bob"))
+
+    await asyncio.gather(first_child, parent, late_child, unrelated)
+    assert order == ["alice/age", "bob", "alice", "alice/name"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_block_others():
+    lock = HierarchicalLock()
+
+    await lock.acquire("alice/age")
+    parent = asyncio.create_task(lock.acquire("alice"))
+    await asyncio.sleep(0.01)
+    sibling = asyncio.create_task(lock.acquire("alice/name"))
+    await asyncio.sleep(0.01)
+    assert not sibling.done(), "Sibling should wait behind the waiting parent"
+
+    parent.cancel()
+    await asyncio.wait_for(sibling, timeout=1)
+
+    # the sibling lock is held by the sibling task, not by us
+    with pytest.raises(RuntimeError):
+        await lock.release("alice/name")
+    await lock.release("alice/age")
+
+
+@pytest.mark.asyncio
+async def test_many_concurrent_locks_never_conflict():
+    lock = HierarchicalLock()
+    held = set()
+
+    def conflicts(p1: str, p2: str) -> bool:
+        s1, s2 = p1.split("/"), p2.split("/")
+        shorter = min(len(s1), len(s2))
+        return s1[:shorter] == s2[:shorter]
+
+    async def locker(path: str):
+        async with lock.lock(path):
+            assert not any(conflicts(path, other) for other in held)
+            held.add(path)
+            await asyncio.sleep(0)
+            held.remove(path)
+
+    paths = [f"t{i % 7}/u{i % 31}/k{i % 3}"[: 3 + (i % 9)] for i in range(3000)]
+    await asyncio.wait_for(
+        asyncio.gather(*(locker(path) for path in paths)), timeout=30
+    )
+    assert not held
+    # all the nodes were pruned
+    assert not lock._root.children
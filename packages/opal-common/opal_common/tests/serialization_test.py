@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add parent path to use local src as package for tests
+root_dir = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir)
+)
+sys.path.append(root_dir)
+
+from opal_common.serialization import (
+    JsonSerializer,
+    OrjsonSerializer,
+    get_serializer,
+    orjson,
+    set_serializer,
+)
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+
+SERIALIZERS = [JsonSerializer()]
+if orjson is not None:
+    SERIALIZERS.append(OrjsonSerializer())
+
+
+class Item(BaseModel):
+    name: str
+
+
+DOCUMENT = {
+    "users": [{"name": "ünïcode", "age": 42, "score": 1.5, "admin": None}],
+    "flags": [True, False],
+    "nested": {"a": {"b": {"c": []}}},
+}
+
+
+@pytest.mark.parametrize("serializer", SERIALIZERS, ids=lambda s: s.name)
+def test_serializers_roundtrip_identical_documents(serializer: JsonSerializer):
+    dumped = serializer.dumps(DOCUMENT)
+    assert isinstance(dumped, str)
+    assert serializer.loads(dumped) == DOCUMENT
+    assert serializer.loads(serializer.dumps_bytes(DOCUMENT)) == DOCUMENT
+    # the output of all serializers is the same compact JSON
+    assert dumped == json.dumps(DOCUMENT, separators=(",", ":"), ensure_ascii=False)
+
+
+@pytest.mark.parametrize("serializer", SERIALIZERS, ids=lambda s: s.name)
+def test_serializers_handle_what_stdlib_json_does(serializer: JsonSerializer):
+    assert serializer.loads(serializer.dumps({1: "int key"})) == {"1": "int key"}
+    assert serializer.loads(serializer.dumps([2**70])) == [2**70]
+    assert serializer.loads(
+        serializer.dumps({"item": Item(name="x")}, default=pydantic_encoder)
+    ) == {"item": {"name": "x"}}
+    with pytest.raises(json.JSONDecodeError):
+        serializer.loads("{not json")
+
+
+@pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+def test_serializers_differ_on_nan_and_infinity():
+    document = [float("nan"), float("inf"), -float("inf")]
+    assert JsonSerializer().dumps(document) == "[NaN,Infinity,-Infinity]"
+    assert OrjsonSerializer().dumps(document) == "[null,null,null]"
+
+
+def test_serializer_can_be_overridden():
+    try:
+        set_serializer(JsonSerializer())
+        assert get_serializer().name == "json"
+    finally:
+        set_serializer(None)
+    assert get_serializer().name == ("orjson" if orjson is not None else "json")
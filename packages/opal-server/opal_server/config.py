@@ -322,6 +322,32 @@ class OpalServerConfig(Confi):
         description="URL to trigger data update events",
     )
 
+    DATA_BLOB_THRESHOLD = confi.int(
+        "DATA_BLOB_THRESHOLD",
+        0,
+        description="Inline data (of data update entries) larger than this many bytes "
+        "is kept by the server, and published by its hash instead - clients fetch it "
+        "(once) from the server's data blobs route. 0 disables it (requires clients "
+        "that support data blobs)",
+    )
+    DATA_BLOBS_ROUTE = confi.str(
+        "DATA_BLOBS_ROUTE",
+        "/data/blobs",
+        description="The route clients fetch data blobs from (by their hash)",
+    )
+    DATA_BLOBS_DIR = confi.str(
+        "DATA_BLOBS_DIR",
+        confi.delay("{BASE_DIR}/data_blobs"),
+        description="Directory of the data blobs, must be shared by all the workers "
+        "(and replicas) of the server",
+    )
+    DATA_BLOBS_TTL = confi.int(
+        "DATA_BLOBS_TTL",
+        3600,
+        description="Seconds a data blob is kept (and cached by clients) after it "
+        "was last published",
+    )
+
     # Git service webhook (Default is Github)
     POLICY_REPO_WEBHOOK_SECRET = confi.str(
         "POLICY_REPO_WEBHOOK_SECRET",
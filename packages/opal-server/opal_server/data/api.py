@@ -1,9 +1,10 @@
 from typing import Optional
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import FileResponse, RedirectResponse
 from opal_common.authentication.authz import (
     require_peer_type,
+    require_permitted_topic,
     restrict_optional_topics_to_publish,
 )
 from opal_common.authentication.deps import JWTAuthenticator, get_token_from_header
@@ -19,6 +20,7 @@ from opal_common.schemas.data import (
 from opal_common.schemas.security import PeerType
 from opal_common.urls import set_url_query_param
 from opal_server.config import opal_server_config
+from opal_server.data.blob_store import DataBlobStore
 from opal_server.data.data_update_publisher import DataUpdatePublisher
 
 
@@ -26,6 +28,7 @@ def init_data_updates_router(
     data_update_publisher: DataUpdatePublisher,
     data_sources_config: ServerDataSourceConfig,
     authenticator: JWTAuthenticator,
+    blob_store: Optional[DataBlobStore] = None,
 ):
     router = APIRouter()
 
@@ -131,4 +134,51 @@ def init_data_updates_router(
         await data_update_publisher.publish_data_updates(update)
         return {"status": "ok"}
 
+    if blob_store is not None:
+
+        @router.get(
+            f"{opal_server_config.DATA_BLOBS_ROUTE}/{{blob_hash}}",
+            responses={
+                304: {"description": "The client's cached copy of the blob is valid"},
+                404: {"description": "No such blob (or it expired)"},
+            },
+        )
+        async def get_data_blob(
+            blob_hash: str,
+            if_none_match: Optional[str] = Header(None),
+            claims: JWTClaims = Depends(authenticator),
+        ):
+            """Serves the data payload of a data update, published by its hash
+            (see DATA_BLOB_THRESHOLD).
+
+            Blobs are immutable (addressed by the hash of their content),
+            so clients may cache them for as long as they're kept. A
+            client whose token restricts its topics (permitted_topics)
+            only gets the blobs published to one of them - as it would
+            have got their data inline.
+            """
+            max_age = opal_server_config.DATA_BLOBS_TTL
+            headers = {
+                "ETag": f'"{blob_hash}"',
+                "Cache-Control": f"private, max-age={max_age}, immutable",
+            }
+            path = blob_store.path(blob_hash)
+            if path is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Data blob not found: {blob_hash}",
+                )
+            try:
+                require_permitted_topic(
+                    authenticator, claims, blob_store.topics(blob_hash)
+                )  # may throw Unauthorized
+            except Unauthorized as e:
+                logger.error(f"Unauthorized to fetch data blob: {repr(e)}")
+                raise
+            if if_none_match is not None and blob_hash in if_none_match:
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+                )
+            return FileResponse(path, media_type="application/json", headers=headers)
+
     return router
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Iterable, Optional, Set, Union
+
+from opal_common.async_utils import run_sync
+from opal_common.logger import logger
+
+_BLOB_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+
+class DataBlobStore:
+    """Keeps the (large) inline data of data updates by their hash, so the data
+    updates can be published with the hash instead of the data.
+
+    Clients then fetch the data once from the server (see
+    DATA_BLOB_THRESHOLD). Blobs are addressed by the hex SHA-256 of
+    their content.
+
+    Blobs are kept as files in a directory, which must be shared by all
+    the workers (and replicas) of the server - a client may fetch a blob
+    from another worker than the one that published its update. Blobs
+    are removed once they weren't published for a while (see
+    DATA_BLOBS_TTL).
+
+    The topics each blob was published to are kept next to it (as
+    <hash>.topics), so a client only fetches the blobs of topics it may
+    subscribe to.
+    """
+
+    # at most once in this many seconds, blobs whose ttl expired are removed
+    CLEANUP_INTERVAL = 60
+
+    def __init__(self, directory: str, ttl: float):
+        self._directory = directory
+        self._ttl = ttl
+        self._last_cleanup = 0.0
+        os.makedirs(self._directory, exist_ok=True)
+
+    @staticmethod
+    def is_valid_hash(blob_hash: str) -> bool:
+        return _BLOB_HASH.match(blob_hash) is not None
+
+    def path(self, blob_hash: str) -> Optional[str]:
+        """Returns the path of the file of the blob, or None if there's no such
+        blob."""
+        if not self.is_valid_hash(blob_hash):
+            return None
+        path = os.path.join(self._directory, blob_hash)
+        return path if os.path.isfile(path) else None
+
+    def topics(self, blob_hash: str) -> Set[str]:
+        """Returns the topics the blob was published to (none if there's no
+        such blob)."""
+        if not self.is_valid_hash(blob_hash):
+            return set()
+        try:
+            with open(self._topics_path(blob_hash)) as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    async def put(self, data: bytes, topics: Iterable[str] = ()) -> str:
+        """Keeps the data (published to the given topics), returns its hash."""
+        blob_hash = hashlib.sha256(data).hexdigest()
+        await run_sync(self._write, blob_hash, data, set(topics))
+        if time.time() - self._last_cleanup > self.CLEANUP_INTERVAL:
+            self._last_cleanup = time.time()
+            await run_sync(self._remove_expired)
+        return blob_hash
+
+    def _topics_path(self, blob_hash: str) -> str:
+        return os.path.join(self._directory, f"{blob_hash}.topics")
+
+    def _write(self, blob_hash: str, data: bytes, topics: Set[str]):
+        # the same data may be published to other topics, that may fetch it as well
+        topics = topics | self.topics(blob_hash)
+        self._write_file(self._topics_path(blob_hash), json.dumps(sorted(topics)))
+        path = os.path.join(self._directory, blob_hash)
+        if os.path.isfile(path):
+            # published again - keep it for another ttl
+            os.utime(path)
+            return
+        self._write_file(path, data)
+
+    def _write_file(self, path: str, data: Union[bytes, str]):
+        # written under a temporary name, so other workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except:
+            os.unlink(tmp_path)
+            raise
+
+    def _remove_expired(self):
+        expired_before = time.time() - self._ttl
+        for entry in os.scandir(self._directory):
+            try:
+                if entry.stat().st_mtime < expired_before:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                # removed by another worker
+                pass
+            except OSError as e:
+                logger.warning(
+                    "Failed to remove expired data blob {path}: {err}",
+                    path=entry.path,
+                    err=repr(e),
+                )
@@ -1,23 +1,44 @@
 import asyncio
 import os
-from typing import List
+from typing import List, Optional
 
+from fastapi.encoders import jsonable_encoder
 from fastapi_utils.tasks import repeat_every
 from opal_common.logger import logger
+from opal_common.monitoring import metrics
 from opal_common.schemas.data import (
+    DataSourceEntry,
     DataSourceEntryWithPollingInterval,
     DataUpdate,
     ServerDataSourceConfig,
 )
+from opal_common.serialization import json_dumps_bytes
 from opal_common.topics.publisher import TopicPublisher
+from opal_server.config import opal_server_config
+from opal_server.data.blob_store import DataBlobStore
 
 TOPIC_DELIMITER = "/"
 PREFIX_DELIMITER = ":"
 
 
 class DataUpdatePublisher:
-    def __init__(self, publisher: TopicPublisher) -> None:
+    def __init__(
+        self,
+        publisher: TopicPublisher,
+        blob_store: Optional[DataBlobStore] = None,
+        blob_threshold: int = 0,
+    ) -> None:
+        """
+        Args:
+            publisher (TopicPublisher): publishes the data updates to the clients
+            blob_store (DataBlobStore, optional): if given, inline data larger than
+                blob_threshold bytes is kept in it, and published by its hash instead
+                (the clients fetch it from the server's data blobs route)
+            blob_threshold (int): see blob_store
+        """
         self._publisher = publisher
+        self._blob_store = blob_store
+        self._blob_threshold = blob_threshold
 
     @staticmethod
     def get_topic_combos(topic: str) -> List[str]:
@@ -72,17 +93,11 @@ class DataUpdatePublisher:
         """
         all_topic_combos = set()
 
-        # a nicer format of entries to the log
-        logged_entries = [
-            dict(
-                url=entry.url,
-                method=entry.save_method,
-                path=entry.dst_path or "/",
-                inline_data=(entry.data is not None),
-                topics=entry.topics,
-            )
-            for entry in update.entries
-        ]
+        # the entries are changed below (expanded topics, data published as blobs),
+        # copied so the caller's update is left as is
+        update = update.copy(
+            update={"entries": [entry.copy() for entry in update.entries]}
+        )
 
         # Expand the topics for each event to include sub topic combos (e.g. publish 'a/b/c' as 'a' , 'a/b', and 'a/b/c')
         for entry in update.entries:
@@ -99,6 +114,23 @@ class DataUpdatePublisher:
                     entry=entry,
                 )
 
+        if self._blob_store is not None and self._blob_threshold > 0:
+            for entry in update.entries:
+                await self._publish_as_blob(entry)
+
+        # a nicer format of entries to the log
+        logged_entries = [
+            dict(
+                url=entry.url,
+                method=entry.save_method,
+                path=entry.dst_path or "/",
+                inline_data=(entry.data is not None),
+                blob=entry.blob,
+                topics=entry.topics,
+            )
+            for entry in update.entries
+        ]
+
         # publish all topics with all their sub combinations
         logger.info(
             "[{pid}] Publishing data update to topics: {topics}, reason: {reason}, entries: {entries}",
@@ -111,3 +143,25 @@ class DataUpdatePublisher:
         await self._publisher.publish(
             list(all_topic_combos), update.dict(by_alias=True)
         )
+
+    async def _publish_as_blob(self, entry: DataSourceEntry):
+        """If the inline data of the entry is larger than the blob threshold,
+        keeps it in the blob store and replaces it with its hash (and the url
+        of the blob on this server).
+
+        Only clients that may subscribe to (one of) the topics of the
+        entry may fetch the blob (see DataBlobStore.topics).
+        """
+        if entry.data is None:
+            return
+        # the client streams the blob to the policy store as is, so it's serialized
+        # like the client serializes inline data (dropping null fields)
+        data = json_dumps_bytes(jsonable_encoder(entry.data, exclude_none=True))
+        if len(data) <= self._blob_threshold:
+            return
+        entry.blob = await self._blob_store.put(data, entry.topics or [])
+        entry.url = f"{opal_server_config.DATA_BLOBS_ROUTE}/{entry.blob}"
+        entry.data = None
+        metrics.histogram(
+            "data_update_publisher.blob_bytes", len(data), buckets=metrics.SIZE_BUCKETS
+        )
@@ -1,3 +1,18 @@
+import hashlib
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from opal_common.schemas.data import (
+    DataSourceConfig,
+    DataSourceEntry,
+    DataUpdate,
+    ServerDataSourceConfig,
+)
+from opal_server.config import opal_server_config
+from opal_server.data.api import init_data_updates_router
+from opal_server.data.blob_store import DataBlobStore
 from opal_server.data.data_update_publisher import DataUpdatePublisher
 
 
@@ -7,3 +22,108 @@ def test_topic_combos():
     assert set(get_topic_combos("a/b/c")) == {"a", "a/b", "a/b/c"}
     assert set(get_topic_combos("x:a/b/c")) == {"x:a", "x:a/b", "x:a/b/c"}
     assert set(get_topic_combos("x:y:a/b/c")) == {"x:y:a", "x:y:a/b", "x:y:a/b/c"}
+
+
+class StubAuthenticator:
+    enabled = True
+
+    def __init__(self, claims: dict):
+        self.claims = claims
+
+    def __call__(self) -> dict:
+        return self.claims
+
+
+def create_data_blobs_client(
+    data_update_publisher: DataUpdatePublisher, blob_store: DataBlobStore, claims: dict
+) -> TestClient:
+    app = FastAPI()
+    app.include_router(
+        init_data_updates_router(
+            data_update_publisher,
+            ServerDataSourceConfig(config=DataSourceConfig(entries=[])),
+            StubAuthenticator(claims),
+            blob_store=blob_store,
+        )
+    )
+    return TestClient(app)
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, topics, data=None):
+        self.published.append((topics, data))
+
+
+@pytest.mark.asyncio
+async def test_large_inline_data_is_published_as_blob(tmp_path):
+    publisher = RecordingPublisher()
+    blob_store = DataBlobStore(str(tmp_path), ttl=60)
+    data_update_publisher = DataUpdatePublisher(
+        publisher, blob_store=blob_store, blob_threshold=64
+    )
+    large_data = {"users": [{"id": i} for i in range(20)]}
+    update = DataUpdate(
+        entries=[
+            DataSourceEntry(url="", data={"small": True}, topics=["users"]),
+            DataSourceEntry(url="", data=large_data, topics=["users"]),
+        ]
+    )
+    await data_update_publisher.publish_data_updates(update)
+
+    _, published = publisher.published[0]
+    small, large = published["entries"]
+    assert small["data"] == {"small": True} and small["blob"] is None
+    assert large["data"] is None
+    assert large["url"] == f"{opal_server_config.DATA_BLOBS_ROUTE}/{large['blob']}"
+    with open(blob_store.path(large["blob"]), "rb") as f:
+        blob = f.read()
+    assert hashlib.sha256(blob).hexdigest() == large["blob"]
+    assert json.loads(blob) == large_data
+    # the published update is a copy, the given one is left as is
+    assert update.entries[1].data == large_data and update.entries[1].blob is None
+
+    # the route serves the blob, cacheable by its hash
+    client = create_data_blobs_client(data_update_publisher, blob_store, {})
+    res = client.get(large["url"])
+    assert res.status_code == 200
+    assert res.json() == large_data
+    assert "immutable" in res.headers["cache-control"]
+    res = client.get(large["url"], headers={"If-None-Match": res.headers["etag"]})
+    assert res.status_code == 304
+    assert client.get(f"{opal_server_config.DATA_BLOBS_ROUTE}/abc").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_data_blobs_are_scoped_by_topics(tmp_path):
+    blob_store = DataBlobStore(str(tmp_path), ttl=60)
+    data_update_publisher = DataUpdatePublisher(
+        RecordingPublisher(), blob_store=blob_store, blob_threshold=1
+    )
+    update = DataUpdate(
+        entries=[DataSourceEntry(url="", data={"a": 1}, topics=["tenants/acme"])]
+    )
+    await data_update_publisher.publish_data_updates(update)
+    blob_hash = hashlib.sha256(b'{"a":1}').hexdigest()
+    assert blob_store.topics(blob_hash) == {"tenants", "tenants/acme"}
+    url = f"{opal_server_config.DATA_BLOBS_ROUTE}/{blob_hash}"
+
+    # only clients permitted to subscribe to one of the update's topics get the blob
+    for claims, status_code in [
+        ({}, 200),
+        ({"permitted_topics": ["tenants/acme"]}, 200),
+        ({"permitted_topics": ["tenants"]}, 200),
+        ({"permitted_topics": ["tenants/other"]}, 401),
+    ]:
+        client = create_data_blobs_client(data_update_publisher, blob_store, claims)
+        assert client.get(url).status_code == status_code
+
+    # publishing the same data to another topic permits its subscribers as well
+    update.entries[0].topics = ["tenants/other"]
+    await data_update_publisher.publish_data_updates(update)
+    client = create_data_blobs_client(
+        data_update_publisher, blob_store, {"permitted_topics": ["tenants/other"]}
+    )
+    assert client.get(url).status_code == 200
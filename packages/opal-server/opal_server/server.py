@@ -26,6 +26,7 @@ from opal_common.topics.publisher import (
 )
 from opal_server.config import opal_server_config
 from opal_server.data.api import init_data_updates_router
+from opal_server.data.blob_store import DataBlobStore
 from opal_server.data.data_update_publisher import DataUpdatePublisher
 from opal_server.loadlimiting import init_loadlimit_router
 from opal_server.policy.bundles.api import router as bundles_router
@@ -227,13 +228,26 @@ class OpalServer:
         """Mounts the api routes on the app object."""
         authenticator = JWTAuthenticator(self.signer)
 
+        blob_store: Optional[DataBlobStore] = None
+        if opal_server_config.DATA_BLOB_THRESHOLD > 0:
+            blob_store = DataBlobStore(
+                opal_server_config.DATA_BLOBS_DIR, opal_server_config.DATA_BLOBS_TTL
+            )
+
         data_update_publisher: Optional[DataUpdatePublisher] = None
         if self.publisher is not None:
-            data_update_publisher = DataUpdatePublisher(self.publisher)
+            data_update_publisher = DataUpdatePublisher(
+                self.publisher,
+                blob_store=blob_store,
+                blob_threshold=opal_server_config.DATA_BLOB_THRESHOLD,
+            )
 
         # Init api routers with required dependencies
         data_updates_router = init_data_updates_router(
-            data_update_publisher, self.data_sources_config, authenticator
+            data_update_publisher,
+            self.data_sources_config,
+            authenticator,
+            blob_store=blob_store,
         )
         webhook_router = init_git_webhook_router(self.pubsub.endpoint, authenticator)
         security_router = init_security_router(